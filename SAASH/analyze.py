@@ -40,17 +40,33 @@ import os
 
 import pickle
 import time
+import threading
+import queue
+
+from concurrent.futures import ProcessPoolExecutor
 
 from collections import defaultdict
 
 from .structure import body as body
+from .structure import bondengine as bondengine
 from .structure import cluster as cluster
 from .structure import frame as frame
+from .structure import bondgraph as bondgraph
+from .structure import graphhash as graphhash
 
 from .util import observer as obs
+from .util import gsdreader
+from . import cache
+from . import output
+from . import clusterstore
+from . import profiles
 
 from .simInfo import *
 
+
+#run types that track individual clusters through the frames
+CLUSTER_RUN_TYPES = ['cluster', 'nanocluster']
+
 ####################################################################
 ################# Output Data Class ################################
 ####################################################################
@@ -74,6 +90,60 @@ class ClusterOut:
         return
 
 
+class ClusterTracker:
+    '''Tracks clusters through a sequence of frames. Each frame added is matched to 
+       the previous one, updating the cluster info objects and the time series of 
+       monomers, so frames can be supplied one at a time as they are analyzed. 
+    '''
+
+    def __init__(self, sim, observer):
+
+        #store the sim info and observer for this run
+        self.__sim      = sim
+        self.__observer = observer
+
+        #init an array to store all cluster info objects
+        self.__cluster_info = []
+
+        #init arrays for the time dependence of monomers
+        self.__mon_fracs         = []
+        self.__monomer_id_sets   = []
+        self.__monomer_type_sets = []
+
+        #init the previous frame
+        self.__old_frame = None
+
+
+    def add_frame(self, current_frame):
+        #match the clusters in the current frame to the previous frame
+
+        #for the first frame, create cluster info for all existing clusters
+        if self.__old_frame is None:
+            current_frame.create_first_frame(self.__cluster_info, current_frame.get_frame_num(),
+                                             self.__observer)
+            self.__old_frame = current_frame
+            return
+
+        #get the monomer fraction and ids/types from the previous frame
+        old_frame = self.__old_frame
+        self.__mon_fracs.append(old_frame.get_monomer_fraction())
+        self.__monomer_id_sets.append(old_frame.get_monomer_ids())
+        if self.__sim.multitype():
+            self.__monomer_type_sets.append(old_frame.get_monomer_types())
+
+        #do the update for the current frame
+        current_frame.update(self.__cluster_info, old_frame, self.__observer)
+        self.__old_frame = current_frame
+
+        return
+
+    def get_output(self):
+        #create a clusterOut object with the relevant data and return it
+
+        return ClusterOut(self.__cluster_info, self.__mon_fracs, self.__monomer_id_sets, 
+                          self.__monomer_type_sets)
+
+
 
 
 
@@ -82,62 +152,462 @@ class ClusterOut:
 ####################################################################
 
 
-def analyze_nano(snap, sim, observer):
-    #analyze clusters of subunits and their connectivity
+def analyze_nano(snap, sim, observer, frame_num = None, bodies = None, bond_graph = None):
+    '''Analyze clusters of subunits and their connectivity around each nanoparticle. 
+       If the bodies and bond network of the whole frame are given, the bonds near each
+       nanoparticle are taken from them rather than detected again.
+
+       Otherwise, bonds are detected once per frame, between all bodies adsorbed to any
+       nanoparticle. The clusters around each nanoparticle only include its adsorbed
+       bodies, so they are read from the shared cluster labels when every cluster touching
+       the nanoparticle is fully adsorbed, and from the subgraph of its bodies if not.
+
+       Returns the per nanoparticle data and a dict of extra data, which is empty unless
+       the observer writes adsorption events or radial profiles. It then holds the body ids
+       adsorbed to each nanoparticle and in its largest cluster, and the radial histograms.
+    '''
 
-    #get a list of bodies to analyze
-    bodies = body.create_bodies(snap, sim)
+    #get a list of bodies to analyze. use the bond network from the bond cache if stored
+    if bodies is None:
+        network = frame.load_bond_network(snap, sim, frame_num)
+        if network is not None:
+            bodies, bond_graph = network
+        else:
+            bodies = body.create_bodies(snap, sim)
 
-    #get the nanoparticle locations this frame
+    #get the nanoparticle locations this frame, and the bodies adsorbed to each
     nanoparticles = body.get_nanoparticles(snap, sim)
+    dist2         = body.get_nano_distance2(bodies, nanoparticles, sim)
+    adsorbed      = body.get_adsorbed_bodies(bodies, nanoparticles, sim, dist2=dist2)
+
+    #get the shared bond network, and the index of each body in it
+    if bond_graph is None:
+        shared = np.flatnonzero(adsorbed.any(axis=0))
+        bond_graph = bondengine.get_bond_graph([bodies[i] for i in shared], sim)
+    else:
+        shared = np.arange(len(bodies))
+
+    #get the clusters in the shared network
+    labels      = bond_graph.get_labels()
+    group_sizes = bond_graph.get_group_sizes()
+    group_bonds = bond_graph.get_group_num_bonds()
 
     #init arrays to store things
     all_q = []
 
+    #init the body ids of each nanoparticle, if tracking events
+    track_events = observer is not None and observer.get_nano_events()
+    body_ids     = np.array([bod.get_HOOMD_id() for bod in bodies]) if track_events else None
+    adsorbed_ids = []
+    largest_ids  = []
+
     #loop over each nanoparticle
-    for nanoparticle in nanoparticles:
+    for nano_index in range(len(nanoparticles)):
+
+        #get the indices of the adsorbed bodies in the shared network
+        filtered     = np.flatnonzero(adsorbed[nano_index])
+        members      = np.searchsorted(shared, filtered)
+        num_adsorbed = len(filtered)
+
+        #count the adsorbed bodies in each shared cluster
+        counts  = np.bincount(labels[members], minlength=len(group_sizes))
+        touched = counts > 0
+
+        #use the shared clusters if all are fully adsorbed, otherwise cluster the subgraph
+        if (counts[touched] == group_sizes[touched]).all():
+            nano_sizes  = counts
+            nano_bonds  = group_bonds
+            nano_labels = labels[members]
+        else:
+            nano_graph  = bond_graph.get_subgraph(members)
+            nano_sizes  = nano_graph.get_group_sizes()
+            nano_bonds  = nano_graph.get_group_num_bonds()
+            nano_labels = nano_graph.get_labels()
 
-        #get the cutoff radius and center of the nanoparticle
-        radius = nanoparticle.get_radius() * sim.radius_mult + sim.largest_bond_distance
-        center = nanoparticle.get_position()
-        rad_cut = radius * radius
+        #get largest cluster size
+        largest_cluster_size = np.max(nano_sizes) if len(nano_sizes) > 0 else 0
+
+        #get the ids of the adsorbed bodies, and the bodies of the largest cluster
+        if track_events:
+            adsorbed_ids.append(body_ids[filtered])
+            if largest_cluster_size > 1:
+                largest_cluster = filtered[nano_labels == np.argmax(nano_sizes)]
+                largest_ids.append(body_ids[largest_cluster])
+            else:
+                largest_ids.append(body_ids[[]])
 
-        #filter the bodies that are within the cutoff radius of the nanoparticle
-        filtered_bodies = [bod for bod in bodies if bod.is_nearby(center, rad_cut, sim.box_dim)]
+        #check if there are no clusters on the nanoparticle
+        if largest_cluster_size <= 1:
+            all_q.append((num_adsorbed, 0, 0))
+            continue
 
-        #init a dict to store the bonds - init with empty lists for each body_id
-        bond_dict = dict()
-        for bod in bodies:
-            bond_dict[bod.get_id()] = []
+        #get the number of bonds in the largest cluster
+        largest_cluster_id = np.argmax(nano_sizes)
+        bonds = nano_bonds[largest_cluster_id]
 
-        #determine the bond network using the list of filtered bodies
-        body.get_bonded_bodies(filtered_bodies, sim, bond_dict)
+        all_q.append((num_adsorbed, int(largest_cluster_size), int(bonds)))
 
-        #determine groups of bonded structures
-        G = cluster.get_groups(bond_dict)
+    #collect the extra data requested by the observer
+    extras = dict()
+    if track_events:
+        extras['adsorbed'] = adsorbed_ids
+        extras['largest']  = largest_ids
 
-        #get largest cluster size
-        G_lens = [len(G[i]) for i in range(len(G))]
-        largest_cluster_size = np.max(G_lens)
+    if observer is not None and observer.get_radial_profile() is not None:
+        extras['profile'] = profiles.get_radial_profiles(snap, sim, observer, nanoparticles, dist2)
 
-        #check if there are no clusters on the nanoparticle
-        if largest_cluster_size == 1:
-            all_q.append((len(filtered_bodies), 0, 0))
+    return all_q, extras
+
+
+def analyze_bulk(snap, sim, observer, frame_num, fr = None):
+    #get the cluster size distribution in a frame, and the focused microstates if requested
+
+    #make a Frame object if one is not given, get the size distribution
+    if fr is None:
+        fr = frame.get_data_from_snap(snap, sim, frame_num)
+
+    return fr.get_cluster_size_distribution(observer)
+
+
+def analyze_capsids(snap, sim, observer, frame_num, N_perfect, bond_graph = None):
+    #count the number of bonds in each cluster with the perfect number of subunits
+
+    #determine the bond network of the frame if it is not given
+    if bond_graph is None:
+        bodies, bond_graph = frame.get_bond_network(snap, sim, frame_num)
+
+    #determine groups of bonded structures and the size of each
+    group_sizes = bond_graph.get_group_sizes()
+
+    #get the number of bonds in each cluster of the perfect size
+    cluster_ids = np.flatnonzero(group_sizes == N_perfect)
+    bonds_list  = bond_graph.get_group_num_bonds()[cluster_ids].tolist()
+
+    #key each cluster by its number of bonds and graph hash, if requested
+    if observer.get_capsid_key() == 'graph_hash':
+        groups     = cluster.get_groups_from_labels(bond_graph.get_labels())
+        bonds_list = ["{}_{}".format(nbond, graphhash.get_cluster_hash(bond_graph, groups[cid]))
+                      for nbond, cid in zip(bonds_list, cluster_ids)]
+    
+    capsid_bond_dict = {}
+    for nbond in bonds_list:
+        if nbond not in capsid_bond_dict.keys():
+            capsid_bond_dict[nbond] = 1
+        else:
+            capsid_bond_dict[nbond] += 1
+
+    return capsid_bond_dict
+
+
+def analyze_shared_frame(snap, sim, observer, frame_num, observers, frame_sets, N_perfect):
+    '''Compute the bodies, bond network, and groups of a frame once, and use them for 
+       the analysis of each observer that includes this frame. Returns a list with the
+       result for each observer, or None if the observer skips this frame. Cluster 
+       observers get the compact frame data used to rebuild the frame for tracking.
+    '''
+
+    #get a list of bodies and determine the bond network
+    bodies, bond_graph = frame.get_bond_network(snap, sim, frame_num)
+
+    #the frame object is made once, if needed
+    fr = None
+
+    results = []
+    for consumer, frame_set in zip(observers, frame_sets):
+
+        #check if this observer analyzes the frame
+        if frame_num not in frame_set:
+            results.append(None)
             continue
 
-        #get the number of bonds in the largest cluster
-        largest_cluster_id = np.argmax(G_lens)
-        largest_cluster    = G[largest_cluster_id]
-        bonds = 0
-        for particle in largest_cluster:
-            bonds += len(bond_dict[particle])
+        run_type = consumer.get_run_type()
+
+        if run_type == 'bulk':
+
+            if fr is None:
+                fr = frame.make_frame(bodies, bond_graph, frame_num)
+            results.append(analyze_bulk(snap, sim, consumer, frame_num, fr=fr))
+
+        elif run_type == 'nanoparticle':
+
+            results.append(analyze_nano(snap, sim, consumer, frame_num, 
+                                        bodies=bodies, bond_graph=bond_graph))
+
+        elif run_type == 'capsid':
+
+            results.append(analyze_capsids(snap, sim, consumer, frame_num, N_perfect,
+                                           bond_graph=bond_graph))
+
+        elif run_type == 'cluster':
+
+            results.append(frame.pack_frame_data(bodies, bond_graph))
+
+        elif run_type == 'nanocluster':
+
+            results.append(frame.pack_frame_data(bodies, *get_nano_vicinity(snap, sim, bodies,
+                                                                             bond_graph)))
+
+    return results
+
+
+####################################################################
+################# Frame Reading ####################################
+####################################################################
+
+class FrameSource:
+    '''Iterates over the snapshots of the given frames, yielding (frame_num, snap). 
+
+       With a positive depth, frames are read ahead on a background thread into a queue
+       holding up to depth snapshots, so reading and decoding the next frames overlaps
+       with the analysis of the current one. With depth 0, each frame is read when it is
+       needed. 
+
+       The time spent waiting for frames and the time spent between frames (the analysis)
+       are recorded, to show whether reading or computing is the bottleneck.
+    '''
+
+    def __init__(self, snaps, frame_nums, depth = 2):
+
+        #store the trajectory and the frames to read
+        self.__snaps      = snaps
+        self.__frame_nums = list(frame_nums)
+        self.__depth      = depth
+
+        #init the time waiting for frames, and the time analyzing them
+        self.__wait_time    = 0.0
+        self.__compute_time = 0.0
+
+        #init the reader thread state
+        self.__queue  = None
+        self.__thread = None
+        self.__stop   = threading.Event()
+
+
+    def __iter__(self):
+
+        #start reading frames ahead in the background
+        if self.__depth > 0:
+            self.__queue  = queue.Queue(maxsize=self.__depth)
+            self.__thread = threading.Thread(target=self.__read_frames, daemon=True)
+            self.__thread.start()
+
+        try:
+
+            last_time = None
+            for frame_num in self.__frame_nums:
+
+                #the time since the previous frame was handed out was spent analyzing it
+                start_time = time.perf_counter()
+                if last_time is not None:
+                    self.__compute_time += start_time - last_time
+
+                #get the next snapshot, waiting for it to be read if needed
+                snap = self.__get_snap(frame_num)
+                last_time = time.perf_counter()
+                self.__wait_time += last_time - start_time
+
+                yield frame_num, snap
+
+            #include the analysis of the final frame
+            if last_time is not None:
+                self.__compute_time += time.perf_counter() - last_time
+
+        finally:
+            self.close()
+
+
+    def __get_snap(self, frame_num):
+        #get the snapshot for the frame, from the queue if reading in the background
+
+        if self.__queue is None:
+            return self.__snaps[frame_num]
+
+        read_frame, snap, error = self.__queue.get()
+        if error is not None:
+            raise error
+
+        return snap
+
+    def __read_frames(self):
+        #read each frame in order and put it in the queue, until finished or stopped
+
+        for frame_num in self.__frame_nums:
+
+            try:
+                item = (frame_num, self.__snaps[frame_num], None)
+            except Exception as error:
+                item = (frame_num, None, error)
+
+            #wait for space in the queue, checking if the iteration has stopped early
+            while not self.__stop.is_set():
+                try:
+                    self.__queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+            if self.__stop.is_set() or item[2] is not None:
+                return
+
+        return
+
+    def close(self):
+        #stop the reader thread, if running
+
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+        return
+
+    def report(self):
+        #print the time spent waiting for frames and analyzing them
+
+        print("Frame reading: waited {:.2f} s for frames, {:.2f} s analyzing frames".format(
+              self.__wait_time, self.__compute_time))
+
+        return
+
+    #getter functions
+
+    def get_wait_time(self):
+
+        return self.__wait_time
+
+    def get_compute_time(self):
+
+        return self.__compute_time
+
+
+####################################################################
+################# Parallel Frame Analysis ##########################
+####################################################################
+
+#state of each worker process, set when the process pool starts
+worker_state = dict()
+
+def init_worker(snaps, sim, observer):
+    #keep the trajectory (opened again when unpickled), sim info, and observer in this worker
+
+    worker_state['snaps']    = snaps
+    worker_state['sim']      = sim
+    worker_state['observer'] = observer
+
+    return
+
+
+def analyze_frame_chunk(frame_func, frame_nums, args):
+    #apply the frame function to each frame in a chunk of frames, in a worker process
+
+    snaps    = worker_state['snaps']
+    sim      = worker_state['sim']
+    observer = worker_state['observer']
+
+    frame_source = FrameSource(snaps, frame_nums, observer.get_prefetch_depth())
+
+    return [frame_func(snap, sim, observer, frame_num, *args) 
+            for frame_num, snap in frame_source]
+
+
+def iterate_frames(snaps, sim, observer, frame_func, *args, frame_nums = None):
+    '''Apply frame_func(snap, sim, observer, frame_num, *args) to each frame, and yield
+       the pairs (frame_num, result) in frame order. Defaults to the frames set in the 
+       observer. 
+
+       If the observer has more than one worker, the frames are split into contiguous 
+       chunks that are analyzed in a pool of processes. Each worker opens the trajectory
+       itself, and results are yielded in frame order as they become available.
+    '''
+
+    if frame_nums is None:
+        frame_nums = get_frame_nums(observer)
+
+    num_workers = observer.get_num_workers()
+
+    #analyze the frames one at a time in this process
+    if num_workers <= 1 or len(frame_nums) < 2:
+
+        frame_source = FrameSource(snaps, frame_nums, observer.get_prefetch_depth())
+        for frame_num, snap in frame_source:
+
+            print_progress(frame_num, observer)
+            yield frame_num, frame_func(snap, sim, observer, frame_num, *args)
+
+        frame_source.report()
+        return
+
+    #split the frames into several chunks per worker, to balance the load
+    num_chunks = min(len(frame_nums), 4 * num_workers)
+    chunks     = [chunk.tolist() for chunk in np.array_split(frame_nums, num_chunks)]
+
+    print("Analyzing {} frames with {} worker processes".format(len(frame_nums), num_workers))
+
+    #map the chunks to the workers, and yield the results in order
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=init_worker,
+                             initargs=(snaps, sim, observer)) as executor:
+
+        chunk_results = executor.map(analyze_frame_chunk, [frame_func] * num_chunks, chunks,
+                                     [args] * num_chunks)
+
+        for chunk, chunk_result in zip(chunks, chunk_results):
+
+            for frame_num, result in zip(chunk, chunk_result):
 
-        #get the number adsorbed
-        num_adsorbed = len(filtered_bodies)
+                print_progress(frame_num, observer)
+                yield frame_num, result
 
-        all_q.append((num_adsorbed, largest_cluster_size, int(bonds / 2)))
+    return
+
+
+def get_nano_vicinity(snap, sim, bodies, bond_graph = None):
+    '''Return the bond network between the bodies within the cutoff radius of any
+       nanoparticle, and the indices of those bodies. Bonds are only detected between
+       these bodies, or taken from the bond network of the whole frame if given. The
+       returned network contains all bodies, with the others left unbonded.
+    '''
+
+    #filter the bodies as in analyze_nano
+    nanoparticles = body.get_nanoparticles(snap, sim)
+    members = np.flatnonzero(body.get_adsorbed_bodies(bodies, nanoparticles, sim).any(axis=0))
+
+    #get the bonds between the members, and map them back to the indices of all bodies
+    if bond_graph is None:
+        member_graph = bondengine.get_bond_graph([bodies[i] for i in members], sim)
+    else:
+        member_graph = bond_graph.get_subgraph(members)
+
+    bodies_i, bodies_j, codes = member_graph.get_edges()
+    vicinity_graph = bondgraph.BondGraph(len(bodies), members[bodies_i], members[bodies_j],
+                                         codes, num_bond_types=len(sim.bonds),
+                                         bond_names=sim.bond_names)
+
+    return vicinity_graph, members
+
+
+def get_cluster_network(snap, sim, observer, frame_num):
+    '''Frame function returning the bodies and bond network of a frame, in this process,
+       and the bodies to track. For nanocluster runs, only bodies near a nanoparticle
+       are tracked, otherwise all bodies are (None).
+    '''
+
+    if observer.get_run_type() != 'nanocluster':
+        return (*frame.get_bond_network(snap, sim, frame_num), None)
+
+    #use the bond network from the bond cache if it is stored
+    network = frame.load_bond_network(snap, sim, frame_num)
+    if network is not None:
+        bodies, bond_graph = network
+    else:
+        bodies, bond_graph = body.create_bodies(snap, sim), None
+
+    return (bodies, *get_nano_vicinity(snap, sim, bodies, bond_graph))
+
+
+def get_cluster_frame_data(snap, sim, observer, frame_num):
+    #frame function computing the bodies, bonds, and groups of a frame for cluster tracking
 
-    return all_q
+    return frame.pack_frame_data(*get_cluster_network(snap, sim, observer, frame_num))
 
 
 ####################################################################
@@ -187,450 +657,338 @@ def check_observer(observer, gsd_file, sim):
     return observer
 
 
-def handle_cluster(snaps, frames, sim, observer, jump = 1):
-    #analyze according to cluster output. Create cluster info objects
-
-    #init an array to store all cluster info objects
-    cluster_info  = []
-
-    #init arrays for the time dependence of monomers
-    mon_fracs         = []
-    monomer_id_sets   = []
-    monomer_type_sets = []
-
-    #analyze the first frame seperately
-    f0 = observer.get_first_frame() + 1
-    old_frame = frame.get_data_from_snap(snaps[f0-1], sim, f0-1)
-    old_frame.create_first_frame(cluster_info, f0-1, observer)
+def get_frame_nums(observer):
+    #return the frames analyzed by the observer. cluster runs analyze the first frame seperately
 
-    print("\nBeginning Cluster Analysis")
-    jump = observer.get_frame_jump()
-
-    #loop over each frame and perform the analysis
-    for frame_num in range(f0, observer.get_final_frame(), jump):
-
-        print_progress(frame_num, observer)
+    first_frame = observer.get_first_frame()
+    final_frame = observer.get_final_frame()
+    jump        = observer.get_frame_jump()
 
-        #get the monomer fraction and ids/types from the previous frame
-        mon_fracs.append(old_frame.get_monomer_fraction())
-        monomer_id_sets.append(old_frame.get_monomer_ids())
-        if sim.multitype():
-            monomer_type_sets.append(old_frame.get_monomer_types())
+    if observer.get_run_type() in CLUSTER_RUN_TYPES:
+        return [first_frame] + list(range(first_frame+1, final_frame, jump))
 
-        #get the snapshot for the current frame
-        snap = snaps[frame_num]
+    return list(range(first_frame, final_frame, jump))
 
-        #do the update for the current frame
-        cluster_info, old_frame = cluster.track_clustering(snap, sim, int(frame_num/jump), 
-                                                           cluster_info, old_frame,
-                                                           observer)
 
-    #create a clusterOut object with the relevant data and return it
-    out_data = ClusterOut(cluster_info, mon_fracs, monomer_id_sets, monomer_type_sets)
-    return out_data
+def get_cluster_frame_index(frame_num, observer):
+    #return the index a cluster run stores for a frame
 
-def write_cluster_output(out_data, observer):
-    #output the cluster object data to the file in observer
+    if frame_num == observer.get_first_frame():
+        return frame_num
 
-    outfile = observer.get_outfile()
+    return int(frame_num / observer.get_frame_jump())
 
-    with open(outfile, 'wb') as f:
-        pickle.dump(out_data, f)
-        print("Cluster info pickled into file: {}".format(outfile))
-
-    return
 
+def handle_cluster(snaps, frames, sim, observer, jump = 1):
+    #analyze according to cluster output. Create cluster info objects
 
-def handle_bulk(snaps, frames, sim, observer):
-    #analyze data according to bulk output. Get cluster size distribution
+    #nanocluster runs only track the clusters near nanoparticles
+    if observer.get_run_type() == 'nanocluster':
+        check_nanoparticles(sim)
 
-    #check if the user wants details on microstates
-    focus_list = observer.get_focus_list()
+    #with several workers, frames are labeled in parallel and then matched serially here
+    two_phase  = observer.get_num_workers() > 1
+    frame_func = get_cluster_frame_data if two_phase else get_cluster_network
 
-    #init lists to store the cluster size distribution and the largest cluster
-    all_sizes   = []
-    all_largest = []
-    if focus_list is not None:
-        all_focused = []
+    #create a tracker to match the clusters in each frame to the previous frame
+    tracker = ClusterTracker(sim, observer)
 
-    print("\nBeginning Bulk Analysis")
-    jump = observer.get_frame_jump()
+    print("\nBeginning Cluster Analysis")
 
     #loop over each frame and perform the analysis
-    for frame_num in range(observer.get_first_frame(), observer.get_final_frame(), jump):
-
-        print_progress(frame_num, observer)
-
-        #get the snapshot for the current frame
-        snap = snaps[frame_num]
-
-        #make a Frame object, get the size distribution and append to lists
-        fr = frame.get_data_from_snap(snap, sim, frame_num)
-        if focus_list is None:
-
-            sizes, largest = fr.get_cluster_size_distribution(observer)
+    for frame_num, result in iterate_frames(snaps, sim, observer, frame_func):
 
+        #construct the frame from the worker result, or from the bodies and bond network
+        frame_index = get_cluster_frame_index(frame_num, observer)
+        if two_phase:
+            current_frame = frame.get_data_from_frame_data(result, sim, frame_index)
         else:
+            bodies, bond_graph, members = result
+            current_frame = frame.make_frame(bodies, bond_graph, frame_index, members)
 
-            sizes, largest, focus = fr.get_cluster_size_distribution(observer)
-            all_focused.append(focus)
-    
-        all_sizes.append(sizes)
-        all_largest.append(largest)
+        tracker.add_frame(current_frame)
 
-    if focus_list is None:
-        return all_sizes, all_largest
-    
-    return all_sizes, all_largest, all_focused
+    return tracker.get_output()
 
+def write_cluster_output(out_data, observer):
+    #output the cluster object data to the file in observer
 
-def write_bulk_output(out_data, frames, observer, jump = 1):
-    #print the cluster size distribution to file in observer
-
-    #extract the data from out data
-    cluster_sizes = out_data[0]
-    largest_sizes = out_data[1]
-    max_size      = max(largest_sizes)
-
-    #get the output file name from observer and open it for writing
     outfile = observer.get_outfile()
-    fout = open(outfile, 'w') 
 
-    #write the data
-    jump = observer.get_frame_jump()
-    frame_counter = 0
-    for frame_num in range(observer.get_first_frame(), observer.get_final_frame(), jump):
-
-        #convert dict to cluster array
-        cluster_size_array = [cluster_sizes[frame_counter][i] for i in range(max_size+1)] 
-
-        #write output
-        fout.write("{} ".format(frame_num))
-        for i in range(max_size):
-            fout.write("{} ".format(cluster_size_array[i+1]))
-        fout.write("{}".format(largest_sizes[frame_counter]))
-        fout.write("\n")
-
-        frame_counter += 1
-
-    #close the file
-    fout.close()
-    print("Cluster sizes written to file: {}".format(outfile))
-
-    #check for focused sizes
-    focus_list = observer.get_focus_list()
-    if focus_list is not None:
-
-        for csize in focus_list:
-
-            focus_outfile = outfile.split('.sizes')[0] + "_" + str(csize) + ".fsizes"
-            write_focus_output(csize, out_data[2], focus_outfile, observer)
+    #write a columnar store if requested
+    if observer.get_cluster_format() == 'store':
+        clusterstore.write_store(out_data, clusterstore.get_store_path(outfile))
+        return
 
+    with open(outfile, 'wb') as f:
+        pickle.dump(out_data, f)
+        print("Cluster info pickled into file: {}".format(outfile))
 
     return
 
 
+def write_frames(snaps, sim, observer, writer, frame_func, *args):
+    #analyze each frame and stream its result to the writer as soon as it is available
 
-def write_focus_output(csize, all_focus, outfile, observer):
-    #print a separate file per cluster size, containing info on microstate distribution 
-
-    #open outfile
-    fout = open(outfile, 'w') 
+    for frame_num, result in iterate_frames(snaps, sim, observer, frame_func, *args):
+        writer.add_frame(frame_num, result)
 
-    #print the first line, giving the definitions of each microstate
-    fout.write("Microstates: ")
+    writer.close()
 
-    #do an initial pass through all time points to gather all microstates (as keys)
-    key_map = defaultdict(int)
-    for distribution in all_focus:
-
-        size_dist = distribution[csize]
-        for microstate in size_dist:
+    return
 
-            if microstate not in key_map:
 
-                key_map[microstate] = len(key_map) 
-                fout.write("( {} : {} ),".format(key_map[microstate], microstate))
+def handle_bulk(snaps, frames, sim, observer):
+    #analyze data according to bulk output. Get cluster size distribution
 
-    fout.write("\n")
+    print("\nBeginning Bulk Analysis")
 
-    #check if the requested size has no members. if not, delete the file with message to user
-    if len(key_map) == 0:
+    #write the size distribution (and focused microstates) of each frame
+    writer = output.get_writer(observer)
+    write_frames(snaps, sim, observer, writer, analyze_bulk)
 
-        fout.close()
-        os.remove(outfile)
-        print("No clusters of size {} found\n".format(csize))
-        return
+    return
 
-    #write the data
-    jump = observer.get_frame_jump()
-    frame_counter = 0
-    for frame_num in range(observer.get_first_frame(), observer.get_final_frame(), jump):
 
-        distribution = all_focus[frame_counter]
-        size_dist    = distribution[csize]
+def check_nanoparticles(sim):
+    #raise an error if a nanoparticle analysis is requested without nanoparticles
 
-        counts = [0 for i in range(len(key_map))]
+    if not sim.nano_flag:
+        error_msg = """Observer has started a nanoparticle analysis, but no 
+                       nanoparticle was found in the simulation results. \n
+                       Verify that the correct gsd file was used and that the 
+                       interaction file contains the nanoparticle definition.\n"
+        """
+        raise RuntimeError(error_msg)
 
-        for microstate in size_dist:
+    return
 
-            counts[key_map[microstate]] = size_dist[microstate]
 
-        #write all of them in indexed order
-        fout.write("{} ".format(frame_num))
-        for i in range(len(counts)):
+def handle_nanoparticle(snaps, frames, sim, observer):
+    #analyze data according to nanoparticle output. 
+    #get info about assembly around the nanoparticle
 
-            fout.write("{} ".format(counts[i]))
+    check_nanoparticles(sim)
 
-        fout.write("\n")
+    print("\nBeginning Nanoparticle Analysis")
 
-        frame_counter += 1
+    #write the cluster data for each nanoparticle in each frame
+    writer = output.get_writer(observer)
+    write_frames(snaps, sim, observer, writer, analyze_nano)
 
-    #close the file
-    fout.close()
-    print("Cluster microstates (size {}) written to file: {}".format(csize, outfile))
     return
 
 
-def handle_nanoparticle(snaps, frames, sim, observer):
-    #analyze data according to nanoparticle output. 
-    #get info about assembly around the nanoparticle
+def handle_capsids(snaps, frames, sim, observer, N_perfect, bond_perfect):
+    #identify perfect capsids
 
-    if not sim.nano_flag:
-        error_msg = """Observer has started a nanoparticle analysis, but no 
-                       nanoparticle was found in the simulation results. \n
-                       Verify that the correct gsd file was used and that the 
-                       interaction file contains the nanoparticle definition.\n"
-        """
-        raise RuntimeError(error_msg)
+    print("\nBeginning Capsid Analysis")
 
-    nano_data = []
+    #write the capsid bond distribution in each frame
+    writer = output.get_writer(observer, N_perfect, bond_perfect)
+    write_frames(snaps, sim, observer, writer, analyze_capsids, N_perfect)
 
-    print("\nBeginning Nanoparticle Analysis")
-    jump = observer.get_frame_jump()
+    return
 
-    #loop over each frame and perform the analysis
-    for frame_num in range(observer.get_first_frame(), observer.get_final_frame(), jump):
 
-        print_progress(frame_num, observer)
+def handle_multiple(snaps, frames, sim, observers, N_perfect, bond_perfect):
+    '''Analyze the frames of several observers in a single pass. The bodies, bond network,
+       and groups of each frame are computed once and used by every observer that includes
+       the frame. Each observer streams its output to its own file.
+    '''
 
-        #get the snapshot for the current frame
-        snap = snaps[frame_num]
+    #check that nanoparticles exist before analyzing any frames
+    run_types = [observer.get_run_type() for observer in observers]
+    if 'nanoparticle' in run_types or 'nanocluster' in run_types:
+        check_nanoparticles(sim)
 
-        #get the cluster data for each nanoparticle
-        q = analyze_nano(snap, sim, observer)
-        nano_data.append(q)
+    #get the frames for each observer, and all frames to analyze
+    frame_sets = [set(get_frame_nums(observer)) for observer in observers]
+    frame_nums = sorted(set().union(*frame_sets))
 
+    #init trackers for cluster observers, and output writers for the others
+    trackers = [ClusterTracker(sim, observer) if run_type in CLUSTER_RUN_TYPES else None
+                for observer, run_type in zip(observers, run_types)]
+    writers  = [output.get_writer(observer, N_perfect, bond_perfect) 
+                if run_type not in CLUSTER_RUN_TYPES else None
+                for observer, run_type in zip(observers, run_types)]
 
-    return nano_data
+    print("\nBeginning Analysis for Run Types {}".format(run_types))
 
-def write_nanoparticle_output(out_data, frames, observer):
-    #print cluster info around each nanoparticle
+    #analyze each frame once, and give the results to each observer. the first observer
+    #sets the number of workers and progress updates
+    for frame_num, frame_results in iterate_frames(snaps, sim, observers[0], 
+                                                   analyze_shared_frame, observers,
+                                                   frame_sets, N_perfect, 
+                                                   frame_nums=frame_nums):
 
-    #get the output file name from observer and open it for writing
-    outfile = observer.get_outfile()
-    fout = open(outfile, 'w') 
+        for i, result in enumerate(frame_results):
 
-    num_nanos = len(out_data[0])
-    jump = observer.get_frame_jump()
+            #skip observers that do not include this frame
+            if result is None:
+                continue
 
-    frame_counter = 0
-    for frame_num in range(observer.get_first_frame(), observer.get_final_frame(), jump):
+            #match clusters to the previous frame as soon as each frame is available
+            if trackers[i] is not None:
+                frame_index   = get_cluster_frame_index(frame_num, observers[i])
+                current_frame = frame.get_data_from_frame_data(result, sim, frame_index)
+                trackers[i].add_frame(current_frame)
 
-        #grab this frames data
-        q = out_data[frame_counter]
+            else:
+                writers[i].add_frame(frame_num, result)
 
-        #print the data to file
-        fout.write("{}".format(frame_num))
-        for nano in range(num_nanos):
-            fout.write(",%s,%s,%s"%(q[nano][0], q[nano][1], q[nano][2]))
-        fout.write("\n")
+    #finish the output of each observer
+    for i, observer in enumerate(observers):
 
-        frame_counter += 1
+        if run_types[i] in CLUSTER_RUN_TYPES:
+            write_cluster_output(trackers[i].get_output(), observer)
 
-    #close the file
-    fout.close()
-    print("Nanoparticle assembly info written to file: {}".format(outfile))
+        else:
+            writers[i].close()
 
     return
 
 
-def handle_capsids(snaps, frames, sim, observer, N_perfect, bond_perfect):
-    #identify perfect capsids
-
-    #init lists to store capsid bond size distribution
-    all_bonds   = []
+def get_sim_options(observer):
+    #check observer for optional parameters to simInfo
 
-    print("\nBeginning Capsid Analysis")
-    jump = observer.get_frame_jump()
+    sim_options = dict()
+    if observer is not None:
 
-    #loop over each frame and perform the analysis
-    for frame_num in range(observer.get_first_frame(), observer.get_final_frame(), jump):
+        if observer.get_ngrid_cutoff() is not None:
+            sim_options['ngrid_R'] = observer.get_ngrid_cutoff()
 
-        print_progress(frame_num, observer)
+        if observer.get_bond_backend() is not None:
+            sim_options['bond_backend'] = observer.get_bond_backend()
 
-        #get the snapshot for the current frame
-        snap = snaps[frame_num]
-        
-        #get a list of bodies to analyze
-        bodies = body.create_bodies(snap, sim)
-        
-        #init a dict to store the bonds - init with empty lists for each body_id
-        bond_dict = dict()
-        for bod in bodies:
-            bond_dict[bod.get_id()] = []
+        if observer.get_bond_search() is not None:
+            sim_options['bond_search'] = observer.get_bond_search()
 
-        #determine the bond network using the list of filtered bodies
-        body.get_bonded_bodies(bodies, sim, bond_dict)
+        if observer.get_verlet_skin() is not None:
+            sim_options['verlet_skin'] = observer.get_verlet_skin()
 
-        #determine groups of bonded structures
-        G = cluster.get_groups(bond_dict)
-        
-        #print(bond_dict)
-        #print(G)
-        
-        G_lens = [len(G[i]) for i in range(len(G))]
-        print(G_lens)
-        
-        #get the number of bonds in the largest cluster
-        cluster_ids = [i for i, n in enumerate(G_lens) if n==N_perfect]
-        
-        bonds_list = []
-        if cluster_ids:
-            capsid_clusters = [G[i] for i in cluster_ids] #G[cluster_ids]
-            #print(capsid_clusters)
-            for c in capsid_clusters:
-                bonds = 0
-                for particle in c:
-                    bonds += len(bond_dict[particle])
-                #Correct for double counting
-                bonds = bonds//2
-                bonds_list.append(bonds)
-        
-        capsid_bond_dict = {}
-        for nbond in bonds_list:
-            if nbond not in capsid_bond_dict.keys():
-                capsid_bond_dict[nbond] = 1
-            else:
-                capsid_bond_dict[nbond] += 1
-        print(capsid_bond_dict)
-        
-        all_bonds.append(capsid_bond_dict)
-    
-    return all_bonds
+        if observer.get_kernel_backend() is not None:
+            sim_options['kernel_backend'] = observer.get_kernel_backend()
 
+    return sim_options
 
-def write_capsids_output(bond_data, frames, observer, N_perfect, bond_perfect, jump = 1):
-    #print the capsid bond distribution to file in observer
-    
-    #number of bonds in perfect capsid (always an entry here)
-    n_bonds_perfect = N_perfect*bond_perfect//2
-
-    #extract the data from out data
-    all_sizes = set().union(*(d.keys() for d in bond_data))
-    print(all_sizes)
-    all_sizes.add(n_bonds_perfect)
-    print(all_sizes)
-    possible_bonds = list(all_sizes)#.sort()
-    possible_bonds.sort()
-    print(possible_bonds)
-    # max_bonds = max(all_sizes)
-    # min_bonds = min(all_sizes)
-
-    #get the output file name from observer and open it for writing
-    outfile = observer.get_outfile()
-    fout = open(outfile, 'w') 
 
-    #Header
-    myheader = "frame "
-    for key in possible_bonds:
-        myheader += "{} ".format(key)
-    
-    fout.write(myheader)
-    fout.write("\n")
+def get_cached_snaps(snaps, gsd_file, ixn_file, snap, sim, observer):
+    '''Return the trajectory to read frames from. Uses the position cache of the gsd 
+       file if it is valid, unless the observer disables it. If the observer requests 
+       the cache, it is built first when missing or out of date. 
+    '''
 
-    #write the data
-    jump = observer.get_frame_jump()
-    frame_counter = 0
-    for frame_num in range(observer.get_first_frame(), observer.get_final_frame(), jump):
-        
-        new_dict = {}
-        for i in range(len(possible_bonds)):
-            if possible_bonds[i] in bond_data[frame_counter].keys():
-                new_dict[i] = bond_data[frame_counter][possible_bonds[i]]
-            else:
-                new_dict[i] = 0
+    use_cache = observer.get_use_cache()
+    if use_cache is False:
+        return snaps
 
-        #convert dict to cluster array
-        bond_size_array = [new_dict[i] for i in range(len(possible_bonds))] 
+    #build the cache if requested and not valid for this trajectory and interactions
+    if use_cache and not cache.is_cache_valid(gsd_file, ixn_file):
+        cache.build_cache(gsd_file, ixn_file)
 
-        #write output
-        fout.write("{} ".format(frame_num))
-        for i in range(len(possible_bonds)):
-            fout.write("{} ".format(bond_size_array[i]))
-        fout.write("\n")
+    cached_snaps = cache.load_cache(gsd_file, ixn_file, snap, sim)
+    if cached_snaps is None:
+        return snaps
 
-        frame_counter += 1
+    print("Reading positions from the cache for {}".format(gsd_file))
+    return cached_snaps
 
-    #close the file
-    fout.close()
-    print("Capsid bond distribution written to file: {}".format(outfile))
 
-    return
+def get_bond_cache(gsd_file, ixn_file, sim, observer):
+    '''Return the bond cache to use, or None. If the observer requests the bond cache, 
+       the bond network of each analyzed frame is stored for later runs. Otherwise, an
+       existing bond cache is used if it is valid, unless the observer disables it.
+    '''
 
+    use_cache = observer.get_bond_cache()
+    if use_cache is False:
+        return None
 
+    bond_cache = cache.BondCache(gsd_file, ixn_file, sim, write=bool(use_cache))
+    if not bond_cache.is_valid():
+        return None
 
+    print("Using the bond cache for {}".format(gsd_file))
+    return bond_cache
 
 
 def run_analysis(gsd_file, ixn_file = "interactions.txt", observer = None, N_perfect=12, bond_per_subunit_perfect=5):
-    #get number of monomers and dimers at each frame in the sim
+    '''Analyze the trajectory in gsd_file according to the observer. 
+
+       observer can also be a run type, or a list of observers and/or run types. Several
+       observers are analyzed in a single pass over the trajectory, sharing the bodies, 
+       bonds, and groups of each frame, and each writes its own output file.
+    '''
 
     #get the collection of snapshots and get number of frames
-    snaps = gsd.hoomd.open(name=gsd_file, mode="r")
+    snaps = gsdreader.GSDReader(gsd_file)
     snap = snaps[0]
     frames = len(snaps)
 
+    #get a list of observers, creating an observer for each run type given
+    observers = observer if isinstance(observer, (list, tuple)) else [observer]
+    observers = [obs.Observer(gsd_file, o) if isinstance(o, str) else o for o in observers]
+    if len(observers) == 0:
+        raise ValueError("At least one observer or run type must be given")
+
     #gather all the relevant global info into a SimInfo object
 
-    #check observer for optional parameters to simInfo
-    if observer is not None and observer.get_ngrid_cutoff() is not None:
-        
-        sim = SimInfo(snap, frames, ixn_file = ixn_file, 
-                      ngrid_R = observer.get_ngrid_cutoff())
-    else:
+    #the sim info is shared, so its options are taken from the first observer
+    sim_options = get_sim_options(observers[0])
+    if any(get_sim_options(o) != sim_options for o in observers[1:]):
+        warnings.warn("Observers set different bond detection options. Using the options "
+                      "of the first observer for all of them.")
 
-        sim = SimInfo(snap, frames, ixn_file = ixn_file)
+    sim = SimInfo(snap, frames, ixn_file = ixn_file, **sim_options)
 
     #check for observer. if not found create default observer with a warning
-    observer = check_observer(observer, gsd_file, sim)
+    observers = [check_observer(o, gsd_file, sim) for o in observers]
+
+    for observer in observers:
+
+        #give the observer the names of the integer particle and bond types for output
+        observer.set_type_names(sim.type_names, sim.bond_names)
+
+        #check that the run type is known
+        if observer.get_run_type() not in ['cluster', 'nanocluster', 'bulk', 'nanoparticle', 
+                                           'capsid']:
+            print('Error: type not recognized!')
+            exit()
+
+    #read the frames from the position cache, if it is valid or requested
+    snaps = get_cached_snaps(snaps, gsd_file, ixn_file, snap, sim, observers[0])
+
+    #read and store the bond network of each frame in the bond cache, if requested
+    sim.bond_cache = get_bond_cache(gsd_file, ixn_file, sim, observers[0])
+
+    #analyze several observers in a single pass, sharing the work for each frame
+    if len(observers) > 1:
+
+        handle_multiple(snaps, frames, sim, observers, N_perfect, bond_per_subunit_perfect)
+        return 0
 
     #get run type info from the observer
+    observer = observers[0]
     run_type = observer.get_run_type()
-x
-    #fork the analysis base don the run type
-    if run_type == 'cluster':
+
+    #fork the analysis base don the run type. outputs are written as frames are analyzed
+    if run_type in CLUSTER_RUN_TYPES:
 
         out_data = handle_cluster(snaps, frames, sim, observer)
         write_cluster_output(out_data, observer)
 
     elif run_type == 'bulk':
 
-        out_data = handle_bulk(snaps, frames, sim, observer)
-        write_bulk_output(out_data, frames, observer)
+        handle_bulk(snaps, frames, sim, observer)
 
     elif run_type == 'nanoparticle':
 
-        out_data = handle_nanoparticle(snaps, frames, sim, observer)
-        write_nanoparticle_output(out_data, frames, observer)
+        handle_nanoparticle(snaps, frames, sim, observer)
         
     #report number of assemblies with ideal number of subunits AND bonds
     elif run_type == 'capsid':
 
-        out_data = handle_capsids(snaps, frames, sim, observer, N_perfect, bond_per_subunit_perfect)
-        write_capsids_output(out_data, frames, observer, N_perfect, bond_per_subunit_perfect)
-
-    else:
-        print('Error: type not recognized!')
-        exit()
+        handle_capsids(snaps, frames, sim, observer, N_perfect, bond_per_subunit_perfect)
 
     return 0
@@ -0,0 +1,322 @@
+'''
+
+This file implements a position cache for trajectories that are analyzed repeatedly.
+
+The positions of the interacting pseudoatoms, the body centers, and the nanoparticles are
+extracted from every frame of a GSD file once, and stored as a contiguous float32 .npy
+sidecar file next to it. Each frame is stored as rows in the order of the static Topology
+
+    [pseudoatoms grouped by body | body centers | nanoparticles | box lengths | box tilts]
+
+so that the positions of a frame are slices of the array, with no permutation needed.
+Later runs read frames from the cache with np.memmap, without decoding the GSD file.
+
+A small JSON metadata file stores the size and modification time of the GSD file, and the
+path and contents hash of the interaction file. The cache is only used while these match,
+so it is rebuilt whenever the trajectory or the interactions change.
+
+A BondCache similarly stores the bond network of each analyzed frame, as its edge list and
+the group label of each body, in a sidecar directory with one compressed .npz file per
+frame. Bond detection depends only on the frame, the interactions, and the SimInfo bond
+parameters, so later runs with any observer can skip straight to clustering. The cache is
+keyed by a hash of these inputs, and its frames are removed when the key changes.
+
+The cache can be built from python with build_cache(gsd_file, ixn_file), or from the
+command line with
+
+python -m SAASH.cache <gsd_file> <ixn_file>
+
+'''
+
+import gsd.hoomd
+import numpy as np
+
+import hashlib
+import json
+import os
+import sys
+import glob
+
+from .util import gsdreader
+from .simInfo import SimInfo
+
+
+#version of the cache layout. caches with a different version are rebuilt
+CACHE_VERSION = 1
+
+
+class CachedFrame(gsd.hoomd.Frame):
+    '''A frame read from the position cache. The particle arrays only contain the
+       cached particles, stored in topology order, so the Topology can slice them
+       directly instead of taking the positions at its particle indices.
+    '''
+
+    in_topology_order = True
+
+
+class CachedTrajectory:
+
+    def __init__(self, gsd_file, snap, sim):
+
+        #store the files, and the static particle data of the cached particles
+        self.__gsd_file = gsd_file
+        self.__npy_file, self.__meta_file = get_cache_files(gsd_file)
+
+        index = get_cache_index(snap, sim)
+
+        self.__types  = list(snap.particles.types)
+        self.__typeid = snap.particles.typeid[index]
+        self.__body   = snap.particles.body[index]
+        self.__typeid.flags.writeable = False
+        self.__body.flags.writeable   = False
+
+        #map the positions of all frames into memory
+        self.__positions = np.load(self.__npy_file, mmap_mode='r')
+        self.__num_particles = len(index)
+
+
+    def __len__(self):
+
+        return len(self.__positions)
+
+    def __getitem__(self, frame_num):
+        #return a frame with views of the cached positions and box for the frame
+
+        frame_data = self.__positions[frame_num]
+        N = self.__num_particles
+
+        snap = CachedFrame()
+        snap.configuration.box = np.concatenate(frame_data[N:N+2])
+        snap.particles.N        = N
+        snap.particles.types    = list(self.__types)
+        snap.particles.typeid   = self.__typeid
+        snap.particles.body     = self.__body
+        snap.particles.position = frame_data[0:N]
+
+        return snap
+
+    def __getstate__(self):
+        #pickle only the file name and static data, the cache is mapped again when loaded
+
+        state = self.__dict__.copy()
+        del state['_CachedTrajectory__positions']
+
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self.__positions = np.load(self.__npy_file, mmap_mode='r')
+
+        return
+
+    def close(self):
+
+        del self.__positions
+        return
+
+
+def get_cache_files(gsd_file):
+    #return the names of the position and metadata files of the cache for a gsd file
+
+    base = os.path.splitext(gsd_file)[0]
+
+    return base + ".saash.npy", base + ".saash.json"
+
+
+def get_cache_key(gsd_file, ixn_file):
+    #return the metadata that must match for a cache to be valid
+
+    gsd_stat = os.stat(gsd_file)
+    with open(ixn_file, 'rb') as f:
+        ixn_hash = hashlib.sha256(f.read()).hexdigest()
+
+    return {'version'  : CACHE_VERSION,
+            'gsd_size' : gsd_stat.st_size,
+            'gsd_mtime': gsd_stat.st_mtime,
+            'ixn_file' : os.path.abspath(ixn_file),
+            'ixn_hash' : ixn_hash}
+
+
+def get_cache_index(snap, sim):
+    #return the particle indices that are cached, in topology order
+
+    topology = sim.topology
+
+    nano_typeids = [sim.type_map[nano.get_type()] for nano in sim.nanos]
+    nano_index   = np.where(np.isin(snap.particles.typeid, nano_typeids))[0]
+
+    return np.concatenate([topology.atom_index, topology.center_index, nano_index]).astype(int)
+
+
+def is_cache_valid(gsd_file, ixn_file):
+    #check if the cache for the gsd file exists and matches the gsd and interaction files
+
+    npy_file, meta_file = get_cache_files(gsd_file)
+    if not (os.path.exists(npy_file) and os.path.exists(meta_file)):
+        return False
+
+    with open(meta_file) as f:
+        metadata = json.load(f)
+
+    key = get_cache_key(gsd_file, ixn_file)
+
+    return all(metadata.get(entry) == value for entry, value in key.items())
+
+
+def build_cache(gsd_file, ixn_file = "interactions.txt"):
+    '''Extract the positions of the interacting pseudoatoms, body centers, and
+       nanoparticles in every frame of the gsd file into the position cache.
+       Returns the name of the .npy file.
+    '''
+
+    npy_file, meta_file = get_cache_files(gsd_file)
+
+    #remove the old metadata first, so a partially written cache is never valid
+    if os.path.exists(meta_file):
+        os.remove(meta_file)
+
+    with gsdreader.GSDReader(gsd_file) as snaps:
+
+        #get the static topology from the first frame
+        num_frames = len(snaps)
+        snap  = snaps[0]
+        sim   = SimInfo(snap, num_frames, ixn_file=ixn_file, verbose=False)
+        index = get_cache_index(snap, sim)
+        N     = len(index)
+
+        #write the positions, then the box lengths and tilts, of each frame
+        positions = np.lib.format.open_memmap(npy_file, mode='w+', dtype=np.float32,
+                                              shape=(num_frames, N+2, 3))
+        for frame_num in range(num_frames):
+
+            snap = snaps[frame_num]
+            positions[frame_num, 0:N] = snap.particles.position[index]
+            positions[frame_num, N:N+2] = np.reshape(snap.configuration.box, (2, 3))
+
+        positions.flush()
+        del positions
+
+    #write the metadata
+    metadata = get_cache_key(gsd_file, ixn_file)
+    metadata['num_frames']    = num_frames
+    metadata['num_particles'] = N
+
+    with open(meta_file, 'w') as f:
+        json.dump(metadata, f)
+
+    print("Positions for {} frames cached to file: {}".format(num_frames, npy_file))
+
+    return npy_file
+
+
+def load_cache(gsd_file, ixn_file, snap, sim):
+    '''Return a CachedTrajectory for the gsd file if its cache is valid for the
+       interaction file and the topology in sim, otherwise None.
+    '''
+
+    if not is_cache_valid(gsd_file, ixn_file):
+        return None
+
+    #check that the cache has every frame, and the number of particles the topology expects
+    npy_file, meta_file = get_cache_files(gsd_file)
+    with open(meta_file) as f:
+        metadata = json.load(f)
+
+    if metadata['num_frames'] != sim.frames:
+        return None
+    if metadata['num_particles'] != len(get_cache_index(snap, sim)):
+        return None
+
+    return CachedTrajectory(gsd_file, snap, sim)
+
+
+class BondCache:
+
+    def __init__(self, gsd_file, ixn_file, sim, write = True):
+
+        #set the sidecar directory, and whether new frames are written to it
+        self.__directory = os.path.splitext(gsd_file)[0] + ".saash_bonds"
+        self.__write     = write
+
+        #hash the inputs that determine the bond network of each frame
+        key = get_cache_key(gsd_file, ixn_file)
+        key['cutoff_mult'] = float(sim.cutoff_mult)
+        key['ngrid_R']     = float(sim.ngrid.R)
+        self.__key = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+        #check the key of an existing cache. if it does not match, the cache is stale
+        self.__valid = self.__read_key() == self.__key
+        if self.__write and not self.__valid:
+            self.__reset()
+
+
+    def load(self, frame_num):
+        #return the edge arrays (i, j, codes) and body labels of the frame, or None
+
+        frame_file = self.__get_frame_file(frame_num)
+        if not self.__valid or not os.path.exists(frame_file):
+            return None
+
+        with np.load(frame_file) as data:
+            return (data['bodies_i'], data['bodies_j'], data['codes']), data['labels']
+
+    def save(self, frame_num, bond_graph):
+        #store the bond network of the frame, if writing is enabled
+
+        if not self.__write:
+            return
+
+        #write to a temporary file first, so a frame file is never partially written
+        bodies_i, bodies_j, codes = bond_graph.get_edges()
+        frame_file = self.__get_frame_file(frame_num)
+        temp_file  = frame_file + ".{}.tmp.npz".format(os.getpid())
+
+        np.savez_compressed(temp_file, bodies_i=bodies_i, bodies_j=bodies_j, codes=codes,
+                            labels=bond_graph.get_labels())
+        os.replace(temp_file, frame_file)
+
+        return
+
+    def is_valid(self):
+
+        return self.__valid
+
+    def __get_frame_file(self, frame_num):
+
+        return os.path.join(self.__directory, "frame_{}.npz".format(frame_num))
+
+    def __read_key(self):
+        #return the key stored with the cache, or None if there is no cache
+
+        key_file = os.path.join(self.__directory, "key.txt")
+        if not os.path.exists(key_file):
+            return None
+
+        with open(key_file) as f:
+            return f.read().strip()
+
+    def __reset(self):
+        #remove the stored frames and store the current key
+
+        os.makedirs(self.__directory, exist_ok=True)
+        for frame_file in glob.glob(os.path.join(self.__directory, "frame_*.npz")):
+            os.remove(frame_file)
+
+        with open(os.path.join(self.__directory, "key.txt"), 'w') as f:
+            f.write(self.__key)
+
+        self.__valid = True
+        return
+
+
+if __name__ == "__main__":
+
+    try:
+        gsd_file = sys.argv[1]
+        ixn_file = sys.argv[2]
+    except:
+        print("Usage: python -m SAASH.cache <gsd_file> <ixn_file>")
+        raise
+
+    build_cache(gsd_file, ixn_file)
@@ -0,0 +1,373 @@
+'''
+
+This file implements a columnar store for the output of a cluster run, as an alternative
+to pickling the whole ClusterOut object into a .cl file.
+
+Unpickling a .cl file loads every ClusterInfo, with the observables of every cluster at
+every frame, before any of it can be used. The cluster store instead writes a directory
+(<prefix>.clstore, or .nclstore for nanocluster runs) of .npy arrays, which are memory
+mapped when loaded, so a single cluster or a single observable can be read without
+touching the rest. The directory holds
+
+    - index.json:   the version, frame jump, number of clusters, and the columns of
+                    each table along with how they are encoded
+    - clusters.npy: a table of cluster metadata, with the birth and death frames,
+                    lifetime, and whether the cluster died, was absorbed, or has a parent
+    - data/:        the stored observables of each cluster at each logged frame
+    - gain/, loss/: the observables when monomers were added to or lost from a cluster
+    - monomers/:    the monomer fraction, ids, and types in each frame
+
+Each table stores one record per row, with offsets.npy giving the rows of each cluster,
+i.e. cluster k owns rows offsets[k]:offsets[k+1]. Each column is encoded as
+
+    - scalar: <column>.npy, one value per record
+    - ragged: <column>.values.npy and <column>.offsets.npy, for lists, sets, or arrays of
+              values, e.g. positions or indices
+    - dict:   <column>.keys.npy, <column>.values.npy, and <column>.offsets.npy, for
+              counts keyed by name, e.g. bonds or types
+
+Existing .cl files can be converted with convert_cluster_file(cl_file), or from the
+command line with
+
+python -m SAASH.clusterstore <cl_file>
+
+'''
+
+import numpy as np
+
+import json
+import os
+import pickle
+import shutil
+import sys
+
+
+#version of the store layout
+STORE_VERSION = 1
+
+#the fields of the cluster metadata table
+METADATA_DTYPE = np.dtype([('birth', np.int64), ('death', np.int64), ('lifetime', np.int64),
+                           ('dead', bool), ('absorbed', bool), ('has_parent', bool)])
+
+
+####################################################################
+################# Writing ##########################################
+####################################################################
+
+def get_store_path(outfile):
+    #return the directory of the cluster store for a .cl (or .ncl) output file name
+
+    return outfile + "store"
+
+
+def get_column_kind(value):
+    #determine how a column is encoded from one of its values
+
+    if isinstance(value, dict):
+        return 'dict'
+
+    if isinstance(value, (list, tuple, set, frozenset, np.ndarray)):
+        return 'ragged'
+
+    return 'scalar'
+
+
+def write_table(directory, records, offsets = None):
+    '''Write a list of records (dicts) as columns in the given directory, along with the
+       offsets of each cluster's records if given. Returns a dict of the column kinds.
+    '''
+
+    os.makedirs(directory, exist_ok=True)
+
+    if offsets is not None:
+        np.save(os.path.join(directory, "offsets.npy"), np.array(offsets, dtype=np.int64))
+
+    #get the columns in the order they first appear, and the kind of each
+    columns = dict()
+    for record in records:
+        for column, value in record.items():
+            if column not in columns:
+                columns[column] = get_column_kind(value)
+
+    for column, kind in columns.items():
+
+        entries = [record[column] for record in records]
+        path    = os.path.join(directory, column)
+
+        if kind == 'scalar':
+            np.save(path + ".npy", np.array(entries))
+            continue
+
+        #store the flattened entries, with the offsets of each record
+        lengths = [len(entry) for entry in entries]
+        np.save(path + ".offsets.npy", np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+
+        if kind == 'ragged':
+            np.save(path + ".values.npy", np.array([x for entry in entries for x in entry]))
+
+        else:
+            np.save(path + ".keys.npy",   np.array([k for entry in entries for k in entry]))
+            np.save(path + ".values.npy", np.array([v for entry in entries for v in entry.values()]))
+
+    return columns
+
+
+def write_store(out_data, path):
+    '''Write the ClusterOut data from a cluster run to a cluster store at the given path.
+       An existing store at the path is replaced.
+    '''
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+    cluster_info = out_data.cluster_info
+
+    #write the metadata table of each cluster
+    metadata = np.zeros(len(cluster_info), dtype=METADATA_DTYPE)
+    for k, info in enumerate(cluster_info):
+
+        ended = info.is_dead() or info.is_absorbed()
+        metadata[k] = (info.get_birth_frame(), info.get_death_frame() if ended else -1,
+                       info.get_lifetime(), info.is_dead(), info.is_absorbed(),
+                       info.has_parent())
+
+    np.save(os.path.join(path, "clusters.npy"), metadata)
+
+    #write the stored data and monomer gain and loss data of each cluster as tables
+    tables  = dict()
+    records = {'data': [], 'gain': [], 'loss': []}
+    offsets = {'data': [0], 'gain': [0], 'loss': [0]}
+
+    for info in cluster_info:
+
+        records['data'].extend(info.get_data())
+        for table, events in [('gain', info.get_monomer_gain_data()),
+                              ('loss', info.get_monomer_loss_data())]:
+            records[table].extend(dict(frame=frame_num, **event) for frame_num, event in events.items())
+
+        for table in records:
+            offsets[table].append(len(records[table]))
+
+    for table in records:
+        tables[table] = write_table(os.path.join(path, table), records[table], offsets[table])
+
+    #write the monomer time series, with one record per frame
+    monomer_records = []
+    for t in range(len(out_data.monomer_frac)):
+
+        record = {'fraction': out_data.monomer_frac[t], 'ids': out_data.monomer_ids[t]}
+        if getattr(out_data, "monomer_types", None):
+            record['types'] = out_data.monomer_types[t]
+        monomer_records.append(record)
+
+    tables['monomers'] = write_table(os.path.join(path, "monomers"), monomer_records)
+
+    #write the index last, so an incomplete store is never loaded
+    jump  = cluster_info[0].get_frame_jump() if len(cluster_info) > 0 else 1
+    index = {'version': STORE_VERSION, 'frame_jump': jump, 'num_clusters': len(cluster_info),
+             'num_frames': len(monomer_records), 'tables': tables}
+
+    with open(os.path.join(path, "index.json"), 'w') as f:
+        json.dump(index, f)
+
+    print("Cluster info written to store: {}".format(path))
+
+    return path
+
+
+def load_cluster_file(cl_file):
+    #unpickle a .cl file, which needs the SAASH util module importable as util
+
+    from . import util
+    sys.modules.setdefault('util', util)
+
+    with open(cl_file, 'rb') as f:
+        return pickle.load(f)
+
+
+def convert_cluster_file(cl_file, path = None):
+    '''Convert a pickled .cl file to a cluster store. The store is written next to the
+       .cl file unless a path is given. Returns the path of the store.
+    '''
+
+    if path is None:
+        path = get_store_path(cl_file)
+
+    return write_store(load_cluster_file(cl_file), path)
+
+
+####################################################################
+################# Loading ##########################################
+####################################################################
+
+class ClusterStore:
+    '''Lazily loads a cluster store. Arrays are memory mapped the first time they are
+       used, so only the parts of the store that are accessed are read from disk.
+    '''
+
+    def __init__(self, path):
+
+        #read the index
+        self.__path = path
+        with open(os.path.join(path, "index.json")) as f:
+            self.__index = json.load(f)
+
+        if self.__index['version'] != STORE_VERSION:
+            raise ValueError("Cluster store {} has version {}, expected {}".format(path,
+                             self.__index['version'], STORE_VERSION))
+
+        #map of loaded arrays
+        self.__arrays = dict()
+
+
+    def get_metadata(self, cluster = None):
+        #return the metadata table, or the row for a single cluster
+
+        metadata = self.__load("clusters.npy")
+        if cluster is None:
+            return metadata
+
+        return metadata[cluster]
+
+    def get_cluster(self, cluster):
+        '''Return a dict with the metadata of the cluster, its stored data as a list of
+           dicts (as given by ClusterInfo.get_data), and its monomer gain and loss data.
+        '''
+
+        output = {field: self.get_metadata(cluster)[field].item() for field in METADATA_DTYPE.names}
+        output['data'] = self.get_records('data', cluster)
+
+        for table in ['gain', 'loss']:
+            events = self.get_records(table, cluster)
+            output[table] = {event.pop('frame'): event for event in events}
+
+        return output
+
+    def get_records(self, table, cluster):
+        #return the records of the cluster in the table as a list of dicts
+
+        start, end = self.__get_rows(table, cluster)
+        columns    = self.get_columns(table)
+
+        values = {column: self.get_observable(column, cluster, table) for column in columns}
+
+        return [{column: values[column][r] for column in columns} for r in range(end-start)]
+
+    def get_observable(self, column, cluster = None, table = 'data'):
+        '''Return a list with the value of a column in each record of the cluster, or in
+           every record of the table if cluster is None.
+        '''
+
+        if cluster is None:
+            start, end = 0, None
+        else:
+            start, end = self.__get_rows(table, cluster)
+
+        return self.__decode(table, column, start, end)
+
+    def get_column(self, column, table = 'data'):
+        '''Return the arrays of a column without decoding them, as a dict with the values,
+           and the offsets (and keys) for ragged (and dict) columns.
+        '''
+
+        kind = self.__get_kind(table, column)
+        path = os.path.join(table, column)
+
+        if kind == 'scalar':
+            return {'values': self.__load(path + ".npy")}
+
+        arrays = {'values' : self.__load(path + ".values.npy"),
+                  'offsets': self.__load(path + ".offsets.npy")}
+        if kind == 'dict':
+            arrays['keys'] = self.__load(path + ".keys.npy")
+
+        return arrays
+
+    def get_record_offsets(self, table = 'data'):
+        #return the offsets of each cluster's records in the table
+
+        return self.__load(os.path.join(table, "offsets.npy"))
+
+    def get_monomer_fractions(self):
+
+        return self.__load(os.path.join("monomers", "fraction.npy"))
+
+    def get_monomer_ids(self, frame_index):
+
+        return self.__decode('monomers', 'ids', frame_index, frame_index+1)[0]
+
+    def get_monomer_types(self, frame_index):
+
+        return self.__decode('monomers', 'types', frame_index, frame_index+1)[0]
+
+    def get_columns(self, table = 'data'):
+
+        return list(self.__index['tables'][table])
+
+    def get_num_clusters(self):
+
+        return self.__index['num_clusters']
+
+    def get_num_frames(self):
+
+        return self.__index['num_frames']
+
+    def get_frame_jump(self):
+
+        return self.__index['frame_jump']
+
+    def __get_kind(self, table, column):
+
+        columns = self.__index['tables'][table]
+        if column not in columns:
+            raise KeyError("Column {} is not in the {} table".format(column, table))
+
+        return columns[column]
+
+    def __get_rows(self, table, cluster):
+        #return the range of rows of the cluster in the table
+
+        offsets = self.get_record_offsets(table)
+        return int(offsets[cluster]), int(offsets[cluster+1])
+
+    def __decode(self, table, column, start, end):
+        #convert the records in rows start to end of a column to python values
+
+        kind   = self.__get_kind(table, column)
+        arrays = self.get_column(column, table)
+        values = arrays['values']
+
+        if kind == 'scalar':
+            return values[start:end].tolist()
+
+        #get the range of entries in each record
+        offsets = arrays['offsets'][start:None if end is None else end+1]
+        ranges  = [(int(offsets[r]), int(offsets[r+1])) for r in range(len(offsets)-1)]
+
+        if kind == 'ragged':
+            if values.ndim > 1:
+                return [list(np.array(values[a:b])) for a, b in ranges]
+            return [values[a:b].tolist() for a, b in ranges]
+
+        keys = arrays['keys']
+        return [dict(zip(keys[a:b].tolist(), values[a:b].tolist())) for a, b in ranges]
+
+    def __load(self, filename):
+        #memory map the array in the file, the first time it is needed
+
+        if filename not in self.__arrays:
+            self.__arrays[filename] = np.load(os.path.join(self.__path, filename), mmap_mode='r')
+
+        return self.__arrays[filename]
+
+
+if __name__ == "__main__":
+
+    try:
+        cl_file = sys.argv[1]
+    except:
+        print("Usage: python -m SAASH.clusterstore <cl_file>")
+        raise
+
+    convert_cluster_file(cl_file)
@@ -0,0 +1,186 @@
+'''
+
+This file tracks the adsorption and desorption of bodies on nanoparticles across the
+frames of a nanoparticle run, and computes binding kinetics from the result.
+
+Nanoparticles keep their index (their order in get_nanoparticles) and bodies keep their
+HOOMD body id across frames, so the adsorbed set of each nanoparticle can be compared to
+the previous analyzed frame. Changes are written as they happen to a <prefix>.npev file,
+with one row per event
+
+    frame nano body event
+
+where event is 1 for an adsorption, -1 for a desorption, and 0 for a body already
+adsorbed in the first analyzed frame.
+
+The largest cluster on each nanoparticle is also given an id, which is kept from frame to
+frame while the largest cluster shares bodies with the previous one. Each time the id on
+a nanoparticle changes, a row
+
+    frame nano cluster_id size
+
+is written to a <prefix>.npcl file, with cluster_id -1 when there is no cluster larger
+than one body.
+
+Residence times and on/off rates are computed from the event table with array operations
+only, by load_events, get_residence_times, and get_rates.
+
+'''
+
+import numpy as np
+
+import os
+
+
+#event codes in the event table
+EVENT_INITIAL = 0
+EVENT_ADSORB  = 1
+EVENT_DESORB  = -1
+
+
+class NanoEventWriter:
+    '''Writes the adsorption events and largest cluster ids of a nanoparticle run, from
+       the adsorbed and largest cluster body ids that analyze_nano gives for each frame.
+    '''
+
+    def __init__(self, observer):
+
+        #open the event and cluster id files
+        prefix = os.path.splitext(observer.get_outfile())[0]
+        self.__event_file   = prefix + ".npev"
+        self.__cluster_file = prefix + ".npcl"
+
+        self.__event_out   = open(self.__event_file, 'w')
+        self.__cluster_out = open(self.__cluster_file, 'w')
+        self.__event_out.write("# frame nano body event\n")
+        self.__cluster_out.write("# frame nano cluster_id size\n")
+
+        #init the adsorbed bodies and largest cluster of each nanoparticle
+        self.__adsorbed    = None
+        self.__largest     = None
+        self.__cluster_ids = None
+        self.__next_id     = 0
+
+
+    def add_frame(self, frame_num, result):
+        #write the events between the previous frame and this one
+
+        all_q, extras = result
+        adsorbed, largest = extras['adsorbed'], extras['largest']
+
+        #in the first frame, every adsorbed body is an initial event
+        first = self.__adsorbed is None
+        if first:
+            self.__adsorbed    = [np.array([], dtype=int) for ids in adsorbed]
+            self.__largest     = [np.array([], dtype=int) for ids in largest]
+            self.__cluster_ids = [-1 for ids in largest]
+
+        for nano, ids in enumerate(adsorbed):
+
+            #find the bodies that arrived and left since the previous frame
+            arrived = np.setdiff1d(ids, self.__adsorbed[nano])
+            left    = np.setdiff1d(self.__adsorbed[nano], ids)
+
+            code = EVENT_INITIAL if first else EVENT_ADSORB
+            self.__write_events(frame_num, nano, arrived, code)
+            self.__write_events(frame_num, nano, left, EVENT_DESORB)
+
+            self.__adsorbed[nano] = np.asarray(ids)
+
+        for nano, ids in enumerate(largest):
+            self.__update_cluster(frame_num, nano, np.asarray(ids))
+
+        return
+
+    def close(self):
+
+        self.__event_out.close()
+        self.__cluster_out.close()
+
+        print("Nanoparticle adsorption events written to file: {}".format(self.__event_file))
+        print("Nanoparticle cluster ids written to file: {}".format(self.__cluster_file))
+
+        return
+
+    def __write_events(self, frame_num, nano, body_ids, code):
+
+        for body_id in body_ids:
+            self.__event_out.write("{} {} {} {}\n".format(frame_num, nano, body_id, code))
+
+        return
+
+    def __update_cluster(self, frame_num, nano, ids):
+        #keep the id of the largest cluster if it shares bodies with the previous one
+
+        if len(ids) == 0:
+            cluster_id = -1
+        elif len(np.intersect1d(ids, self.__largest[nano])) > 0:
+            cluster_id = self.__cluster_ids[nano]
+        else:
+            cluster_id = self.__next_id
+            self.__next_id += 1
+
+        if cluster_id != self.__cluster_ids[nano]:
+            self.__cluster_out.write("{} {} {} {}\n".format(frame_num, nano, cluster_id, len(ids)))
+
+        self.__largest[nano]     = ids
+        self.__cluster_ids[nano] = cluster_id
+
+        return
+
+
+def load_events(event_file):
+    #return the event table as an integer array with columns (frame, nano, body, event)
+
+    return np.loadtxt(event_file, dtype=np.int64, ndmin=2).reshape(-1, 4)
+
+
+def get_residence_times(events, include_initial = False):
+    '''Return the nanoparticle, body, and residence time (in frames) of each adsorption
+       that ended in a desorption, as arrays. Bodies adsorbed in the first frame are only
+       included if include_initial is True, since their adsorption time is not known.
+    '''
+
+    frames, nanos, bodies, codes = events.T
+
+    #sort the events of each (nano, body) pair in time. events of a pair alternate
+    order = np.lexsort((frames, bodies, nanos))
+    frames, nanos, bodies, codes = frames[order], nanos[order], bodies[order], codes[order]
+
+    #pair each desorption with the adsorption just before it
+    ends   = np.flatnonzero(codes[1:] == EVENT_DESORB) + 1
+    starts = ends - 1
+    valid  = (nanos[starts] == nanos[ends]) & (bodies[starts] == bodies[ends])
+    if include_initial:
+        valid &= codes[starts] >= EVENT_INITIAL
+    else:
+        valid &= codes[starts] == EVENT_ADSORB
+
+    starts, ends = starts[valid], ends[valid]
+
+    return nanos[ends], bodies[ends], frames[ends] - frames[starts]
+
+
+def get_rates(events, first_frame, final_frame, num_nanos = None):
+    '''Return the on and off rates of each nanoparticle, per frame, between the first and
+       final frames. The on rate is the number of adsorptions per frame, and the off rate
+       is the number of desorptions per frame that a body spends adsorbed.
+    '''
+
+    frames, nanos, bodies, codes = events.T
+    if num_nanos is None:
+        num_nanos = nanos.max() + 1 if len(nanos) > 0 else 0
+
+    #count the adsorptions and desorptions of each nanoparticle
+    num_on  = np.bincount(nanos[codes == EVENT_ADSORB], minlength=num_nanos)
+    num_off = np.bincount(nanos[codes == EVENT_DESORB], minlength=num_nanos)
+
+    #integrate the number of adsorbed bodies over time. each event changes it by +1 or -1
+    change    = np.where(codes == EVENT_DESORB, -1, 1)
+    occupancy = np.bincount(nanos, weights=change * (final_frame - frames), minlength=num_nanos)
+
+    elapsed  = final_frame - first_frame
+    on_rate  = num_on / elapsed if elapsed > 0 else np.zeros(num_nanos)
+    off_rate = np.divide(num_off, occupancy, out=np.zeros(num_nanos), where=occupancy > 0)
+
+    return on_rate, off_rate
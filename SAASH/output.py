@@ -0,0 +1,602 @@
+'''
+
+This file contains streaming writers for the text outputs of bulk, nanoparticle, and
+capsid runs. Each frame's row is written (buffered) as soon as the frame is analyzed, so
+memory does not grow with the length of the trajectory, and a run that stops early
+leaves the rows of all analyzed frames on disk.
+
+The .np output has a fixed number of columns, so its rows are written directly. The
+.sizes, .fsizes, and .cap outputs have columns that depend on every frame (the largest
+cluster size, the microstates seen, or the bond counts seen), so their rows are first
+written to a <outfile>.partial file in a sparse format
+
+frame_num [largest] key:count key:count ...
+
+listing only the entries present in the frame. When the writer is closed, a finalize
+pass reads the partial file one row at a time and writes the usual dense output, then
+removes the partial file.
+
+Alternatively, the outputs can be written in a binary format, as a compressed .npz file
+next to the text output name (e.g. traj.sizes.npz). These contain
+
+    - frames:  the frame number of each row
+    - counts:  a frames x columns count matrix, stored in sparse (COO) form when mostly
+               zero. The columns are the cluster sizes (bulk), the bond counts (capsid, with
+               the graph hash if it is the capsid key), or
+               the microstates (focused sizes), given by the columns array
+    - largest: the largest cluster size in each frame (bulk)
+    - data:    a frames x nanoparticles x 3 array (nanoparticle)
+
+The nonzero counts are kept in memory until the file is written. load_output returns
+the arrays of either format directly.
+
+'''
+
+import numpy as np
+from scipy.sparse import coo_matrix
+
+import os
+
+from . import events
+from . import profiles
+
+
+def write_sparse_row(fout, frame_num, entries, fields = ()):
+    #write a row of the partial file with the given fields and key:count entries
+
+    fout.write("{}".format(frame_num))
+    for field in fields:
+        fout.write(" {}".format(field))
+    for key, count in entries:
+        fout.write(" {}:{}".format(key, count))
+    fout.write("\n")
+
+    return
+
+
+def read_sparse_rows(partial_file):
+    #yield the frame, other fields, and dict of key:count entries for each row
+
+    with open(partial_file) as f:
+        for line in f:
+
+            tokens  = line.split()
+            fields  = [token for token in tokens[1:] if ':' not in token]
+            entries = dict(token.split(':') for token in tokens[1:] if ':' in token)
+
+            yield tokens[0], fields, entries
+
+
+class SizesWriter:
+    '''Writes the cluster size distribution of each frame to the .sizes file, and the
+       microstate distribution of each size in the focus list to a .fsizes file.
+    '''
+
+    def __init__(self, observer):
+
+        #open the partial file for the sizes
+        self.__outfile      = observer.get_outfile()
+        self.__partial_file = self.__outfile + ".partial"
+        self.__fout         = open(self.__partial_file, 'w')
+
+        #track the largest cluster size over all frames
+        self.__max_size = 0
+
+        #create a writer for each focused cluster size
+        self.__focus_writers = []
+        focus_list = observer.get_focus_list()
+        if focus_list is not None:
+
+            for csize in focus_list:
+
+                focus_outfile = self.__outfile.split('.sizes')[0] + "_" + str(csize) + ".fsizes"
+                self.__focus_writers.append(FocusWriter(csize, focus_outfile))
+
+
+    def add_frame(self, frame_num, result):
+        #write the sizes of a frame, given as the result of analyze_bulk
+
+        sizes, largest = result[0], result[1]
+        self.__max_size = max(self.__max_size, largest)
+
+        entries = [(size, sizes[size]) for size in sorted(sizes) if size > 0]
+        write_sparse_row(self.__fout, frame_num, entries, fields=[largest])
+
+        for focus_writer in self.__focus_writers:
+            focus_writer.add_frame(frame_num, result[2])
+
+        return
+
+    def close(self):
+        #write the dense sizes file from the partial file, and close the focus writers
+
+        self.__fout.close()
+
+        with open(self.__outfile, 'w') as fout:
+
+            for frame_num, fields, entries in read_sparse_rows(self.__partial_file):
+
+                fout.write("{} ".format(frame_num))
+                for size in range(1, self.__max_size+1):
+                    fout.write("{} ".format(entries.get(str(size), 0)))
+                fout.write("{}".format(fields[0]))
+                fout.write("\n")
+
+        os.remove(self.__partial_file)
+        print("Cluster sizes written to file: {}".format(self.__outfile))
+
+        for focus_writer in self.__focus_writers:
+            focus_writer.close()
+
+        return
+
+
+class FocusWriter:
+    '''Writes the number of each microstate of a given cluster size in each frame.
+       Microstates are numbered in the order they first appear.
+    '''
+
+    def __init__(self, csize, outfile):
+
+        #open the partial file
+        self.__csize        = csize
+        self.__outfile      = outfile
+        self.__partial_file = outfile + ".partial"
+        self.__fout         = open(self.__partial_file, 'w')
+
+        #map each microstate to its index
+        self.__key_map = dict()
+
+
+    def add_frame(self, frame_num, distribution):
+        #write the microstate counts of a frame, indexing any new microstates
+
+        size_dist = distribution[self.__csize]
+
+        entries = []
+        for microstate in size_dist:
+
+            if microstate not in self.__key_map:
+                self.__key_map[microstate] = len(self.__key_map)
+
+            entries.append((self.__key_map[microstate], size_dist[microstate]))
+
+        write_sparse_row(self.__fout, frame_num, entries)
+
+        return
+
+    def close(self):
+        #write the microstate definitions and the dense rows, or remove an empty output
+
+        self.__fout.close()
+
+        #check if the requested size has no members. if not, give a message to the user
+        if len(self.__key_map) == 0:
+
+            os.remove(self.__partial_file)
+            print("No clusters of size {} found\n".format(self.__csize))
+            return
+
+        with open(self.__outfile, 'w') as fout:
+
+            #print the first line, giving the definitions of each microstate
+            fout.write("Microstates: ")
+            for microstate, index in self.__key_map.items():
+                fout.write("( {} : {} ),".format(index, microstate))
+            fout.write("\n")
+
+            #write the counts of all microstates in indexed order
+            for frame_num, fields, entries in read_sparse_rows(self.__partial_file):
+
+                fout.write("{} ".format(frame_num))
+                for index in range(len(self.__key_map)):
+                    fout.write("{} ".format(entries.get(str(index), 0)))
+                fout.write("\n")
+
+        os.remove(self.__partial_file)
+        print("Cluster microstates (size {}) written to file: {}".format(self.__csize,
+                                                                        self.__outfile))
+
+        return
+
+
+class NanoparticleWriter:
+    '''Writes the adsorbed count, largest cluster size, and number of bonds in the
+       largest cluster for each nanoparticle in each frame to the .np file.
+    '''
+
+    def __init__(self, observer):
+
+        self.__outfile = observer.get_outfile()
+        self.__fout    = open(self.__outfile, 'w')
+
+        #the number of nanoparticles is set by the first frame
+        self.__num_nanos = None
+
+
+    def add_frame(self, frame_num, result):
+        #write the data of each nanoparticle in the frame
+
+        q, extras = result
+        if self.__num_nanos is None:
+            self.__num_nanos = len(q)
+
+        self.__fout.write("{}".format(frame_num))
+        for nano in range(self.__num_nanos):
+            self.__fout.write(",%s,%s,%s"%(q[nano][0], q[nano][1], q[nano][2]))
+        self.__fout.write("\n")
+
+        return
+
+    def close(self):
+
+        self.__fout.close()
+        print("Nanoparticle assembly info written to file: {}".format(self.__outfile))
+
+        return
+
+
+def get_capsid_columns(keys, n_bonds_perfect, capsid_key):
+    #return the sorted columns of the capsid distribution. keyed by bonds, the bond count
+    #of a perfect capsid is always a column. keyed by graph hash, columns sort by bond count
+
+    if capsid_key == 'graph_hash':
+        return sorted(keys, key=lambda key: (int(key.split('_')[0]), key))
+
+    return sorted(set(keys) | {n_bonds_perfect})
+
+
+class CapsidWriter:
+    '''Writes the number of clusters of the perfect size with each number of bonds in
+       each frame to the .cap file. The bond count of a perfect capsid is always a column.
+    '''
+
+    def __init__(self, observer, N_perfect, bond_perfect):
+
+        #open the partial file
+        self.__outfile      = observer.get_outfile()
+        self.__partial_file = self.__outfile + ".partial"
+        self.__fout         = open(self.__partial_file, 'w')
+
+        #number of bonds in perfect capsid
+        self.__n_bonds_perfect = N_perfect*bond_perfect//2
+        self.__capsid_key      = observer.get_capsid_key()
+
+        #track all bond counts seen
+        self.__all_sizes = set()
+
+
+    def add_frame(self, frame_num, bond_dict):
+        #write the number of clusters with each number of bonds in the frame
+
+        self.__all_sizes.update(bond_dict.keys())
+        write_sparse_row(self.__fout, frame_num, bond_dict.items())
+
+        return
+
+    def close(self):
+        #write the header of all bond counts and the dense rows
+
+        self.__fout.close()
+
+        possible_bonds = get_capsid_columns(self.__all_sizes, self.__n_bonds_perfect,
+                                            self.__capsid_key)
+
+        with open(self.__outfile, 'w') as fout:
+
+            #Header
+            fout.write("frame ")
+            for key in possible_bonds:
+                fout.write("{} ".format(key))
+            fout.write("\n")
+
+            #write the data
+            for frame_num, fields, entries in read_sparse_rows(self.__partial_file):
+
+                fout.write("{} ".format(frame_num))
+                for key in possible_bonds:
+                    fout.write("{} ".format(entries.get(str(key), 0)))
+                fout.write("\n")
+
+        os.remove(self.__partial_file)
+        print("Capsid bond distribution written to file: {}".format(self.__outfile))
+
+        return
+
+
+
+
+####################################################################
+################# Binary Output ####################################
+####################################################################
+
+#store count matrices sparsely when at most this fraction of entries is nonzero
+SPARSE_DENSITY = 0.25
+
+
+class CountMatrix:
+    '''Accumulates the nonzero entries of a frames x columns count matrix, where the
+       columns are keys (sizes, bond counts, or microstate indices) found as frames
+       are added.
+    '''
+
+    def __init__(self):
+
+        #store the frame numbers, and the row, key, and count of each nonzero entry
+        self.__frames = []
+        self.__rows   = []
+        self.__keys   = []
+        self.__counts = []
+
+
+    def add_row(self, frame_num, entries):
+        #add the row of a frame, given as (key, count) pairs
+
+        row = len(self.__frames)
+        self.__frames.append(frame_num)
+
+        for key, count in entries:
+            if count != 0:
+                self.__rows.append(row)
+                self.__keys.append(key)
+                self.__counts.append(count)
+
+        return
+
+    def get_arrays(self, columns):
+        '''Return the arrays to save for the matrix with the given column keys. The
+           matrix is stored densely, or sparsely if at most SPARSE_DENSITY of it is nonzero.
+        '''
+
+        #get the column index of each entry
+        column_index = {key: i for i, key in enumerate(columns)}
+        cols  = np.array([column_index[key] for key in self.__keys], dtype=np.int64)
+        rows  = np.array(self.__rows, dtype=np.int64)
+        data  = np.array(self.__counts, dtype=np.int64)
+        shape = np.array([len(self.__frames), len(columns)], dtype=np.int64)
+
+        arrays = {'frames': np.array(self.__frames, dtype=np.int64)}
+        if len(data) <= SPARSE_DENSITY * shape[0] * shape[1]:
+            arrays.update(count_rows=rows, count_cols=cols, count_data=data, count_shape=shape)
+        else:
+            counts = np.zeros(shape, dtype=np.int64)
+            counts[rows, cols] = data
+            arrays['counts'] = counts
+
+        return arrays
+
+    def get_keys(self):
+
+        return set(self.__keys)
+
+
+def save_npz(outfile, arrays, message):
+    #save the arrays to a compressed npz file, and report it
+
+    np.savez_compressed(outfile, **arrays)
+    print("{} written to file: {}".format(message, outfile))
+
+    return
+
+
+def load_output(npz_file, dense = False):
+    '''Load a binary output file, returning a dict of its arrays. A sparse count matrix
+       is returned as a scipy.sparse csr_matrix, or as an array if dense is True.
+    '''
+
+    with np.load(npz_file) as data:
+        arrays = {name: data[name] for name in data.files}
+
+    #rebuild a sparse count matrix
+    if 'count_data' in arrays:
+
+        shape  = tuple(arrays.pop('count_shape'))
+        counts = coo_matrix((arrays.pop('count_data'), 
+                            (arrays.pop('count_rows'), arrays.pop('count_cols'))), shape=shape)
+        arrays['counts'] = counts.toarray() if dense else counts.tocsr()
+
+    return arrays
+
+
+class NpzSizesWriter:
+    #writes the cluster size distributions, and focused microstates, as npz files
+
+    def __init__(self, observer):
+
+        self.__outfile = observer.get_outfile() + ".npz"
+        self.__counts  = CountMatrix()
+        self.__largest = []
+
+        #create a writer for each focused cluster size
+        self.__focus_writers = []
+        focus_list = observer.get_focus_list()
+        if focus_list is not None:
+
+            for csize in focus_list:
+
+                focus_outfile = observer.get_outfile().split('.sizes')[0] + "_" + str(csize) 
+                self.__focus_writers.append(NpzFocusWriter(csize, focus_outfile + ".fsizes.npz"))
+
+
+    def add_frame(self, frame_num, result):
+        #add the sizes of a frame, given as the result of analyze_bulk
+
+        sizes, largest = result[0], result[1]
+        self.__largest.append(largest)
+        self.__counts.add_row(frame_num, [(size, sizes[size]) for size in sizes if size > 0])
+
+        for focus_writer in self.__focus_writers:
+            focus_writer.add_frame(frame_num, result[2])
+
+        return
+
+    def close(self):
+        #save the count matrix with a column for each size up to the largest
+
+        max_size = int(max(self.__largest)) if len(self.__largest) > 0 else 0
+        columns  = np.arange(1, max_size+1)
+
+        arrays = self.__counts.get_arrays(columns.tolist())
+        arrays['columns'] = columns
+        arrays['largest'] = np.array(self.__largest, dtype=np.int64)
+        save_npz(self.__outfile, arrays, "Cluster sizes")
+
+        for focus_writer in self.__focus_writers:
+            focus_writer.close()
+
+        return
+
+
+class NpzFocusWriter:
+    #writes the number of each microstate of a cluster size in each frame as an npz file
+
+    def __init__(self, csize, outfile):
+
+        self.__csize   = csize
+        self.__outfile = outfile
+        self.__counts  = CountMatrix()
+        self.__key_map = dict()
+
+
+    def add_frame(self, frame_num, distribution):
+        #add the microstate counts of a frame, indexing any new microstates
+
+        size_dist = distribution[self.__csize]
+        for microstate in size_dist:
+            if microstate not in self.__key_map:
+                self.__key_map[microstate] = len(self.__key_map)
+
+        self.__counts.add_row(frame_num, [(self.__key_map[microstate], count) 
+                                          for microstate, count in size_dist.items()])
+
+        return
+
+    def close(self):
+        #save the counts, with the microstates as column labels
+
+        if len(self.__key_map) == 0:
+            print("No clusters of size {} found\n".format(self.__csize))
+            return
+
+        arrays = self.__counts.get_arrays(list(range(len(self.__key_map))))
+        arrays['columns'] = np.array([str(microstate) for microstate in self.__key_map])
+        save_npz(self.__outfile, arrays, "Cluster microstates (size {})".format(self.__csize))
+
+        return
+
+
+class NpzNanoparticleWriter:
+    #writes the data for each nanoparticle in each frame as an npz file
+
+    def __init__(self, observer):
+
+        self.__outfile = observer.get_outfile() + ".npz"
+        self.__frames  = []
+        self.__data    = []
+
+
+    def add_frame(self, frame_num, result):
+
+        q, extras = result
+        self.__frames.append(frame_num)
+        self.__data.append(q)
+
+        return
+
+    def close(self):
+
+        arrays = {'frames': np.array(self.__frames, dtype=np.int64),
+                  'data'  : np.array(self.__data, dtype=np.int64)}
+        save_npz(self.__outfile, arrays, "Nanoparticle assembly info")
+
+        return
+
+
+class NpzCapsidWriter:
+    #writes the capsid bond distribution in each frame as an npz file
+
+    def __init__(self, observer, N_perfect, bond_perfect):
+
+        self.__outfile = observer.get_outfile() + ".npz"
+        self.__counts  = CountMatrix()
+
+        #number of bonds in perfect capsid (always a column)
+        self.__n_bonds_perfect = N_perfect*bond_perfect//2
+        self.__capsid_key      = observer.get_capsid_key()
+
+
+    def add_frame(self, frame_num, bond_dict):
+
+        self.__counts.add_row(frame_num, bond_dict.items())
+
+        return
+
+    def close(self):
+
+        columns = get_capsid_columns(self.__counts.get_keys(), self.__n_bonds_perfect,
+                                     self.__capsid_key)
+
+        arrays = self.__counts.get_arrays(columns)
+        if self.__capsid_key == 'graph_hash':
+            arrays['columns'] = np.array(columns, dtype=str)
+        else:
+            arrays['columns'] = np.array(columns, dtype=np.int64)
+        save_npz(self.__outfile, arrays, "Capsid bond distribution")
+
+        return
+
+
+class NanoOutputWriter:
+    '''Passes the results of analyze_nano, the per nanoparticle data and the dict of extra
+       data, to the nanoparticle writer and to the writers of the extra data.
+    '''
+
+    def __init__(self, writer, extra_writers):
+
+        self.__writers = [writer] + extra_writers
+
+
+    def add_frame(self, frame_num, result):
+
+        for writer in self.__writers:
+            writer.add_frame(frame_num, result)
+
+        return
+
+    def close(self):
+
+        for writer in self.__writers:
+            writer.close()
+
+        return
+
+
+def get_writer(observer, N_perfect = 12, bond_perfect = 5):
+    #return the writer for the observer's run type and output format
+
+    run_type = observer.get_run_type()
+    binary   = observer.get_output_format() == 'npz'
+
+    if run_type == 'bulk':
+        return NpzSizesWriter(observer) if binary else SizesWriter(observer)
+
+    elif run_type == 'nanoparticle':
+        writer = NpzNanoparticleWriter(observer) if binary else NanoparticleWriter(observer)
+
+        #write the adsorption events and radial profiles as well, if requested
+        extra_writers = []
+        if observer.get_nano_events():
+            extra_writers.append(events.NanoEventWriter(observer))
+        if observer.get_radial_profile() is not None:
+            extra_writers.append(profiles.RadialProfileWriter(observer))
+
+        if len(extra_writers) > 0:
+            return NanoOutputWriter(writer, extra_writers)
+        return writer
+
+    elif run_type == 'capsid':
+        if binary:
+            return NpzCapsidWriter(observer, N_perfect, bond_perfect)
+        return CapsidWriter(observer, N_perfect, bond_perfect)
+
+    raise ValueError("No output writer for run type {}".format(run_type))
@@ -0,0 +1,166 @@
+'''
+
+This file computes radial profiles of subunits around nanoparticles, as an optional part of
+a nanoparticle run.
+
+In each frame, the distances from each nanoparticle to every body center and every
+interacting pseudoatom are binned into num_bins radial shells of equal width between 0
+and r_max. By default, r_max is the adsorption cutoff of the largest nanoparticle type,
+i.e. radius * radius_mult + largest_bond_distance. The body center distances are the
+ones already computed to find the adsorbed bodies, and the pseudoatom distances are
+computed for batches of nanoparticles at once, with the minimum image convention.
+
+The histograms are summed over all frames in fixed size (nanoparticles x num_bins) arrays,
+and written at the end of the run to a compressed <prefix>.nprad.npz file, holding
+
+    - edges:       the num_bins+1 shell edges
+    - body_counts: the total number of body centers in each shell of each nanoparticle
+    - atom_counts: the total number of pseudoatoms in each shell of each nanoparticle
+    - num_frames:  the number of frames summed
+    - dim:         the dimension of the system, to compute shell volumes
+
+load_profiles returns these arrays, along with the mean number (coverage) and density of
+bodies and pseudoatoms in each shell per frame.
+
+'''
+
+import numpy as np
+
+import os
+
+from .structure import body as body
+
+
+#number of distances to compute in a single batch
+BATCH_SIZE = 2**22
+
+
+def get_profile_range(sim, observer):
+    #return the outer radius of the profiles, the largest adsorption cutoff by default
+
+    r_max = observer.get_radial_profile()[1]
+    if r_max is not None:
+        return r_max
+
+    return max(nano.get_radius() * sim.radius_mult + sim.largest_bond_distance
+               for nano in sim.nanos)
+
+
+def bin_distances(dist, num_bins, r_max):
+    #count the distances (nanoparticles x points) in each radial shell of each nanoparticle
+
+    num_nanos = dist.shape[0]
+
+    #get the shell of each distance, and drop those outside of r_max
+    shells = (dist * (num_bins / r_max)).astype(np.int64)
+    rows   = np.broadcast_to(np.arange(num_nanos)[:, np.newaxis], dist.shape)
+    inside = shells < num_bins
+
+    counts = np.bincount(rows[inside] * num_bins + shells[inside],
+                         minlength=num_nanos * num_bins)
+
+    return counts.reshape(num_nanos, num_bins)
+
+
+def get_radial_histograms(positions, nanoparticles, sim, num_bins, r_max):
+    #return the radial histogram of the positions around each nanoparticle
+
+    counts = np.zeros((len(nanoparticles), num_bins), dtype=np.int64)
+    if len(positions) == 0 or len(nanoparticles) == 0:
+        return counts
+
+    centers = np.array([nano.get_position() for nano in nanoparticles])
+
+    #compute the distances for as many nanoparticles at once as fit in a batch
+    batch = max(1, BATCH_SIZE // len(positions))
+    for start in range(0, len(nanoparticles), batch):
+
+        dist2 = body.distance2(positions[np.newaxis, :, :],
+                               centers[start:start+batch, np.newaxis, :], sim.box_dim)
+        counts[start:start+batch] = bin_distances(np.sqrt(dist2), num_bins, r_max)
+
+    return counts
+
+
+def get_radial_profiles(snap, sim, observer, nanoparticles, dist2):
+    '''Return a dict with the shell edges, and the histograms of body centers and
+       pseudoatoms around each nanoparticle in the frame. dist2 holds the squared
+       distances from each nanoparticle to each body center.
+    '''
+
+    num_bins = observer.get_radial_profile()[0]
+    r_max    = get_profile_range(sim, observer)
+
+    body_counts = np.zeros((len(nanoparticles), num_bins), dtype=np.int64)
+    if dist2.size > 0:
+        body_counts = bin_distances(np.sqrt(dist2), num_bins, r_max)
+
+    atom_positions = sim.topology.get_atom_positions(snap)
+    atom_counts    = get_radial_histograms(atom_positions, nanoparticles, sim, num_bins, r_max)
+
+    return {'edges': np.linspace(0, r_max, num_bins+1), 'dim': sim.dim,
+            'bodies': body_counts, 'atoms': atom_counts}
+
+
+class RadialProfileWriter:
+    #sums the radial histograms of each frame, and writes them at the end of the run
+
+    def __init__(self, observer):
+
+        self.__outfile = os.path.splitext(observer.get_outfile())[0] + ".nprad.npz"
+
+        #init the sums, which are sized by the first frame
+        self.__profile    = None
+        self.__num_frames = 0
+
+
+    def add_frame(self, frame_num, result):
+
+        all_q, extras = result
+        profile = extras['profile']
+        if self.__profile is None:
+            self.__profile = {'edges'      : profile['edges'], 'dim': profile['dim'],
+                              'body_counts': np.zeros_like(profile['bodies']),
+                              'atom_counts': np.zeros_like(profile['atoms'])}
+
+        self.__profile['body_counts'] += profile['bodies']
+        self.__profile['atom_counts'] += profile['atoms']
+        self.__num_frames += 1
+
+        return
+
+    def close(self):
+
+        if self.__profile is None:
+            return
+
+        np.savez_compressed(self.__outfile, num_frames=self.__num_frames, **self.__profile)
+        print("Nanoparticle radial profiles written to file: {}".format(self.__outfile))
+
+        return
+
+
+def load_profiles(npz_file):
+    '''Load the radial profiles, returning a dict with the stored arrays, as well as the
+       mean number (body_coverage, atom_coverage) and number density (body_density,
+       atom_density) of bodies and pseudoatoms in each shell per frame.
+    '''
+
+    with np.load(npz_file) as data:
+        profile = {name: data[name] for name in data.files}
+
+    #get the area (2d) or volume (3d) of each shell
+    edges = profile['edges']
+    dim   = int(profile['dim'])
+    if dim == 2:
+        shell_volumes = np.pi * np.diff(edges ** 2)
+    else:
+        shell_volumes = 4.0 / 3.0 * np.pi * np.diff(edges ** 3)
+
+    num_frames = max(int(profile['num_frames']), 1)
+    for name in ['body', 'atom']:
+        coverage = profile[name + '_counts'] / num_frames
+        profile[name + '_coverage'] = coverage
+        profile[name + '_density']  = coverage / shell_volumes
+
+    return profile
@@ -21,13 +21,18 @@ import warnings
 import sys, os
 
 from .structure import body
+from .structure import bondengine
+from .structure import topology
 from .util import neighborgrid as ng
+from .util import kernels
 
 
 class SimInfo:
 
     def __init__(self, snap, frames, ixn_file = "interactions.txt", cutoff_mult = 1.35, 
-                 radius_mult = 1.6, ngrid_R = None, verbose = True):
+                 radius_mult = 1.6, ngrid_R = None, bond_backend = 'vectorized', 
+                 bond_search = 'body', verlet_skin = None, kernel_backend = 'auto', 
+                 verbose = True):
         
         #do a verbosity check
         self.verbose = verbose
@@ -40,6 +45,10 @@ class SimInfo:
         self.cutoff_mult = cutoff_mult
         self.radius_mult = radius_mult
         self.ngrid_R     = ngrid_R
+        self.bond_backend= bond_backend
+        self.bond_search = bond_search
+        self.verlet_skin = verlet_skin
+        self.kernel_backend = kernel_backend
         self.vprint("This simulation output contains {} frames".format(frames))
 
         #set the bond and nanoparticle information using ixn_file
@@ -77,14 +86,33 @@ class SimInfo:
         self.interacting_types_mapped = []
         self.__construct_map(snap)
 
+        #build the static grouping of pseudoatoms into bodies, reused every frame
+        self.topology = topology.Topology(snap, self)
+
         #get the max subunit size
         self.max_subunit_size = self.__get_max_subunit_size(snap)
         self.vprint("The largest center-to-atom distance is {}".format(self.max_subunit_size))
 
+        #get the reach of each pseudoatom type on each body type, and of each bond type
+        self.type_reach = None
+        self.bond_reach = []
+        self.__compute_reach(snap)
+
         #construct a neighborgrid using the sim box and info on interaction ranges
         self.ngrid = None
+        self.grid_lims     = []
+        self.grid_periodic = []
         self.__create_neighbor_grid()
 
+        #set up the backend used to detect bonds
+        self.bond_engine = None
+        self.bond_grids  = []
+        self.verlet_list = None
+        self.__create_bond_engine()
+
+        #set the on-disk cache of bond networks. set by run_analysis if requested
+        self.bond_cache = None
+
         self.vprint("\n")
 
         #check if the number of particles is zero and throw error
@@ -264,14 +292,25 @@ class SimInfo:
 
             self.interacting_types_mapped.append(self.type_map[p_type])
 
+        #give each bond integer codes for its particle types and its index in the list
+        for code, bond in enumerate(self.bonds):
+
+            type1, type2 = bond.get_types()
+            bond.set_type_ids(self.type_map[type1], self.type_map[type2])
+            bond.set_code(code)
+
+        #store names for converting the integer codes back to strings for output
+        self.type_names = list(type_list)
+        self.bond_names = [bond.get_name() for bond in self.bonds]
+
         return
 
     def __create_neighbor_grid(self):
         #construct a neighbor grid for the simulation
 
         #init arrays to store the bounding box limits and periodicity
-        lims     = []
-        periodic = []
+        lims     = self.grid_lims
+        periodic = self.grid_periodic
 
         #loop over each dimension of the box
         for i in range(len(self.box_dim)):
@@ -300,6 +339,80 @@ class SimInfo:
 
         return
 
+    def __create_bond_engine(self):
+        #check the requested bond detection backend and construct the engine if needed
+
+        allowed_backends = ['particle', 'vectorized']
+        if self.bond_backend not in allowed_backends:
+            raise ValueError("The bond backend '{}' is not supported. "\
+                             "Allowed backends: {}".format(self.bond_backend, allowed_backends))
+
+        allowed_searches = ['body', 'pseudoatom']
+        if self.bond_search not in allowed_searches:
+            raise ValueError("The bond search mode '{}' is not supported. "\
+                             "Allowed modes: {}".format(self.bond_search, allowed_searches))
+
+        #use the compiled kernels when numba is available, unless numpy was requested
+        allowed_kernels = ['auto', 'numpy', 'numba']
+        if self.kernel_backend not in allowed_kernels:
+            raise ValueError("The kernel backend '{}' is not supported. "\
+                             "Allowed backends: {}".format(self.kernel_backend, allowed_kernels))
+
+        if self.kernel_backend == 'numba' and not kernels.NUMBA_AVAILABLE:
+            warnings.warn("The numba kernel backend was requested, but numba could not be "\
+                          "imported. Continuing with the numpy kernels. ")
+
+        if self.kernel_backend != 'numpy' and kernels.NUMBA_AVAILABLE:
+            self.kernel_backend = 'numba'
+        else:
+            self.kernel_backend = 'numpy'
+
+        if self.bond_backend == 'vectorized':
+            self.bond_engine = bondengine.BondEngine(self)
+
+        self.vprint("Using the {} bond detection backend".format(self.bond_backend))
+
+        #for the pseudoatom search, construct a cell list for each bond type
+        if self.bond_search == 'pseudoatom' and self.bond_backend == 'vectorized':
+
+            for bond in self.bonds:
+
+                #size the grid so every pair within the bond cutoff is a candidate
+                R = bond.get_cutoff() * np.sqrt(self.cutoff_mult)
+                self.bond_grids.append(ng.Neighborgrid(self.grid_lims, R, self.grid_periodic))
+
+            self.vprint("Searching for bonds with a pseudoatom cell list per bond type")
+
+        elif self.bond_search == 'pseudoatom':
+            warnings.warn("The pseudoatom bond search is only used by the vectorized backend. "\
+                          "Continuing with the particle search. ")
+
+        #set the kernels used by each cell list
+        if self.bond_backend == 'vectorized':
+            self.vprint("Using the {} kernels for the vectorized search".format(self.kernel_backend))
+
+            use_numba = (self.kernel_backend == 'numba')
+            for grid in [self.ngrid] + self.bond_grids:
+                grid.useNumba = use_numba
+
+        #reuse candidate body pairs between frames if a skin distance is given
+        if self.verlet_skin is not None:
+
+            if self.verlet_skin <= 0:
+                raise ValueError("The Verlet skin distance must be positive")
+
+            if self.bond_search == 'body' and self.bond_backend == 'vectorized':
+                self.verlet_list = ng.VerletList(self.grid_lims, self.ngrid.R, 
+                                                 self.verlet_skin, self.grid_periodic)
+                self.verlet_list.grid.useNumba = self.ngrid.useNumba
+                self.vprint("Reusing candidate pairs with a Verlet skin of {}".format(self.verlet_skin))
+
+            else:
+                warnings.warn("A Verlet skin is only used by the vectorized body search. "\
+                              "Continuing without reusing candidate pairs. ")
+
+        return
+
     def __get_max_subunit_size(self, snap):
         ''' Determine the longest midpoint to pseudoatom distance for the 
             subunits in the snap. Double this distance can be used as an interaction
@@ -353,6 +466,42 @@ class SimInfo:
 
         return max_dist_overall
 
+    def __compute_reach(self, snap):
+        '''Compute the maximum center-to-pseudoatom distance for each body type and 
+           pseudoatom type, type_reach[body_type, atom_type], with -inf if a body type has
+           no pseudoatoms of that type. 
+           
+           For each bond, bond_reach[k][type_i, type_j] is the largest center-to-center 
+           distance at which a body of type_i can bond to a body of type_j, with the first
+           particle type of the bond on body i. Pairs further apart than this can be 
+           rejected without checking any pseudoatom distances.'''
+
+        #get the center position and type of the body owning each pseudoatom
+        topology   = self.topology
+        owner      = np.repeat(np.arange(topology.num_bodies), topology.atom_counts)
+        atom_pos   = topology.get_atom_positions(snap)
+        center_pos = topology.get_center_positions(snap)[owner]
+        body_types = topology.center_types[owner]
+
+        #take the max distance for each body type and pseudoatom type
+        num_types = len(snap.particles.types)
+        self.type_reach = np.full((num_types, num_types), -np.inf)
+        atom_dist = body.distance(center_pos, atom_pos, self.box_dim)
+        np.maximum.at(self.type_reach, (body_types, topology.atom_types), atom_dist)
+
+        #pad the reach slightly, since rigid bodies are only rigid to float precision
+        self.type_reach = self.type_reach * 1.001 + 1e-6
+
+        #combine the reach of each particle type in a bond with its cutoff distance
+        for bond in self.bonds:
+
+            type1, type2 = bond.get_type_ids()
+            cutoff = bond.get_cutoff() * np.sqrt(self.cutoff_mult)
+            reach  = self.type_reach[:, type1][:, None] + self.type_reach[:, type2][None, :]
+            self.bond_reach.append(reach + cutoff)
+
+        return
+
     def multitype(self):
         #if there is one subunit type return False. If there are several, return true
 
@@ -70,12 +70,36 @@ class Bond:
         #give the bond a descriptive strign name - "type1-type2"
         self.__bond_name = type1 + "-" + type2
 
+        #integer codes for the bond and its particle types, set by SimInfo
+        self.__code     = -1
+        self.__type_ids = None
+
+    #setter functions
+
+    def set_code(self, code):
+        #set the integer code of this bond type, i.e. its index in the list of bonds
+
+        self.__code = code
+
+    def set_type_ids(self, type_id1, type_id2):
+        #set the integer (hoomd) types of the two particle types in the bond
+
+        self.__type_ids = tuple((type_id1, type_id2))
+
     #getter functions
 
     def get_types(self):
 
         return tuple((self.__type1, self.__type2))
 
+    def get_type_ids(self):
+
+        return self.__type_ids
+
+    def get_code(self):
+
+        return self.__code
+
     def get_cutoff(self):
 
         return self.__cutoff
@@ -115,43 +139,6 @@ class Particle:
         
         return False
 
-    def bind(self, particle, bond, bond_dict = None, use_HOOMD_id = False):
-        #bind the two particles together by augmenting their bodies bond list
-
-        #get the host and target particle body
-        target_body = particle.get_body()
-        host_body   = self.__body
-
-        #get the id of each of these bodies
-        target_body_id = target_body.get_id()
-        host_body_id   = host_body.get_id()
-        
-        #if we want HOOMD body ids instead of new 0 indexed ids
-        if use_HOOMD_id:
-            target_body_id = target_body.get_HOOMD_id()
-            host_body_id   = host_body.get_HOOMD_id()
-
-        #bind the host particle body to the given particle body
-        if not host_body.is_bonded(target_body):
-
-            #bind on the body level
-            host_body.bind(target_body, bond)
-
-            #add indices to bond dict
-            if (bond_dict is not None):
-                bond_dict[host_body_id].append(target_body_id)
-
-        #bind the given body to the host particle
-        if not target_body.is_bonded(host_body):
-
-            #bind on the body level
-            target_body.bind(host_body, bond)
-
-            #add indices to bond dict
-            if (bond_dict is not None):
-                bond_dict[target_body_id].append(host_body_id)
-
-
     #getter functions 
 
     def get_position(self):
@@ -184,48 +171,25 @@ class Body:
         self.__cluster       = None
         self.__cluster_index = -1
 
-        #init a list to store bonds - bodies in this list are bound
-        self.__bonded_list = []
-        self.__bond_types  = []
-
         #init a size, type, and position for the body
-        self.__position  = particle_pos[0] * 0
+        self.__position  = np.zeros(np.shape(particle_pos)[-1])
         self.__body_type = ""
+        self.__typeid    = -1
         self.__size      = 0
 
-        #init an array for particle objects. 
-        self.__num_particles = len(particle_pos)
-        self.__particles = []
-        self.__particle_type_map = dict()
+        #keep the raw particle arrays for vectorized bond detection
+        self.__particle_positions = particle_pos
+        self.__particle_types     = particle_type
 
-        #create the particle objects and append to array
-        for i in range(self.__num_particles):
-
-            #create and append particle
-            particle = Particle(particle_pos[i], particle_type[i], self)
-            self.__particles.append(particle)
-
-            #add this particle ID to the type dictionary
-            if (particle_type[i] in self.__particle_type_map):
-
-                self.__particle_type_map[particle_type[i]].append(i)
-            else:
-
-                #the type is not yet a key, so associate an empty list and append this index
-                self.__particle_type_map[particle_type[i]] = []
-                self.__particle_type_map[particle_type[i]].append(i)
+        #init an array for particle objects. These are created on first access, since
+        #the vectorized bond detection only needs the raw particle arrays
+        self.__num_particles = len(particle_pos)
+        self.__particles = None
+        self.__particle_type_map = None
 
 
     #bonding related function
 
-    def is_bonded(self, body):
-        #determine if the host body is already bonded to the given one
-
-        if body in self.__bonded_list:
-            return True
-
-        return False
-
     def is_nearby(self, position, cutoff2, box):
         #return true if particle is within cutoff of given position
 
@@ -238,12 +202,6 @@ class Body:
         
         return False
 
-    def bind(self, body, bond):
-        #append the body to the hosts bond list
-
-        self.__bonded_list.append(body)
-        self.__bond_types.append(bond.get_name())
-
     def distance_to_body(self, other_body, box):
         #return the distance from body center to another body center
 
@@ -261,6 +219,11 @@ class Body:
 
         self.__body_type = body_type
 
+    def set_typeid(self, typeid):
+        #manually set the integer (hoomd) type for the body
+
+        self.__typeid = typeid
+
     def set_cluster_id(self, cluster, c_id):
 
         self.__cluster = cluster
@@ -293,29 +256,60 @@ class Body:
 
         return self.__body_type
 
+    def get_typeid(self):
+
+        return self.__typeid
+
     def get_num_particles(self):
 
         return self.__num_particles
 
     def get_particles(self):
 
+        #create the particle objects if they have not been created yet
+        if self.__particles is None:
+            self.__create_particles()
+
         return self.__particles
 
+    def get_particle_positions(self):
+
+        return self.__particle_positions
+
+    def get_particle_types(self):
+
+        return self.__particle_types
+
     def get_particles_by_type(self, particle_type):
 
-        return [particle for particle in self.__particles if particle.get_type() == particle_type]
+        indices   = np.flatnonzero(np.asarray(self.__particle_types) == particle_type)
+        particles = self.get_particles()
 
-    def get_bond_list(self):
+        return [particles[i] for i in indices]
 
-        return self.__bonded_list
+    def __create_particles(self):
+        #create the particle objects for this body and map each type to their indices
 
-    def get_num_bonds(self):
+        self.__particles = []
+        self.__particle_type_map = dict()
 
-        return len(self.__bonded_list)
+        for i in range(self.__num_particles):
 
-    def get_bond_types(self):
+            #create and append particle
+            particle = Particle(self.__particle_positions[i], self.__particle_types[i], self)
+            self.__particles.append(particle)
 
-        return self.__bond_types
+            #add this particle ID to the type dictionary
+            if (self.__particle_types[i] in self.__particle_type_map):
+
+                self.__particle_type_map[self.__particle_types[i]].append(i)
+            else:
+
+                #the type is not yet a key, so associate an empty list and append this index
+                self.__particle_type_map[self.__particle_types[i]] = []
+                self.__particle_type_map[self.__particle_types[i]].append(i)
+
+        return
 
 ####################################################################
 ################# Utility and Data Extraction ######################
@@ -410,23 +404,51 @@ def get_nanoparticles(snap, sim):
     return nanoparticles
 
 
+def get_nano_distance2(bodies, nanoparticles, sim):
+    #return the squared distance from each nanoparticle (rows) to each body center (columns)
+
+    if len(bodies) == 0 or len(nanoparticles) == 0:
+        return np.zeros((len(nanoparticles), len(bodies)))
+
+    #get the body and nanoparticle positions
+    positions = np.array([bod.get_position() for bod in bodies])
+    centers   = np.array([nano.get_position() for nano in nanoparticles])
+
+    #compute all nanoparticle to body distances at once
+    return distance2(positions[np.newaxis, :, :], centers[:, np.newaxis, :], sim.box_dim)
+
+
+def get_adsorbed_bodies(bodies, nanoparticles, sim, dist2 = None):
+    '''Return a boolean array with entry (n, k) True if body k is within the cutoff
+       radius of nanoparticle n. Gives the same result as checking is_nearby for each
+       body and nanoparticle, with a single vectorized distance computation. The squared
+       distances from get_nano_distance2 can be given if already computed.
+    '''
+
+    if dist2 is None:
+        dist2 = get_nano_distance2(bodies, nanoparticles, sim)
+
+    #get the squared cutoff of each nanoparticle
+    radii   = np.array([nano.get_radius() for nano in nanoparticles])
+    cutoffs = radii * sim.radius_mult + sim.largest_bond_distance
+
+    return dist2 < (cutoffs * cutoffs)[:, np.newaxis]
+
+
 ####################################################################
 ############ Body Creation and Bond Network Detection ##############
 ####################################################################
 
 
-def check_particle_pairs(particles1, particles2, cutoff, sim, bond, bond_dict, use_HOOMD_id=False):
+def check_particle_pairs(particles1, particles2, cutoff, sim):
     #check if any of the particle1's are within cutoff of particle2's
 
     #do pairwise comparisons between each particle
     for particle1 in particles1:
         for particle2 in particles2:
 
-            #check if particles are within cutoff. If so, create a bond between bodies
+            #check if particles are within cutoff. If so, the bodies are bonded
             if (particle1.is_bonded(particle2, cutoff*sim.cutoff_mult, sim.box_dim)):
-                particle1.bind(particle2, bond, bond_dict, use_HOOMD_id=use_HOOMD_id)
-                # print("binding {} with {}".format(particle1.get_type(), particle2.get_type()))
-                # print(particle1.get_position(), particle2.get_position())
                 return True
 
     #if none of the particles have a bond, return False
@@ -434,178 +456,152 @@ def check_particle_pairs(particles1, particles2, cutoff, sim, bond, bond_dict, u
 
 
 
-def check_body_pair(body1, body2, sim, bond_dict, use_HOOMD_id=False):
+def check_body_pair(body1, body2, sim):
     ''' Check if the pair of bodies contains particles that are within the cutoff of a 
         given bond type. If one is found, we assume the bodies are bonded and stop 
-        checking for further bonds
+        checking for further bonds. Returns the code of the bond, or -1 if not bonded
 
         Checks that the squared distance is less than squared cutoff
     '''
 
+    #get the center distance and types of the bodies, to skip bonds that can not reach
+    center_dist = body1.distance_to_body(body2, sim.box_dim)
+    body_type1  = body1.get_typeid()
+    body_type2  = body2.get_typeid()
+    prune       = (body_type1 >= 0 and body_type2 >= 0)
+
     #loop over each bond type 
     for bond in sim.bonds:
 
         #get the two particle types involved in this bond
-        type1, type2 = bond.get_types()
+        type1, type2 = bond.get_type_ids()
         cutoff       = bond.get_cutoff2()
+        reach        = sim.bond_reach[bond.get_code()]
 
-        #first get all type 1 on body 1 and type 2 on body 2
-        particles1 = body1.get_particles_by_type(type1)
-        particles2 = body2.get_particles_by_type(type2)
+        #first get all type 1 on body 1 and type 2 on body 2, if they are within reach
+        if (not prune or center_dist < reach[body_type1, body_type2]):
 
-        #do pairwise comparisons between each particle
-        found_bond = check_particle_pairs(particles1, particles2, cutoff, sim, bond, bond_dict, use_HOOMD_id=use_HOOMD_id)
-        if (found_bond):
-            return
+            particles1 = body1.get_particles_by_type(type1)
+            particles2 = body2.get_particles_by_type(type2)
+
+            #do pairwise comparisons between each particle
+            if (check_particle_pairs(particles1, particles2, cutoff, sim)):
+                return bond.get_code()
 
         #if two particles types are the same, we are done with this bond type
         if type1 == type2:
             continue
 
         #if the two particles types are different, the reverse check must be performed
-        particles1 = body1.get_particles_by_type(type2)
-        particles2 = body2.get_particles_by_type(type1)
+        if (not prune or center_dist < reach[body_type2, body_type1]):
 
-        #do pairwise comparisons between each particle
-        found_bond = check_particle_pairs(particles1, particles2, cutoff, sim, bond, bond_dict, use_HOOMD_id=use_HOOMD_id)
-        if (found_bond):
-            return
+            particles1 = body1.get_particles_by_type(type2)
+            particles2 = body2.get_particles_by_type(type1)
 
-    return
+            #do pairwise comparisons between each particle
+            if (check_particle_pairs(particles1, particles2, cutoff, sim)):
+                return bond.get_code()
 
+    return -1
 
-def get_bonded_bodies(bodies, sim, bond_dict, use_HOOMD_id=False):
-    #determine bonded bodies by looping over each neighborhood, bond type, and particle
+
+def get_bonded_bodies(bodies, sim):
+    '''Determine bonded bodies by looping over each neighborhood, bond type, and particle.
+       Returns arrays (body_i, body_j, bond_code) with body_i < body_j indexing the list
+       of bodies.
+    '''
 
     #extract and update the neighborgrid using the current bodies info
     ngrid = sim.ngrid
     ngrid.update(bodies)
 
+    #map the body ids to their location in the given list
+    local_index = {bod.get_id():k for k, bod in enumerate(bodies)}
+
+    #init a dict mapping each bonded pair to its bond code
+    bonds = dict()
+
     #loop over each body
-    body = 0
     for current_body in bodies:
 
         #get all the nearby bodies from the neighborgrid
         nearby_bodies = ngrid.getNeighborhood(current_body)
-
-        # print("Current: ", body, current_body.get_position())
-        body += 1
+        i = local_index[current_body.get_id()]
 
         #loop over nearby bodies, checking for formation of each bond type
         for target_body in nearby_bodies:
 
-            # print(target_body.get_position())
-
             #check that these bodies are not already bonded. if so, go to next
-            if (current_body.is_bonded(target_body)):
+            j    = local_index[target_body.get_id()]
+            pair = (min(i,j), max(i,j))
+            if (pair in bonds):
                 continue
 
             #check if the two bodies contain bonded particles and update accordingly
-            check_body_pair(current_body, target_body, sim, bond_dict, use_HOOMD_id=use_HOOMD_id)
-
-    return
-
-
-def get_body_center_dict(snap, sim, unique_bods):
-    #for each body we consider, get the name of its center particle and its position
-    #return the info as a dictionary
-
-    #init a dict to store the info since the bodies are in a set
-    body_info_dict = dict()
-
-    #loop over the first num_bodies + num_nanos elements. These are all centers
-    body_count = sim.num_bodies + sim.num_nanos
-    for i in range(sim.body_offset, sim.body_offset+body_count):
+            code = check_body_pair(current_body, target_body, sim)
+            if (code >= 0):
+                bonds[pair] = code
 
-        #get the body id and see if it is in the set we are considering
-        body_id = snap.particles.body[i]
-        if (body_id) not in unique_bods:
-            continue
-
-        #extract position and type of the body
-        pos   = snap.particles.position[i]
-        if (sim.dim == 2):
-            pos = pos[0:2]
-        p_type = snap.particles.types[snap.particles.typeid[i]]
-
-        # append this info to the dictionary
-        body_info_dict[body_id] = [pos, p_type]
-
-    return body_info_dict
+    #convert to arrays of the edges
+    pairs = np.array(list(bonds.keys()), dtype=int).reshape(-1, 2)
+    codes = np.array(list(bonds.values()), dtype=int)
 
+    return pairs[:,0], pairs[:,1], codes
 
-def filter_bodies(snap, sim):
-    #filter the particle info in the snap to only include bodies involved in interactions
 
-    #get the list of relevant particle types - hoomd index
-    interacting_types = sim.interacting_types_mapped
-
-    #create a mask for accessing particle position data, get positions+body of these types
-    mask = np.where(np.isin(snap.particles.typeid, interacting_types))[0]
-    filtered_pos   = snap.particles.position[mask]
-    filtered_bod   = snap.particles.body[mask]
-    filtered_types = snap.particles.typeid[mask]
-
-    #check if problem is 2d or 3d. Cut out z component if 2d
-    if (sim.dim == 2):
-        filtered_pos = filtered_pos[:,0:2]
-
-    #map the filtered_types from hoomd ints back into text strings for particle creation
-    filtered_types = np.array([snap.particles.types[element] for element in filtered_types])
+def create_bodies(snap, sim):
+    #create an array of all bodies containing particles relevant to the assembly process
 
-    return filtered_pos, filtered_bod, filtered_types
+    #init a list to store the bodies
+    bodies = []
 
+    #the grouping of particles into bodies is static, so use the topology stored in sim
+    topology = sim.topology
 
-def create_body(filtered_pos, filtered_bod, filtered_types, body_info_dict, body_id, body_index):
-    #extract the data for the given body_id and create and return the body
+    #gather the positions of the interacting particles and the body centers
+    atom_positions   = topology.get_atom_positions(snap)
+    center_positions = topology.get_center_positions(snap)
 
-    #create a sub-mask to get only particles part of the current body
-    sub_mask = np.where(filtered_bod == body_id)[0]
+    #loop over the bodies, creating a Body object with its slice of the particle arrays
+    for body_index in range(topology.num_bodies):
 
-    #get the positions and types or particles at the indices set by this submask
-    particle_positions = filtered_pos[sub_mask]
-    particle_types     = filtered_types[sub_mask]
+        body_slice = topology.get_body_slice(body_index)
 
+        #create the body, set its position and type, append it to the list
+        current_body = Body(atom_positions[body_slice], topology.atom_types[body_slice],
+                            body_index, topology.body_ids[body_index])
+        current_body.set_position(center_positions[body_index])
+        current_body.set_type(topology.center_type_names[body_index])
+        current_body.set_typeid(topology.center_types[body_index])
 
-    #create the body, set its position and type from the dict, append it to the list
-    current_body = Body(particle_positions, particle_types, body_index, body_id)
-    current_body.set_position(body_info_dict[body_id][0])
-    current_body.set_type(body_info_dict[body_id][1])
+        bodies.append(current_body)
 
-    return current_body
+    #return the list of bodies
+    return bodies
 
 
-def create_bodies(snap, sim):
-    #create an array of all bodies containing particles relevant to the assembly process
+def create_bodies_from_centers(center_positions, sim):
+    '''Create the bodies of a frame with only their center positions and types, and no
+       pseudoatoms. These are sufficient for tracking clusters once the bond network of
+       the frame is known.
+    '''
 
     #init a list to store the bodies
     bodies = []
 
-    #filter out particle data from snap to only include the bodies relevant to assembly
-    filtered_pos, filtered_bod, filtered_types = filter_bodies(snap, sim)
-
-    #create a set of the filtered bodies to get the unique ids
-    unique_bods = set(filtered_bod)
+    #get the ids and types of the bodies from the static topology
+    topology = sim.topology
+    no_positions = np.zeros((0, sim.dim))
+    no_types     = np.zeros(0, dtype=int)
 
-    #for each unique body, get its particle type and center of mass in a dictionary
-    body_info_dict = get_body_center_dict(snap, sim, unique_bods)
+    for body_index in range(topology.num_bodies):
 
-    #loop over the masked bodies, creating a Body object with the relevant particles
-    body_index = 0    #init a counter so body indexing starts at 0
-    for body_id in unique_bods:
-
-        #create a body for the given id and add it to the list
-        current_body = create_body(filtered_pos, filtered_bod, filtered_types, 
-                                   body_info_dict, body_id, body_index)
+        #create the body, set its position and type, append it to the list
+        current_body = Body(no_positions, no_types, body_index, topology.body_ids[body_index])
+        current_body.set_position(center_positions[body_index])
+        current_body.set_type(topology.center_type_names[body_index])
+        current_body.set_typeid(topology.center_types[body_index])
 
         bodies.append(current_body)
 
-        #increment body counter
-        body_index += 1
-
-    #return the list of bodies
     return bodies
-        
-
-
-
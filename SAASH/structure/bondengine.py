@@ -0,0 +1,347 @@
+'''
+
+This file contains a vectorized bond detection engine. Rather than creating a Particle
+object for every pseudoatom and checking pairs one at a time, the engine stores all of the
+interacting pseudoatoms in a frame as flat NumPy arrays (position, type code, and the index
+of the owning body).
+
+For each Bond in the SimInfo, the pseudoatom pairs between candidate bodies are expanded
+in a single batch and their minimum image distances are computed at once. The result is an
+edge list of (body_i, body_j, bond_type), from which the BondGraph for the frame is built.
+
+Bond semantics match the per-particle search: a pair of bodies is bonded by the first bond
+type (in the order of the interaction file) that has a pair of pseudoatoms, in either
+orientation, with squared distance below cutoff^2 * cutoff_mult.
+
+Candidate pairs can be found in two ways. The 'body' search uses the SimInfo neighborgrid
+on body centers, with a radius that covers the size of a whole subunit. The 'pseudoatom' 
+search instead bins only the pseudoatoms of each bond type into a cell list sized to the
+bond cutoff, so that only nearby type1/type2 pairs are ever compared. For large subunits 
+with few patches, this is a much smaller number of distance checks. 
+
+The body search can also reuse candidate pairs between frames with a Verlet list, which
+is only rebuilt once a body has moved more than half the skin distance. 
+
+'''
+
+import numpy as np
+
+import sys
+import os
+
+from . import body as body
+from . import bondgraph as bondgraph
+
+#append parent directory to import util
+from inspect import getsourcefile
+
+current_path = os.path.abspath(getsourcefile(lambda:0))
+current_dir = os.path.dirname(current_path)
+parent_dir = current_dir[:current_dir.rfind(os.path.sep)]
+sys.path.insert(0, parent_dir)
+
+from util import kernels
+
+sys.path.pop(0)
+
+
+class BondEngine:
+
+    def __init__(self, sim):
+
+        #keep a reference to the simulation info
+        self.__sim = sim
+
+        #use the compiled kernels if they were selected
+        self.__use_numba = (sim.kernel_backend == 'numba')
+
+        #assign a compact integer code to each interacting pseudoatom type, with a lookup
+        #table from the hoomd type ids to these codes
+        self.__num_types   = len(sim.interacting_types_mapped)
+        self.__type_lookup = -np.ones(max(sim.type_map.values()) + 1, dtype=int)
+        self.__type_lookup[sim.interacting_types_mapped] = np.arange(self.__num_types)
+
+        #store the type codes and squared cutoff for each bond type
+        self.__bond_types = []
+        self.__bond_cut2  = []
+        for bond in sim.bonds:
+
+            type1, type2 = bond.get_type_ids()
+            self.__bond_types.append((self.__type_lookup[type1], self.__type_lookup[type2]))
+            self.__bond_cut2.append(bond.get_cutoff2() * sim.cutoff_mult)
+
+        #init the flat pseudoatom arrays
+        self.__positions = None
+        self.__types     = None
+        self.__owners    = None
+        self.__centers   = None
+        self.__body_types= None
+        self.__body_ids  = None
+        self.__num_bodies = 0
+
+        #init per type indexing: sorted atom indices, and start/count per body
+        self.__type_index = []
+        self.__type_start = []
+        self.__type_count = []
+
+
+    def load_bodies(self, bodies):
+        #fill the flat pseudoatom arrays using the particles stored in each body
+
+        self.__num_bodies = len(bodies)
+        self.__body_ids   = np.array([bod.get_id() for bod in bodies], dtype=int)
+        if self.__num_bodies == 0:
+            self.__body_types = np.zeros(0, dtype=int)
+            self.__set_arrays(np.zeros((0, self.__sim.dim)), np.zeros(0, dtype=int),
+                              np.zeros(0, dtype=int), np.zeros((0, self.__sim.dim)))
+            return
+
+        #gather the per body arrays and the number of pseudoatoms in each
+        positions = [np.asarray(bod.get_particle_positions()) for bod in bodies]
+        types     = [np.asarray(bod.get_particle_types()) for bod in bodies]
+        counts    = [len(p) for p in positions]
+
+        #concatenate into flat arrays, convert hoomd types to compact codes
+        positions = np.concatenate(positions)
+        types     = self.__type_lookup[np.concatenate(types)]
+        owners    = np.repeat(np.arange(self.__num_bodies), counts)
+        centers   = np.array([bod.get_position() for bod in bodies])
+
+        #store the integer type of each body, for pruning by the reach of each bond
+        self.__body_types = np.array([bod.get_typeid() for bod in bodies], dtype=int)
+
+        self.__set_arrays(positions, types, owners, centers)
+
+        return
+
+    def get_candidate_pairs(self):
+        #use the neighborgrid cell list to get body pairs (i<j) whose centers are in range
+
+        #reuse the pairs from previous frames if a verlet list is set
+        if self.__sim.verlet_list is not None:
+            return self.__sim.verlet_list.getCandidatePairs(self.__centers, self.__body_ids)
+
+        ngrid = self.__sim.ngrid
+        ngrid.updateCellList(self.__centers)
+
+        return ngrid.getCandidatePairs()
+
+    def get_edges(self, pairs_i, pairs_j):
+        '''Determine which candidate body pairs are bonded, and by which bond type.
+           Returns arrays (body_i, body_j, bond_type), where bond_type is the index of
+           the bond in sim.bonds.
+        '''
+
+        #init bond type to -1 (unbonded) for every candidate pair
+        bond_type = -np.ones(len(pairs_i), dtype=int)
+
+        #get the center distance and body types of each pair for pruning by bond reach
+        center_dist = body.distance(self.__centers[pairs_i], self.__centers[pairs_j],
+                                    self.__sim.box_dim)
+        types_i = self.__body_types[pairs_i]
+        types_j = self.__body_types[pairs_j]
+
+        #loop over bond types in order. only check pairs that are not yet bonded
+        for k in range(len(self.__bond_types)):
+
+            unbonded = np.flatnonzero(bond_type == -1)
+            if len(unbonded) == 0:
+                break
+
+            type1, type2 = self.__bond_types[k]
+            cut2         = self.__bond_cut2[k]
+            bi = pairs_i[unbonded]
+            bj = pairs_j[unbonded]
+
+            #check type 1 on body i and type 2 on body j, for pairs within reach
+            found = np.zeros(len(unbonded), dtype=bool)
+            near  = self.__get_near(k, center_dist[unbonded], types_i[unbonded], types_j[unbonded])
+            found[near] = self.__check_pairs(bi[near], bj[near], type1, type2, cut2)
+
+            #if the two types differ, the reverse orientation must be checked as well
+            if type1 != type2:
+                near = self.__get_near(k, center_dist[unbonded], types_j[unbonded], types_i[unbonded])
+                near &= ~found
+                found[near] = self.__check_pairs(bi[near], bj[near], type2, type1, cut2)
+
+            bond_type[unbonded[found]] = k
+
+        #keep only bonded pairs
+        bonded = bond_type >= 0
+
+        return pairs_i[bonded], pairs_j[bonded], bond_type[bonded]
+
+    def get_pseudoatom_edges(self):
+        '''Determine the bonded body pairs using a pseudoatom cell list for each bond type.
+           Returns arrays (body_i, body_j, bond_type) in the same form as get_edges.
+        '''
+
+        #store bonded pairs as a single key, i*num_bodies + j with i<j
+        num_bodies = self.__num_bodies
+        bonded_keys  = np.zeros(0, dtype=np.int64)
+        bonded_types = np.zeros(0, dtype=int)
+
+        for k in range(len(self.__bond_types)):
+
+            type1, type2 = self.__bond_types[k]
+            cut2         = self.__bond_cut2[k]
+
+            #bin only the pseudoatoms taking part in this bond
+            atoms = np.flatnonzero((self.__types == type1) | (self.__types == type2))
+            grid  = self.__sim.bond_grids[k]
+            grid.updateCellList(self.__positions[atoms])
+            pairs_i, pairs_j = grid.getCandidatePairs()
+            atom1, atom2 = atoms[pairs_i], atoms[pairs_j]
+
+            #keep type1/type2 pairs on different bodies within the bond cutoff
+            t1, t2 = self.__types[atom1], self.__types[atom2]
+            keep  = ((t1 == type1) & (t2 == type2)) | ((t1 == type2) & (t2 == type1))
+            keep &= self.__owners[atom1] != self.__owners[atom2]
+            atom1, atom2 = atom1[keep], atom2[keep]
+
+            dist2 = self.__distance2(self.__positions[atom1], self.__positions[atom2])
+            atom1, atom2 = atom1[dist2 < cut2], atom2[dist2 < cut2]
+
+            #convert to unique body pairs. earlier bond types take precedence
+            owner1, owner2 = self.__owners[atom1], self.__owners[atom2]
+            keys = np.minimum(owner1, owner2).astype(np.int64) * num_bodies \
+                   + np.maximum(owner1, owner2)
+            keys = np.setdiff1d(keys, bonded_keys)
+
+            bonded_keys  = np.concatenate([bonded_keys, keys])
+            bonded_types = np.concatenate([bonded_types, np.full(len(keys), k)])
+
+        return bonded_keys // num_bodies, bonded_keys % num_bodies, bonded_types
+
+    def get_num_bodies(self):
+
+        return self.__num_bodies
+
+    def get_positions(self):
+
+        return self.__positions
+
+    def get_types(self):
+
+        return self.__types
+
+    def __set_arrays(self, positions, types, owners, centers):
+        #set the flat arrays and construct per type indexing into them
+
+        self.__positions = positions
+        self.__types     = types
+        self.__owners    = owners
+        self.__centers   = centers
+
+        #for each type, atoms are already sorted by owner since bodies are concatenated
+        self.__type_index = []
+        self.__type_start = []
+        self.__type_count = []
+        for t in range(self.__num_types):
+
+            index = np.flatnonzero(types == t)
+            count = np.bincount(owners[index], minlength=self.__num_bodies)
+            start = np.cumsum(count) - count
+
+            self.__type_index.append(index)
+            self.__type_start.append(start)
+            self.__type_count.append(count)
+
+        return
+
+    def __get_near(self, k, center_dist, types_1, types_2):
+        #return a mask of the pairs whose centers are within reach for bond k, with the 
+        #first particle type of the bond on the body with types_1
+
+        #bodies without a known type can not be pruned
+        if (types_1 < 0).any() or (types_2 < 0).any():
+            return np.ones(len(center_dist), dtype=bool)
+
+        reach = self.__sim.bond_reach[k]
+
+        return center_dist < reach[types_1, types_2]
+
+    def __check_pairs(self, bi, bj, type1, type2, cut2):
+        '''For each body pair (bi[p], bj[p]), check all pseudoatoms of type1 on bi[p]
+           against all pseudoatoms of type2 on bj[p]. Returns a boolean array that is
+           true for pairs with at least one pseudoatom pair within the cutoff.
+        '''
+
+        #get the number of atoms of each type on each body, and the combinations per pair
+        count1 = self.__type_count[type1][bi]
+        count2 = self.__type_count[type2][bj]
+        num_combos = count1 * count2
+        total = num_combos.sum()
+
+        found = np.zeros(len(bi), dtype=bool)
+        if total == 0:
+            return found
+
+        #check the pseudoatoms pair by pair with the compiled kernel if requested
+        if self.__use_numba:
+            box  = self.__sim.box_dim
+            cut2 = kernels.compare_value(cut2, self.__positions, box)
+            return kernels.check_pairs(bi, bj, 
+                                       self.__type_index[type1], self.__type_start[type1], 
+                                       self.__type_count[type1], self.__type_index[type2], 
+                                       self.__type_start[type2], self.__type_count[type2], 
+                                       self.__positions, box, cut2)
+
+        #expand the combinations: pair index and local combination index for each entry
+        pair  = np.repeat(np.arange(len(bi)), num_combos)
+        local = np.arange(total) - np.repeat(np.cumsum(num_combos) - num_combos, num_combos)
+
+        #convert to indices into the flat pseudoatom arrays
+        c2 = count2[pair]
+        atom1 = self.__type_index[type1][self.__type_start[type1][bi][pair] + local // c2]
+        atom2 = self.__type_index[type2][self.__type_start[type2][bj][pair] + local %  c2]
+
+        #compute the minimum image distances in one batch and mark the bonded pairs
+        dist2 = self.__distance2(self.__positions[atom1], self.__positions[atom2])
+        found[pair[dist2 < cut2]] = True
+
+        return found
+
+    def __distance2(self, positions1, positions2):
+        #compute the minimum image squared distances with the selected kernels
+
+        if self.__use_numba:
+            return kernels.distance2(positions1, positions2, self.__sim.box_dim)
+
+        return body.distance2(positions1, positions2, self.__sim.box_dim)
+
+
+####################################################################
+################# Bond Network Detection ###########################
+####################################################################
+
+
+def get_bond_edges(bodies, sim):
+    #use the vectorized engine to get the edge list (body_i, body_j, bond_type)
+
+    engine = sim.bond_engine
+    engine.load_bodies(bodies)
+
+    #search for bonds directly between pseudoatoms if requested
+    if sim.bond_search == 'pseudoatom':
+        return engine.get_pseudoatom_edges()
+
+    #get candidate pairs of bodies and determine which are bonded
+    pairs_i, pairs_j = engine.get_candidate_pairs()
+
+    return engine.get_edges(pairs_i, pairs_j)
+
+
+def get_bond_graph(bodies, sim):
+    '''Determine the bond network for the list of bodies using the backend set in sim.
+       Returns a BondGraph whose node k is bodies[k].
+    '''
+
+    #use the per particle search if requested, otherwise the vectorized engine
+    if sim.bond_backend == 'particle':
+        edges = body.get_bonded_bodies(bodies, sim)
+    else:
+        edges = get_bond_edges(bodies, sim)
+
+    return bondgraph.BondGraph(len(bodies), *edges, num_bond_types=len(sim.bonds),
+                               bond_names=sim.bond_names)
@@ -0,0 +1,194 @@
+'''
+
+This file contains a BondGraph class, a compact representation of the bond network
+between bodies in a single frame.
+
+The network is stored in compressed sparse row (CSR) form. The neighbors of body k are
+indices[indptr[k]:indptr[k+1]], and the bond type code (index into sim.bonds) of each
+of those bonds is stored at the same locations in bond_codes. Each bond appears twice,
+once in the row of each body.
+
+This replaces building a bond_dict of python lists and keeping a list of bonded Body
+objects on every body. Degrees, neighbors, connected components, and bond type counts
+for a group of bodies are all computed with array operations on these three arrays.
+
+Graphs built for a simulation also carry the names of the bond types (sim.bond_names),
+so bond type counts can be keyed by name without access to the SimInfo.
+
+'''
+
+import numpy as np
+
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+class BondGraph:
+
+    def __init__(self, num_bodies, bodies_i, bodies_j, bond_codes = None, num_bond_types = 1,
+                 labels = None, bond_names = None):
+
+        #set the number of bodies (nodes) and bond types in the graph, and the type names
+        self.__num_bodies     = num_bodies
+        self.__num_bond_types = num_bond_types
+        self.__bond_names     = bond_names
+
+        #default to every bond having code 0
+        bodies_i = np.asarray(bodies_i, dtype=int)
+        bodies_j = np.asarray(bodies_j, dtype=int)
+        if bond_codes is None:
+            bond_codes = np.zeros(len(bodies_i), dtype=int)
+        bond_codes = np.asarray(bond_codes, dtype=int)
+
+        #store each bond in both directions, sorted by row and then column
+        rows  = np.concatenate([bodies_i, bodies_j])
+        cols  = np.concatenate([bodies_j, bodies_i])
+        codes = np.concatenate([bond_codes, bond_codes])
+        order = np.lexsort((cols, rows))
+
+        #construct the CSR arrays
+        self.__rows       = rows[order]
+        self.__indices    = cols[order]
+        self.__bond_codes = codes[order]
+        self.__degree     = np.bincount(rows, minlength=num_bodies)
+        self.__indptr     = np.concatenate([[0], np.cumsum(self.__degree)])
+
+        #init the connected component labels. computed on first request if not given
+        self.__labels = labels
+
+
+    def get_labels(self):
+        '''Label the connected components of the graph. Returns an array with the group
+           label of each body. Groups are labeled in order of their lowest body index.
+        '''
+
+        if self.__labels is not None:
+            return self.__labels
+
+        #find connected components of the adjacency matrix with scipy
+        data      = np.ones(len(self.__indices), dtype=np.int8)
+        adjacency = csr_matrix((data, self.__indices, self.__indptr),
+                               shape=(self.__num_bodies, self.__num_bodies))
+        num_groups, labels = connected_components(adjacency, directed=False)
+
+        #relabel the groups in order of their first appearance
+        unique_labels, first_index = np.unique(labels, return_index=True)
+        relabel = np.empty(num_groups, dtype=int)
+        relabel[unique_labels[np.argsort(first_index)]] = np.arange(num_groups)
+
+        self.__labels = relabel[labels]
+        return self.__labels
+
+    def get_group_sizes(self):
+        #return the number of bodies in each connected component
+
+        return np.bincount(self.get_labels())
+
+    def get_group_num_bonds(self):
+        #return the number of bonds in each connected component
+
+        labels = self.get_labels()
+        num_groups = labels.max() + 1 if len(labels) > 0 else 0
+
+        return np.bincount(labels[self.__rows], minlength=num_groups) // 2
+
+    def is_bonded(self, body_i, body_j):
+        #determine if the two bodies are bonded
+
+        neighbors = self.get_neighbors(body_i)
+        location  = np.searchsorted(neighbors, body_j)
+
+        return location < len(neighbors) and neighbors[location] == body_j
+
+    def get_edges(self):
+        #return the bonds as arrays (body_i, body_j, bond_code) with body_i < body_j
+
+        upper = self.__rows < self.__indices
+
+        return self.__rows[upper], self.__indices[upper], self.__bond_codes[upper]
+
+    def get_bond_type_counts(self, members):
+        #return an array with the number of bonds of each type between the given bodies
+
+        selected = self.__get_member_edges(members)
+        codes    = self.__bond_codes[selected]
+
+        return np.bincount(codes, minlength=self.__num_bond_types) // 2
+
+    def get_num_bonds(self, members = None):
+        #return the number of bonds between the given bodies, or in the whole graph
+
+        if members is None:
+            return len(self.__indices) // 2
+
+        return np.count_nonzero(self.__get_member_edges(members)) // 2
+
+    def get_degree_counts(self, members):
+        #return an array counting how many of the given bodies have each number of bonds
+
+        return np.bincount(self.__degree[np.asarray(members, dtype=int)])
+
+    def get_subgraph(self, members):
+        '''Return the BondGraph between the given bodies. Body k of the subgraph is
+           members[k], so the bonds are the same as detecting bonds between only the
+           bodies in members, in that order.
+        '''
+
+        members = np.asarray(members, dtype=int)
+
+        #map the body indices to their position in members, -1 if not a member
+        local = np.full(self.__num_bodies, -1, dtype=int)
+        local[members] = np.arange(len(members))
+
+        #keep each bond with both bodies in members once, relabeled to local indices
+        bodies_i, bodies_j, codes = self.get_edges()
+        kept = (local[bodies_i] >= 0) & (local[bodies_j] >= 0)
+
+        return BondGraph(len(members), local[bodies_i[kept]], local[bodies_j[kept]],
+                         codes[kept], num_bond_types=self.__num_bond_types,
+                         bond_names=self.__bond_names)
+
+    def __get_member_edges(self, members):
+        #return a mask of the stored bonds with both bodies in the list of members
+
+        in_members = np.zeros(self.__num_bodies, dtype=bool)
+        in_members[np.asarray(members, dtype=int)] = True
+
+        return in_members[self.__rows] & in_members[self.__indices]
+
+    #getter functions
+
+    def get_num_bodies(self):
+
+        return self.__num_bodies
+
+    def get_bond_names(self):
+
+        return self.__bond_names
+
+    def get_indptr(self):
+
+        return self.__indptr
+
+    def get_indices(self):
+
+        return self.__indices
+
+    def get_bond_codes(self):
+
+        return self.__bond_codes
+
+    def get_degree(self, body_index = None):
+
+        if body_index is None:
+            return self.__degree
+
+        return self.__degree[body_index]
+
+    def get_neighbors(self, body_index):
+
+        return self.__indices[self.__indptr[body_index]:self.__indptr[body_index+1]]
+
+    def get_neighbor_codes(self, body_index):
+
+        return self.__bond_codes[self.__indptr[body_index]:self.__indptr[body_index+1]]
@@ -34,7 +34,9 @@ from collections import defaultdict
 from collections import Counter
 
 from . import body as body
+from . import bondgraph as bondgraph
 from . import frame as frame
+from . import graphhash as graphhash
 
 #append parent directory to import util
 from inspect import getsourcefile
@@ -51,11 +53,14 @@ sys.path.pop(0)
 
 class Cluster:
 
-    def __init__(self, bodies, frame_num):
+    def __init__(self, bodies, frame_num, bond_graph = None):
 
         #create a reference to the list of bodies comprising the cluster
         self.__bodies = bodies
 
+        #keep a reference to the bond network of the frame the cluster belongs to
+        self.__bond_graph = bond_graph
+
         #init a cluster id to -1
         self.__cluster_index = -1
 
@@ -96,8 +101,9 @@ class Cluster:
         #remove all old ids from previous bodies
         self.__remove_body_ids()
 
-        #set a new body list to match given cluster. 
-        self.__bodies = cluster.get_bodies()
+        #set a new body list and bond network to match given cluster. 
+        self.__bodies     = cluster.get_bodies()
+        self.__bond_graph = cluster.get_bond_graph()
 
         #Update those bodies with this cluster's id
         self.__update_body_ids()
@@ -138,6 +144,10 @@ class Cluster:
 
         return len(self.__bodies)
 
+    def get_bond_graph(self):
+
+        return self.__bond_graph
+
     def get_body_ids(self):
 
         return [bod.get_id() for bod in self.__bodies]
@@ -154,30 +164,55 @@ class Cluster:
 
         return self.__last_updated
 
-    def get_body_types(self):
+    def get_body_types(self, type_names = None):
         #return a dict counting how many of each body type are in the cluster
+        #if the list of type names is given, count the integer types with a bincount
 
-        all_types = [bod.get_type() for bod in self.__bodies]
+        if type_names is None:
 
-        return dict(Counter(all_types))
+            all_types = [bod.get_type() for bod in self.__bodies]
+            return dict(Counter(all_types))
 
-    def get_bond_types(self):
+        typeids = np.array([bod.get_typeid() for bod in self.__bodies], dtype=int)
+        counts  = np.bincount(typeids, minlength=len(type_names))
+
+        return {type_names[k]:int(counts[k]) for k in np.flatnonzero(counts)}
+
+    def get_bond_types(self, bond_names = None):
         #return a dict with each bond type present and how many of those bonds there are
+        #bonds are keyed by name, from the given list or else the names in the bond graph
+        #graphs built without names fall back to the integer bond codes
+
+        if self.__bond_graph is None:
+            return dict()
 
-        #get all the bond types from each body in the cluster and make a flat list
-        all_bonds = [bod.get_bond_types() for bod in self.__bodies]
-        flat_list = [item for sublist in all_bonds for item in sublist]
+        if bond_names is None:
+            bond_names = self.__bond_graph.get_bond_names()
 
-        #count how many of each bond there are, divide by 2 to account for double counting
-        bond_type_dict = dict(Counter(flat_list))
-        return {k:int(bond_type_dict[k]/2) for k in bond_type_dict}
+        #count how many of each bond there are between the bodies in the cluster
+        counts = self.__bond_graph.get_bond_type_counts(self.get_body_ids())
+        if bond_names is None:
+            return {int(k):int(counts[k]) for k in np.flatnonzero(counts)}
+
+        return {bond_names[k]:int(counts[k]) for k in np.flatnonzero(counts)}
 
     def get_bond_counts(self):
         #return a dict counting how many subunits have a given number of bonds
 
-        all_bond_counts = [bod.get_num_bonds() for bod in self.__bodies]
+        if self.__bond_graph is None:
+            return dict()
+
+        counts = self.__bond_graph.get_degree_counts(self.get_body_ids())
+
+        return {int(k):int(counts[k]) for k in np.flatnonzero(counts)}
 
-        return dict(Counter(all_bond_counts))
+    def get_graph_hash(self):
+        #return the WL hash of the cluster's bond network, with bond types as edge labels
+
+        if self.__bond_graph is None:
+            return ''
+
+        return graphhash.get_cluster_hash(self.__bond_graph, self.get_body_ids())
 
     def __update_body_ids(self):
 
@@ -346,6 +381,10 @@ class ClusterInfo:
 
         return self.__birth_frame
 
+    def get_death_frame(self):
+
+        return self.__death_frame
+
     def get_frame_jump(self):
 
         return self.__jump
@@ -568,61 +607,60 @@ class ClusterInfo:
 ####################################################################
 
 
-def get_groups(bond_dict):
-    #construct arrays containing groups of all bonded bodies
+def get_bond_edges(bond_dict):
+    #convert a bond_dict with keys 0,...,N-1 into arrays of (body_i, body_j) edges, i<j
 
-    #compute total number of bodies as number of keys in the bond_dict
-    total_states = len(bond_dict)
+    num_bodies = len(bond_dict)
+    degrees    = [len(bond_dict[bod]) for bod in range(num_bodies)]
 
-    #init an array to store mappings to groups
-    to_group = -1 * np.ones(total_states, dtype=int)
-    to_group[0] = 0
+    if sum(degrees) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
 
-    #init a list to store the groups
-    G = [[0]]
+    bodies_i = np.repeat(np.arange(num_bodies), degrees)
+    bodies_j = np.concatenate([bond_dict[bod] for bod in range(num_bodies) if degrees[bod] > 0])
+    upper    = bodies_i < bodies_j
 
-    #init a queue and dump for searching bonds
-    queue    = [0]
-    searched = []  #init to flase * N_bod. Index instead of searching this list
+    return bodies_i[upper], bodies_j[upper].astype(int)
 
-    #loop over the queue until it is empty and all bonds have been assigned
-    while len(queue) > 0:
 
-        #pop the front of the queue and get its group number (which should be >=0)
-        bod = queue.pop(0)
-        group_num = to_group[bod]
+def get_labels(num_bodies, bodies_i, bodies_j):
+    '''Label the connected components of the bond network given as an edge list. 
+       Returns an array with the group label of each body. Groups are labeled in order 
+       of their lowest body index, so the label order matches the group order of get_groups.
+    '''
 
-        #get the adjacency list from bond_dict for this body
-        adj_list = bond_dict[bod]
+    return bondgraph.BondGraph(num_bodies, bodies_i, bodies_j).get_labels()
 
-        #for each adjacent body, add it to the group, set the map, add to queue
-        for member in adj_list:
 
-            #if the member is not in the group yet, add it and set the mapping
-            if member not in G[group_num]:
-                G[group_num].append(member)
-                to_group[member] = group_num
+def get_groups_from_labels(labels):
+    '''Convert an array of group labels into a list of groups of body indices. Groups are
+       ordered by their lowest body index, and the members of each group are listed in 
+       ascending index order (not the breadth first order of the bonds), which sets the 
+       order of each Cluster's bodies and so of its indices and positions observables.
+    '''
 
-            #if the member has not been searched and is not in queue, add to queue
-            if member not in searched and member not in queue:
-                queue.append(member)
+    if len(labels) == 0:
+        return []
 
-        #append the current body to the searched array
-        searched.append(bod)
+    #sort the bodies by label, keeping ascending index order within each group
+    order  = np.argsort(labels, kind='stable')
+    splits = np.cumsum(np.bincount(labels))[:-1]
 
-        #check if the queue is empty but there are undetermined states
-        if len(queue) == 0 and len(searched) != total_states:
+    return [group.tolist() for group in np.split(order, splits)]
 
-            #determine the first unassigned state
-            unassigned = np.where(to_group == -1)[0][0]
 
-            #create a new group for it, assign it, append to queue
-            G.append([unassigned])
-            to_group[unassigned] = len(G)-1
-            queue.append(unassigned)
+def get_groups(bond_dict):
+    #construct arrays containing groups of all bonded bodies, in ascending index order
+
+    #compute total number of bodies as number of keys in the bond_dict
+    total_states = len(bond_dict)
+
+    #label the connected components of the bond network and gather them into groups
+    bodies_i, bodies_j = get_bond_edges(bond_dict)
+    labels = get_labels(total_states, bodies_i, bodies_j)
 
     #return the list of grouped particles
-    return G
+    return get_groups_from_labels(labels)
 
 
 def get_group_sizes(G):
@@ -632,19 +670,15 @@ def get_group_sizes(G):
        number of clusters (value) of each size (key)'''
     size_dict = defaultdict(int)
 
-    #loop over groups and increment the corresponding size index
-    for group in G:
-
-        L = len(group)
-        if L not in size_dict:
-            size_dict[L] = 1
-        else:
-            size_dict[L] += 1
+    #count the number of groups of each size
+    group_lengths = np.array([len(group) for group in G], dtype=int)
+    size_counts   = np.bincount(group_lengths)
+    for L in np.flatnonzero(size_counts):
+        size_dict[int(L)] = int(size_counts[L])
 
     #determine the largest group
-    non_zero_counts = len(size_dict.values())
-    if non_zero_counts > 0:
-        largest_group_size = np.max(np.array(list(size_dict.keys())))
+    if len(group_lengths) > 0:
+        largest_group_size = int(group_lengths.max())
     else:
         largest_group_size = 0
 
@@ -14,6 +14,8 @@ clusters, and monomer gain/loss.
 '''
 
 from . import body as body
+from . import bondengine as bondengine
+from . import bondgraph as bondgraph
 from . import cluster as clust
 
 import numpy as np
@@ -289,6 +291,10 @@ class Frame:
         values = [sorted(quantities.items()) for quantities in values]
         values = sum(values, [])
 
+        #distinguish clusters with the same counts but different bond networks
+        if 'graph_hash' in observer.get_observables():
+            values.append(('graph_hash', cluster.get_graph_hash()))
+
         #return a tuple with the properties
         return tuple(values)
 
@@ -714,22 +720,109 @@ def get_monomer_stats(old_ids, new_ids, old_bodies, new_bodies):
 ############ Frame Creation from HOOMD Data ########################
 ####################################################################
 
+def load_bond_network(snap, sim, frame_num):
+    '''Return the bodies and BondGraph of the frame if its bond network is stored in the
+       bond cache, otherwise None. The bodies are created from their centers only, since
+       no bond detection is needed.
+    '''
+
+    if sim.bond_cache is None or frame_num is None:
+        return None
+
+    cached = sim.bond_cache.load(frame_num)
+    if cached is None:
+        return None
+
+    #create the bodies, and the bond network with known groups
+    edges, labels = cached
+    bodies     = body.create_bodies_from_centers(sim.topology.get_center_positions(snap), sim)
+    bond_graph = bondgraph.BondGraph(len(bodies), *edges, num_bond_types=len(sim.bonds),
+                                     labels=labels, bond_names=sim.bond_names)
+
+    return bodies, bond_graph
+
+
+def get_bond_network(snap, sim, frame_num = None):
+    #return the bodies and BondGraph of the frame, from the bond cache if possible
+
+    network = load_bond_network(snap, sim, frame_num)
+    if network is not None:
+        return network
+
+    #get a list of bodies and determine the bond network
+    bodies     = body.create_bodies(snap, sim)
+    bond_graph = bondengine.get_bond_graph(bodies, sim)
+
+    #store the network for later runs
+    if sim.bond_cache is not None and frame_num is not None:
+        sim.bond_cache.save(frame_num, bond_graph)
+
+    return bodies, bond_graph
+
+
 def get_data_from_snap(snap, sim, frame_num):
     #go from a snapshot to a frame object with bodies, clusters, and other data
 
-    #get a list of bodies to analyze
-    bodies = body.create_bodies(snap, sim)
+    #get a list of bodies and their bond network
+    bodies, bond_graph = get_bond_network(snap, sim, frame_num)
+
+    #group the bodies into clusters and create the frame
+    return make_frame(bodies, bond_graph, frame_num)
+
+
+def get_frame_data(snap, sim, frame_num = None):
+    '''Do the expensive part of constructing a frame: body creation, bond detection, and
+       grouping. Returns the compact data (centers, edges, labels) needed to rebuild the
+       frame with get_data_from_frame_data, e.g. after computing it in a worker process.
+    '''
+
+    #get a list of bodies and determine the bond network
+    bodies, bond_graph = get_bond_network(snap, sim, frame_num)
+
+    return pack_frame_data(bodies, bond_graph)
+
+
+def pack_frame_data(bodies, bond_graph, members = None):
+    #get the body centers, bond edges, group label of each body, and members as frame data
+
+    centers = np.array([bod.get_position() for bod in bodies])
+    edges   = bond_graph.get_edges()
+    labels  = bond_graph.get_labels()
+
+    return centers, edges, labels, members
+
+
+def get_data_from_frame_data(frame_data, sim, frame_num):
+    #rebuild a frame object from the compact data computed by get_frame_data
+
+    centers, edges, labels, members = frame_data
+
+    #create bodies with only a center position, and the bond network with known groups
+    bodies     = body.create_bodies_from_centers(centers, sim)
+    bond_graph = bondgraph.BondGraph(len(bodies), *edges, num_bond_types=len(sim.bonds),
+                                     labels=labels, bond_names=sim.bond_names)
+
+    #group the bodies into clusters and create the frame
+    return make_frame(bodies, bond_graph, frame_num, members)
 
-    #init a dictionary to store the bonds present - init with empty lists for each body_id
-    bond_dict = dict()
-    for bod in bodies:
-        bond_dict[bod.get_id()] = []
 
-    #determine the bond network using the list of bodies
-    body.get_bonded_bodies(bodies, sim, bond_dict)
+def make_frame(bodies, bond_graph, frame_num, members = None):
+    '''Create a frame from the bodies and their bond network, with a cluster for each
+       group. If a list of member bodies is given, only the groups of those bodies are
+       included, and the monomer fraction is relative to the number of members. Members
+       must then only be bonded to other members.
+    '''
 
-    #determine groups of bonded structures
-    G = clust.get_groups(bond_dict)
+    #determine groups of bonded structures, among the member bodies if given
+    labels = bond_graph.get_labels()
+    if members is None:
+        G = clust.get_groups_from_labels(labels)
+        num_members = len(bodies)
+    else:
+        members = np.sort(np.asarray(members, dtype=int))
+        member_labels = np.unique(labels[members], return_inverse=True)[1].reshape(-1)
+        G = [members[group].tolist() for group in clust.get_groups_from_labels(member_labels)]
+        num_members = len(members)
 
     #for each group, create a cluster
     clusters     = []
@@ -743,7 +836,7 @@ def get_data_from_snap(snap, sim, frame_num):
 
             #extract the involved bodies from the group and create a cluster
             body_list = [bodies[q] for q in group]
-            clusters.append(clust.Cluster(body_list, frame_num))
+            clusters.append(clust.Cluster(body_list, frame_num, bond_graph))
 
             #DEBUG:
             # if clusters[-1].get_num_bodies() == 12:
@@ -759,7 +852,7 @@ def get_data_from_snap(snap, sim, frame_num):
 
 
     #set the monomer fraction
-    monomer_frac = num_monomers / len(bodies)
+    monomer_frac = num_monomers / num_members if num_members > 0 else 0
     
     #create a Frame object for this frame and return it
     current_frame = Frame(bodies, clusters, frame_num, monomer_ids, monomer_types, monomer_frac) 
@@ -0,0 +1,123 @@
+'''
+
+This file computes a Weisfeiler-Lehman (WL) hash of the bond network of a cluster, a
+graph invariant that distinguishes clusters with the same size and bond counts but a
+different connectivity.
+
+Each body starts with a label given by its number of bonds. In each of WL_ITERATIONS
+rounds, the label of a body is replaced by a hash of its label and the multiset of
+(bond type, neighbor label) pairs over its bonds, so bond types act as edge labels. The
+hash of the cluster is a digest of the sorted labels from every round. Isomorphic
+clusters (with the same bond types) always have the same hash, and clusters with
+different hashes are never isomorphic.
+
+Labels are 64 bit integers mixed with array operations, and the final digest uses
+hashlib, so the hash is the same in every process and every run.
+
+Clusters often persist over many frames with the same bonds, so hashes are cached, keyed
+by the cluster's sorted edge list (body ids and bond types). The cache keeps the most
+recently used CACHE_SIZE hashes.
+
+'''
+
+import numpy as np
+
+import hashlib
+from collections import OrderedDict
+
+
+#number of WL relabeling rounds
+WL_ITERATIONS = 3
+
+#maximum number of cached hashes
+CACHE_SIZE = 2**16
+
+#cache of hashes, keyed by the sorted edge list of a cluster
+hash_cache = OrderedDict()
+
+
+def mix(x):
+    #scramble an array of 64 bit labels (splitmix64 finalizer). overflow wraps around
+
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xbf58476d1ce4e5b9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94d049bb133111eb)
+
+    return x ^ (x >> np.uint64(31))
+
+
+def get_cluster_edges(bond_graph, members):
+    '''Return the bonds (body_i, body_j, bond_code) with body_i < body_j between the
+       members of a cluster, which must be a connected component of the bond graph.
+    '''
+
+    indptr  = bond_graph.get_indptr()
+    members = np.sort(np.asarray(members, dtype=int))
+
+    #gather the CSR rows of the members
+    starts    = indptr[members]
+    lengths   = indptr[members+1] - starts
+    row_start = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    positions = np.repeat(starts - row_start, lengths) + np.arange(lengths.sum())
+
+    rows  = np.repeat(members, lengths)
+    cols  = bond_graph.get_indices()[positions]
+    codes = bond_graph.get_bond_codes()[positions]
+
+    #keep each bond once
+    upper = rows < cols
+
+    return rows[upper], cols[upper], codes[upper]
+
+
+def wl_hash(num_nodes, bodies_i, bodies_j, codes, iterations = WL_ITERATIONS):
+    #return the WL hash of the graph with the given bonds between nodes 0 to num_nodes-1
+
+    #store each bond in both directions
+    rows  = np.concatenate([bodies_i, bodies_j])
+    cols  = np.concatenate([bodies_j, bodies_i])
+    edge_labels = mix(np.concatenate([codes, codes]).astype(np.uint64) + np.uint64(1))
+
+    #start from the number of bonds of each node
+    labels = mix(np.bincount(rows, minlength=num_nodes).astype(np.uint64))
+    all_labels = [labels]
+
+    with np.errstate(over='ignore'):
+        for i in range(iterations):
+
+            #sum the mixed (bond type, neighbor label) pairs, which is order independent
+            neighbors = np.zeros(num_nodes, dtype=np.uint64)
+            np.add.at(neighbors, rows, mix(labels[cols] ^ edge_labels))
+
+            labels = mix(labels * np.uint64(0x9e3779b97f4a7c15) + neighbors)
+            all_labels.append(labels)
+
+    #digest the sorted labels of every round
+    digest = hashlib.blake2b(digest_size=8)
+    for labels in all_labels:
+        digest.update(np.sort(labels).tobytes())
+
+    return digest.hexdigest()
+
+
+def get_cluster_hash(bond_graph, members):
+    #return the WL hash of a cluster's bond network, using the cached value if possible
+
+    bodies_i, bodies_j, codes = get_cluster_edges(bond_graph, members)
+    key = (len(members), np.concatenate([bodies_i, bodies_j, codes]).tobytes())
+
+    if key in hash_cache:
+        hash_cache.move_to_end(key)
+        return hash_cache[key]
+
+    #relabel the bodies as 0 to N-1 and compute the hash
+    local   = np.sort(np.asarray(members, dtype=int))
+    cluster_hash = wl_hash(len(local), np.searchsorted(local, bodies_i),
+                           np.searchsorted(local, bodies_j), codes)
+
+    hash_cache[key] = cluster_hash
+    if len(hash_cache) > CACHE_SIZE:
+        hash_cache.popitem(last=False)
+
+    return cluster_hash
@@ -0,0 +1,95 @@
+'''
+
+This file contains a Topology class, which stores the static grouping of pseudoatoms into
+bodies for a trajectory.
+
+Rigid body membership and pseudoatom types do not change over a HOOMD trajectory, so
+there is no need to filter the particles and search for the members of each body on every
+frame. The Topology is built once from the first snapshot and stores
+
+    - body_ids:     the HOOMD id of each body, in the order bodies are indexed
+    - atom_index:   a permutation of particle indices for the interacting pseudoatoms,
+                    grouped by body
+    - atom_offsets: CSR offsets, body k owns atom_index[atom_offsets[k]:atom_offsets[k+1]]
+    - atom_types:   integer (HOOMD) type of each pseudoatom in atom_index
+    - center_index: particle index of the center of each body
+
+Per-frame body construction then only requires taking the positions at these indices.
+Frames read from the position cache already store the pseudoatoms and body centers in
+this order, so their positions are sliced directly.
+
+'''
+
+import numpy as np
+
+
+class Topology:
+
+    def __init__(self, snap, sim):
+
+        #get the particle indices of all interacting pseudoatoms
+        atom_mask = np.where(np.isin(snap.particles.typeid, sim.interacting_types_mapped))[0]
+        atom_body = snap.particles.body[atom_mask]
+
+        #index the bodies in the same order that set iteration has always given them
+        self.body_ids   = np.array(list(set(atom_body)), dtype=atom_body.dtype)
+        self.num_bodies = len(self.body_ids)
+
+        #get the body index of each pseudoatom, and group the pseudoatoms by body
+        sorter     = np.argsort(self.body_ids)
+        body_index = sorter[np.searchsorted(self.body_ids, atom_body, sorter=sorter)]
+        grouping   = np.argsort(body_index, kind='stable')
+
+        self.atom_index   = atom_mask[grouping]
+        self.atom_counts  = np.bincount(body_index, minlength=self.num_bodies)
+        self.atom_offsets = np.concatenate([[0], np.cumsum(self.atom_counts)])
+        self.atom_types   = snap.particles.typeid[self.atom_index]
+        type_names = np.array(snap.particles.types)
+
+        #find the center particle of each body among the leading center particles
+        self.center_index = -np.ones(self.num_bodies, dtype=int)
+        body_count = sim.num_bodies + sim.num_nanos
+        candidates = np.arange(sim.body_offset, sim.body_offset + body_count)
+        candidates = candidates[candidates < len(snap.particles.body)]
+        candidates = candidates[np.isin(snap.particles.body[candidates], self.body_ids)]
+        location   = sorter[np.searchsorted(self.body_ids, snap.particles.body[candidates],
+                                            sorter=sorter)]
+        self.center_index[location] = candidates
+
+        if (self.center_index < 0).any():
+            missing = self.body_ids[self.center_index < 0]
+            raise ValueError("Could not find the center particle for bodies {}".format(missing))
+
+        #store the type of each body center. names are only needed for output
+        self.center_types      = snap.particles.typeid[self.center_index]
+        self.center_type_names = type_names[self.center_types].tolist()
+
+        #store the dimension to cut positions down to
+        self.dim = sim.dim
+
+        return
+
+
+    def get_atom_positions(self, snap):
+        #return the positions of the interacting pseudoatoms, grouped by body
+
+        if getattr(snap, 'in_topology_order', False):
+            return snap.particles.position[0:len(self.atom_index), 0:self.dim]
+
+        positions = np.take(snap.particles.position, self.atom_index, axis=0)
+        return positions[:, 0:self.dim]
+
+    def get_center_positions(self, snap):
+        #return the positions of the body centers
+
+        if getattr(snap, 'in_topology_order', False):
+            first = len(self.atom_index)
+            return snap.particles.position[first:first+self.num_bodies, 0:self.dim]
+
+        positions = np.take(snap.particles.position, self.center_index, axis=0)
+        return positions[:, 0:self.dim]
+
+    def get_body_slice(self, body_index):
+        #return the slice of the pseudoatom arrays belonging to the given body
+
+        return slice(self.atom_offsets[body_index], self.atom_offsets[body_index+1])
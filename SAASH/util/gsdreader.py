@@ -0,0 +1,150 @@
+'''
+
+This file implements a GSDReader, a trajectory reader that decodes only the GSD chunks
+used by the analysis, using the low level gsd.fl API.
+
+Indexing a gsd.hoomd trajectory decodes every chunk in the frame, including velocities,
+images, charges, and so on, when present. The analysis only needs
+
+    - configuration/box
+    - particles/N, particles/types
+    - particles/position, particles/typeid, particles/body
+    - particles/orientation (optional, for state representations)
+
+so the reader reads just these chunks for each frame, and returns them as a
+gsd.hoomd.Frame with all other data left unset.
+
+Following GSD semantics, a chunk missing from a frame takes its value from frame 0, and
+falls back to the default value if it is missing there too. The frame 0 values are read
+once, when the reader is opened, so static chunks like typeid and body are not read again
+for every frame. Arrays shared across frames are not writeable.
+
+'''
+
+import gsd.fl
+import gsd.hoomd
+import numpy as np
+
+
+class GSDReader:
+
+    def __init__(self, gsd_file, orientation = False):
+
+        #open the file with the low level API. file.name gives the path, as in gsd.hoomd
+        self.file = gsd.fl.open(name=gsd_file, mode='r')
+        self.__orientation = orientation
+
+        #set the per particle chunks to read
+        self.__particle_chunks = ['position', 'typeid', 'body']
+        if orientation:
+            self.__particle_chunks.append('orientation')
+
+        #read the frame 0 value (or default) of each chunk once
+        self.__initial = dict()
+        self.__initial['configuration/box'] = self.__read_initial('configuration/box',
+                                              np.array([1, 1, 1, 0, 0, 0], dtype=np.float32))
+        self.__initial['particles/N']       = self.__read_initial('particles/N',
+                                              np.array([0], dtype=np.uint32))
+        self.__initial['particles/types']   = self.__read_initial('particles/types', None)
+
+        N = int(self.__initial['particles/N'][0])
+        defaults = {'position'   : np.zeros((N, 3), dtype=np.float32),
+                    'typeid'     : np.zeros(N, dtype=np.uint32),
+                    'body'       : np.full(N, -1, dtype=np.int32),
+                    'orientation': np.tile(np.array([1, 0, 0, 0], dtype=np.float32), (N, 1))}
+
+        for chunk in self.__particle_chunks:
+            name = 'particles/' + chunk
+            self.__initial[name] = self.__read_initial(name, defaults[chunk])
+
+        #decode the type names in frame 0
+        self.__initial_types = self.__decode_types(self.__initial['particles/types'])
+
+
+    def __len__(self):
+
+        return self.file.nframes
+
+    def __getitem__(self, frame_num):
+        #read the frame, returning a gsd.hoomd.Frame with only the chunks used set
+
+        #allow negative indexing, as for a gsd.hoomd trajectory
+        num_frames = len(self)
+        if frame_num < 0:
+            frame_num += num_frames
+        if frame_num < 0 or frame_num >= num_frames:
+            raise IndexError("Frame {} is out of range for {} frames".format(frame_num,
+                                                                             num_frames))
+
+        snap = gsd.hoomd.Frame()
+
+        #read the configuration and the number and types of particles
+        snap.configuration.box = self.__read(frame_num, 'configuration/box')
+        snap.particles.N       = int(self.__read(frame_num, 'particles/N')[0])
+
+        types = self.__read(frame_num, 'particles/types')
+        if types is self.__initial['particles/types']:
+            snap.particles.types = list(self.__initial_types)
+        else:
+            snap.particles.types = self.__decode_types(types)
+
+        #read the per particle data
+        for chunk in self.__particle_chunks:
+            setattr(snap.particles, chunk, self.__read(frame_num, 'particles/' + chunk))
+
+        return snap
+
+    def __read(self, frame_num, name):
+        #read the chunk in the frame, or use the frame 0 value if it is not present
+
+        if frame_num != 0 and self.file.chunk_exists(frame=frame_num, name=name):
+            return self.file.read_chunk(frame=frame_num, name=name)
+
+        return self.__initial[name]
+
+    def __read_initial(self, name, default):
+        #read the chunk in frame 0, or return the default value. the result is not writeable
+
+        if self.file.nframes > 0 and self.file.chunk_exists(frame=0, name=name):
+            value = self.file.read_chunk(frame=0, name=name)
+        else:
+            value = default
+
+        if value is not None:
+            value.flags.writeable = False
+
+        return value
+
+    def __decode_types(self, types):
+        #convert the stored type name chunk to a list of strings
+
+        if types is None:
+            return ['A']
+
+        types = types.view(dtype=np.dtype((bytes, types.shape[1])))
+        return [name.decode('UTF-8') for name in types.reshape([types.shape[0]])]
+
+    def __getstate__(self):
+        #pickle only the file name. the file is opened again when unpickled, e.g. in a worker
+
+        return {'gsd_file': self.file.name, 'orientation': self.__orientation}
+
+    def __setstate__(self, state):
+
+        self.__init__(state['gsd_file'], orientation=state['orientation'])
+        return
+
+    def close(self):
+
+        self.file.close()
+        return
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+        return
+
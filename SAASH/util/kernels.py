@@ -0,0 +1,140 @@
+'''
+
+This file contains optional compiled kernels for the innermost loops of bond detection.
+
+If Numba can be imported, the kernels below are compiled on first use, and can be used in
+place of the NumPy implementations:
+
+    - distance2:     minimum image squared distances between rows of two arrays
+    - scan_cells:    emit all pairs of points within a range from pairs of grid cells
+    - check_pairs:   check the pseudoatoms of candidate body pairs, stopping at the first
+                     pseudoatom pair within the bond cutoff
+
+The kernels do the same floating point operations, at the same precision and in the same
+order, as the NumPy code, so results are identical. Cutoffs should be passed already cast
+to the precision that NumPy would compare them at (see compare_value). 
+
+Numba is not a requirement of SAASH. If it is not installed, NUMBA_AVAILABLE is False and
+callers fall back to NumPy.
+
+'''
+
+import numpy as np
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def jit(func):
+    #compile the function with numba if it is available, otherwise return it unchanged
+
+    if NUMBA_AVAILABLE:
+        return numba.njit(cache=True)(func)
+
+    return func
+
+
+def compare_value(value, positions, box):
+    #cast a cutoff to the type numpy uses when comparing it to distances of these arrays
+
+    dtype = np.result_type(np.result_type(positions, box), value)
+
+    return dtype.type(value)
+
+
+@jit
+def min_image2(x0, x1, p0, p1, box):
+    #return the minimum image squared distance between row p0 of x0 and row p1 of x1
+
+    #accumulate in the precision numpy would promote the positions and box to
+    total = (x0[p0, 0] - x0[p0, 0]) + (box[0] - box[0])
+    for d in range(x0.shape[1]):
+
+        delta = abs(x0[p0, d] - x1[p1, d])
+        if delta > 0.5 * box[d]:
+            delta = delta - box[d]
+        total += delta * delta
+
+    return total
+
+
+def distance2(x0, x1, box):
+    #return the minimum image squared distance between each pair of rows of x0 and x1
+
+    out = np.empty(len(x0), dtype=np.result_type(x0, box))
+    fill_distance2(x0, x1, box, out)
+
+    return out
+
+
+@jit
+def fill_distance2(x0, x1, box, out):
+    #fill out with the minimum image squared distance between each pair of rows
+
+    for p in range(x0.shape[0]):
+        out[p] = min_image2(x0, x1, p, p, box)
+
+    return
+
+
+@jit
+def scan_cells(positions, cell_start, cell_end, cell_a, cell_b, box, R):
+    '''For sorted positions and each pair of grid cells (cell_a[p], cell_b[p]), return the
+       sorted indices of all pairs of points in the two cells within distance R. When a
+       cell is paired with itself, only pairs with i<j are returned.
+    '''
+
+    #count the number of pairs in range, then fill the output arrays
+    count = 0
+    for fill in range(2):
+
+        if fill == 1:
+            pairs_i = np.empty(count, dtype=np.int64)
+            pairs_j = np.empty(count, dtype=np.int64)
+            count   = 0
+
+        for p in range(len(cell_a)):
+
+            a, b = cell_a[p], cell_b[p]
+            for i in range(cell_start[a], cell_end[a]):
+
+                first_j = i + 1 if a == b else cell_start[b]
+                for j in range(first_j, cell_end[b]):
+
+                    if np.sqrt(min_image2(positions, positions, i, j, box)) < R:
+                        if fill == 1:
+                            pairs_i[count] = i
+                            pairs_j[count] = j
+                        count += 1
+
+    return pairs_i, pairs_j
+
+
+@jit
+def check_pairs(bi, bj, index1, start1, count1, index2, start2, count2, positions, box, cut2):
+    '''For each body pair (bi[p], bj[p]), check the pseudoatoms of the first type on bi[p]
+       against the pseudoatoms of the second type on bj[p], given as index/start/count
+       arrays for each type. Returns a boolean array that is true for pairs with at least
+       one pseudoatom pair within the squared cutoff.
+    '''
+
+    found = np.zeros(len(bi), dtype=np.bool_)
+    for p in range(len(bi)):
+
+        s1, c1 = start1[bi[p]], count1[bi[p]]
+        s2, c2 = start2[bj[p]], count2[bj[p]]
+
+        for a in range(s1, s1 + c1):
+            for b in range(s2, s2 + c2):
+
+                if min_image2(positions, positions, index1[a], index2[b], box) < cut2:
+                    found[p] = True
+                    break
+
+            if found[p]:
+                break
+
+    return found
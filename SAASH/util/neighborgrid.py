@@ -6,6 +6,17 @@ number of pairwise distance computations to determine bonds can be drastically r
 
 Code modified from a 2D version created by Daniel Goldstein. 
 
+The grid can also be used as a vectorized cell list. Given an array of positions, all 
+cell indices are computed at once, the points are sorted by cell, and the start/end 
+offsets of each occupied cell are stored. Candidate pairs (i<j) within the interaction 
+radius are then emitted as arrays, visiting each pair of cells only once. 
+
+For trajectories analyzed at small frame intervals, a VerletList keeps the candidate 
+pairs from a grid built with an extra skin distance. The pairs are reused from frame to 
+frame, and the grid is only rebuilt once some point has moved more than half the skin 
+since the last build. The list can also be queried for a subset of the points, such as 
+the bodies near a nanoparticle, without rebuilding it. 
+
 '''
 
 
@@ -13,6 +24,8 @@ import numpy as np
 from itertools import product
 import sys
 
+from . import kernels
+
 
 class Neighborgrid:
     '''This class implements a neighborlist to faciliate the fast
@@ -56,6 +69,19 @@ class Neighborgrid:
         #list of all grid cell moves to check for neighbors
         self.indexAdjustment = list(product([-2,-1,0,1,2], repeat=self.dim))
 
+        #table of unique grid cell moves after wrapping, used by the cell list
+        self.stencil = self.__buildStencil()
+
+        #init storage for the vectorized cell list
+        self.positions  = None
+        self.sortedIndex= None
+        self.cells      = None
+        self.cellStart  = None
+        self.cellEnd    = None
+
+        #use the compiled kernel to scan cell pairs, if requested and available
+        self.useNumba = False
+
 
     def update(self, bodies):
         '''The update function takes in a list of bodies (objects with a position) and will
@@ -151,3 +177,223 @@ class Neighborgrid:
         return neighbor_list
 
 
+
+
+    def updateCellList(self, positions):
+        '''Construct the cell list for an array of positions. Points are sorted by their
+        flattened cell index, and start/end offsets are stored for each occupied cell'''
+
+        self.positions = np.asarray(positions)[:, 0:self.dim]
+
+        #compute all the flat cell indices at once, and sort the points by cell
+        cell_index = self.convertPositionsToCells(self.positions)
+        self.sortedIndex = np.argsort(cell_index, kind='stable')
+        sorted_cells = cell_index[self.sortedIndex]
+
+        #get the occupied cells and the offsets of their members in the sorted array
+        self.cells, self.cellStart, counts = np.unique(sorted_cells, return_index=True,
+                                                       return_counts=True)
+        self.cellEnd = self.cellStart + counts
+
+        return
+
+    def convertPositionsToCells(self, positions):
+        #vectorized version of convertPosToIndex, returning a flat cell index per point
+
+        #check if all coordinates are within the known box size
+        if ( (positions < self.lim[:,0]).any() or (positions > self.lim[:,1]).any() ):
+            raise ValueError("Particle is outside the set bounds")
+
+        #convert to cell coordinates. wrap points lying exactly on the upper boundary
+        index = ((positions + self.shift) / self.boxSize).astype(int) % self.numD
+
+        return np.ravel_multi_index(index.T, self.numD)
+
+    def getCandidatePairs(self):
+        '''Return arrays (i, j) of all pairs of points in the current cell list with i<j 
+        that are within the interaction radius. Each pair is returned exactly once'''
+
+        #return nothing if the cell list is empty
+        if self.cells is None or len(self.cells) == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+        counts = self.cellEnd - self.cellStart
+
+        #for every occupied cell, get all neighboring cells from the stencil table
+        coords   = np.array(np.unravel_index(self.cells, self.numD)).T
+        neighbor = (coords[:, None, :] + self.stencil[None, :, :]) % self.numD
+        neighbor = np.ravel_multi_index(neighbor.reshape(-1, self.dim).T, self.numD)
+        neighbor = neighbor.reshape(len(self.cells), len(self.stencil))
+
+        #keep each pair of distinct occupied cells once, with the lower cell index first
+        location = np.searchsorted(self.cells, neighbor)
+        location[location == len(self.cells)] = 0
+        occupied = (self.cells[location] == neighbor) & (neighbor > self.cells[:, None])
+        cell_a, stencil_id = np.nonzero(occupied)
+        cell_b = location[cell_a, stencil_id]
+
+        #scan the cell pairs with the compiled kernel if requested
+        if self.useNumba:
+            cell_a = np.concatenate([np.arange(len(self.cells)), cell_a])
+            cell_b = np.concatenate([np.arange(len(self.cells)), cell_b])
+            R = kernels.compare_value(self.R, self.positions, self.domain_size)
+            pairs_i, pairs_j = kernels.scan_cells(self.positions[self.sortedIndex], 
+                                                  self.cellStart, self.cellEnd, cell_a, cell_b,
+                                                  self.domain_size, R)
+            pairs_i, pairs_j = self.sortedIndex[pairs_i], self.sortedIndex[pairs_j]
+
+            return np.minimum(pairs_i, pairs_j), np.maximum(pairs_i, pairs_j)
+
+        #pairs of points in the same cell
+        same_i, same_j = self.__expandCellPairs(np.arange(len(self.cells)), 
+                                                np.arange(len(self.cells)), counts)
+        keep = same_i < same_j
+        same_i, same_j = same_i[keep], same_j[keep]
+
+        #pairs of points in distinct neighboring cells
+        diff_i, diff_j = self.__expandCellPairs(cell_a, cell_b, counts)
+
+        #combine, and map back from sorted order to the original point indices
+        pairs_i = self.sortedIndex[np.concatenate([same_i, diff_i])]
+        pairs_j = self.sortedIndex[np.concatenate([same_j, diff_j])]
+
+        #filter by the periodic distance between the points
+        distance = self.getPeriodicDistance(self.positions[pairs_i], self.positions[pairs_j])
+        within   = distance < self.R
+        pairs_i, pairs_j = pairs_i[within], pairs_j[within]
+
+        #order each pair so that i<j
+        return np.minimum(pairs_i, pairs_j), np.maximum(pairs_i, pairs_j)
+
+    def getPeriodicDistance(self, positions1, positions2):
+        #return the periodic distance between each pair of rows in the position arrays
+
+        delta = np.abs(positions1 - positions2)
+        delta = np.where(delta > 0.5 * self.domain_size, delta - self.domain_size, delta)
+
+        return np.sqrt((delta ** 2).sum(axis=-1))
+
+    def __expandCellPairs(self, cell_a, cell_b, counts):
+        #return sorted-order indices for all combinations of points in cell_a x cell_b
+
+        count_a = counts[cell_a]
+        count_b = counts[cell_b]
+        num_combos = count_a * count_b
+        total = num_combos.sum()
+
+        #get the cell pair and the local combination index for each entry
+        pair  = np.repeat(np.arange(len(cell_a)), num_combos)
+        local = np.arange(total) - np.repeat(np.cumsum(num_combos) - num_combos, num_combos)
+
+        b = count_b[pair]
+        index_a = self.cellStart[cell_a][pair] + local // b
+        index_b = self.cellStart[cell_b][pair] + local %  b
+
+        return index_a, index_b
+
+    def __buildStencil(self):
+        #determine the unique grid cell moves in each dimension after wrapping
+
+        moves = []
+        for i in range(self.dim):
+            moves.append(np.unique(np.array([-2,-1,0,1,2]) % self.numD[i]))
+
+        return np.array(list(product(*moves)), dtype=int)
+
+
+
+class VerletList:
+    '''This class keeps the candidate pairs of a Neighborgrid built with an interaction
+    range of R + skin. The pairs are reused until a point has moved more than half the 
+    skin since the last build, so that no pair within R can be missed. 
+
+    Points are identified by integer ids (e.g. the index of a body in the frame), and the
+    reference position of every id seen so far is kept. A call can pass any subset of the
+    ids, such as the bodies near a nanoparticle. The stored pairs are filtered to the 
+    subset, and the list is only rebuilt if an id is new or has moved too far. '''
+
+    def __init__(self, lim, R, skin, periodic):
+
+        #set the interaction range and skin distance
+        self.R    = R
+        self.skin = skin
+
+        #construct a grid that finds all pairs within the extended range
+        self.grid = Neighborgrid(lim, R + skin, periodic)
+        self.dim  = self.grid.dim
+
+        #init storage for the reference position of each id, and the pair list of ids
+        self.referencePositions = np.zeros((0, self.dim))
+        self.referenceKnown     = np.zeros(0, dtype=bool)
+        self.pairs_i = np.zeros(0, dtype=int)
+        self.pairs_j = np.zeros(0, dtype=int)
+
+        #count the number of builds and calls, to report how often the list is reused
+        self.numBuilds = 0
+        self.numCalls  = 0
+
+
+    def getCandidatePairs(self, positions, ids = None):
+        '''Return arrays (i, j) of all pairs of points with i<j that are within the 
+        interaction radius R, as indices into positions. ids gives the id of each point,
+        and defaults to 0,...,N-1'''
+
+        positions = np.asarray(positions)[:, 0:self.dim]
+        ids = np.arange(len(positions)) if ids is None else np.asarray(ids, dtype=int)
+        self.numCalls += 1
+
+        #rebuild the pair list if needed
+        if self.needsRebuild(positions, ids):
+            self.build(positions, ids)
+
+        #map the stored pairs to the given points, keeping those with both points given
+        index = -np.ones(len(self.referenceKnown), dtype=int)
+        index[ids] = np.arange(len(ids))
+        pairs_i, pairs_j = index[self.pairs_i], index[self.pairs_j]
+        given = (pairs_i >= 0) & (pairs_j >= 0)
+        pairs_i, pairs_j = pairs_i[given], pairs_j[given]
+
+        #filter the pairs by their current distance, and order each pair as i<j
+        distance = self.grid.getPeriodicDistance(positions[pairs_i], positions[pairs_j])
+        within   = distance < self.R
+        pairs_i, pairs_j = pairs_i[within], pairs_j[within]
+
+        return np.minimum(pairs_i, pairs_j), np.maximum(pairs_i, pairs_j)
+
+    def needsRebuild(self, positions, ids):
+        #check if any id is new or has moved more than half the skin since the last build
+
+        if len(ids) == 0:
+            return False
+
+        if ids.max() >= len(self.referenceKnown) or not self.referenceKnown[ids].all():
+            return True
+
+        displacement = self.grid.getPeriodicDistance(positions, self.referencePositions[ids])
+
+        return 2.0 * displacement.max() > self.skin
+
+    def build(self, positions, ids):
+        #update the reference positions of the ids, and store the pairs of all known ids
+
+        #grow the reference arrays to hold every id
+        size = max(len(self.referenceKnown), ids.max() + 1)
+        if size > len(self.referenceKnown):
+            grown = np.zeros((size, self.dim))
+            grown[:len(self.referenceKnown)] = self.referencePositions
+            self.referencePositions = grown
+            self.referenceKnown = np.concatenate([self.referenceKnown,
+                                                  np.zeros(size - len(self.referenceKnown), dtype=bool)])
+
+        self.referencePositions[ids] = positions
+        self.referenceKnown[ids]     = True
+
+        #ids not given keep their older reference position, so their pairs stay valid
+        known = np.flatnonzero(self.referenceKnown)
+        self.grid.updateCellList(self.referencePositions[known])
+        pairs_i, pairs_j = self.grid.getCandidatePairs()
+        self.pairs_i, self.pairs_j = known[pairs_i], known[pairs_j]
+
+        self.numBuilds += 1
+
+        return
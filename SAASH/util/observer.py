@@ -11,16 +11,29 @@ cluster, in every frame. Output as a .sizes file
 Optionally, can supply a 'focus list' which will further identify the number of each
 microstate of that size (fixed to be number of each type of bond for now)
 
+If the 'graph_hash' observable is added, microstates are also distinguished by a
+Weisfeiler-Lehman hash of their bond network (see structure/graphhash.py). Capsid runs
+can likewise count the perfect size clusters by bond count and hash, with set_capsid_key.
+
 2) nanoparticle
 
 This mode only considers assembly in the vicinity of nanoparticles. Will output
 cluster properties that are set in the observer for each nanoparticle in a .np file. 
+Optionally, the adsorption and desorption of each body is written as an event table
+(see events.py), and radial profiles of subunits around each nanoparticle are
+accumulated over the frames (see profiles.py). 
 
 3) cluster
 
 This mode will treat each cluster (2 or more bonded particles) seperately. Will track 
 all properties specified in the observer across each cluster's lifetime. Automatically
-includes the monomer fraction in this list of data. Will be pickled as a .cl file. 
+includes the monomer fraction in this list of data. Will be pickled as a .cl file, or
+optionally written as a columnar .clstore directory (see clusterstore.py). 
+
+4) nanocluster
+
+This mode tracks clusters as in cluster mode, but only the clusters of bodies within the
+cutoff radius of a nanoparticle, as used in nanoparticle mode. Output as a .ncl file. 
 
 
 '''
@@ -39,8 +52,9 @@ class Observer:
         print("\nConstructing an Observer")
 
         #set the allowed run type options and corresponding outfile extensions
-        self.__allowed_run_types = ['bulk', 'nanoparticle', 'cluster','capsid']
-        self.__file_extensions   = {'bulk':'.sizes', 'nanoparticle':'.np', 'cluster':'.cl', 'capsid':'.cap'}
+        self.__allowed_run_types = ['bulk', 'nanoparticle', 'cluster', 'nanocluster', 'capsid']
+        self.__file_extensions   = {'bulk':'.sizes', 'nanoparticle':'.np', 'cluster':'.cl', 
+                                    'nanocluster':'.ncl', 'capsid':'.cap'}
 
         #init a set of observables to compute
         self.__observable_set = set()
@@ -56,6 +70,43 @@ class Observer:
         #set the neighborgrid default cutoff to None, can be overwritten
         self.__ngrid_R = None
 
+        #set the bond detection backend and search mode to None (SimInfo default)
+        self.__bond_backend = None
+        self.__bond_search  = None
+
+        #set the verlet skin distance to None (candidate pairs rebuilt every frame)
+        self.__verlet_skin = None
+
+        #set the kernel backend to None (SimInfo default, numba if available)
+        self.__kernel_backend = None
+
+        #set the number of worker processes for analyzing frames in parallel
+        self.__num_workers = 1
+
+        #set the number of frames read ahead of the analysis on a background thread
+        self.__prefetch_depth = 2
+
+        #set the position cache use to None (use a valid cache if one exists)
+        self.__use_cache = None
+
+        #set the bond cache use to None (use a valid bond cache if one exists)
+        self.__bond_cache = None
+
+        #set the output format for bulk, nanoparticle, and capsid runs
+        self.__output_format = 'text'
+
+        #set the output format for cluster runs
+        self.__cluster_format = 'pickle'
+
+        #set whether nanoparticle runs write adsorption events
+        self.__nano_events = False
+
+        #set the radial profiles of nanoparticle runs to off
+        self.__radial_profile = None
+
+        #set the key of the capsid distribution to the number of bonds
+        self.__capsid_key = 'bonds'
+
         #init variable to store the runtype
         self.__run_type = None
         if run_type:
@@ -71,6 +122,10 @@ class Observer:
         #init a focus list. during a bulk run 
         self.__focus_list = None
 
+        #names for the integer particle and bond types, set from the SimInfo
+        self.__type_names = None
+        self.__bond_names = None
+
 
 
 
@@ -130,6 +185,173 @@ class Observer:
         self.__ngrid_R = ngrid_R
         return
 
+    def get_bond_backend(self):
+
+        return self.__bond_backend
+
+    def set_bond_backend(self, bond_backend):
+        #set the backend used to detect bonds - 'vectorized' or 'particle'
+
+        self.__bond_backend = bond_backend
+        print("Bond detection backend set to {}".format(bond_backend))
+        return
+
+    def get_bond_search(self):
+
+        return self.__bond_search
+
+    def set_bond_search(self, bond_search):
+        #set how candidate bonds are found - 'body' centers or 'pseudoatom' cell lists
+
+        self.__bond_search = bond_search
+        print("Bond search mode set to {}".format(bond_search))
+        return
+
+    def get_verlet_skin(self):
+
+        return self.__verlet_skin
+
+    def set_verlet_skin(self, verlet_skin):
+        #set a skin distance so candidate body pairs are reused between frames
+
+        self.__verlet_skin = verlet_skin
+        print("Verlet skin distance set to {}".format(verlet_skin))
+        return
+
+    def get_kernel_backend(self):
+
+        return self.__kernel_backend
+
+    def set_kernel_backend(self, kernel_backend):
+        #set the kernels used by the vectorized search - 'auto', 'numpy', or 'numba'
+
+        self.__kernel_backend = kernel_backend
+        print("Kernel backend set to {}".format(kernel_backend))
+        return
+
+    def get_num_workers(self):
+
+        return self.__num_workers
+
+    def set_num_workers(self, num_workers):
+        #set the number of processes used to analyze frames in parallel
+
+        if num_workers < 1:
+            raise ValueError("The number of workers must be at least 1")
+
+        self.__num_workers = num_workers
+        print("Number of worker processes set to {}".format(num_workers))
+        return
+
+    def get_prefetch_depth(self):
+
+        return self.__prefetch_depth
+
+    def set_prefetch_depth(self, prefetch_depth):
+        #set the number of frames read ahead in the background. 0 reads frames when needed
+
+        if prefetch_depth < 0:
+            raise ValueError("The prefetch depth must be non-negative")
+
+        self.__prefetch_depth = prefetch_depth
+        print("Frame prefetch depth set to {}".format(prefetch_depth))
+        return
+
+    def get_use_cache(self):
+
+        return self.__use_cache
+
+    def set_use_cache(self, use_cache):
+        #True builds the position cache if needed, False always reads the gsd file
+
+        self.__use_cache = use_cache
+        print("Position cache use set to {}".format(use_cache))
+        return
+
+    def get_bond_cache(self):
+
+        return self.__bond_cache
+
+    def set_bond_cache(self, bond_cache):
+        #True stores the bond network of each analyzed frame, False never uses stored networks
+
+        self.__bond_cache = bond_cache
+        print("Bond cache use set to {}".format(bond_cache))
+        return
+
+    def get_output_format(self):
+
+        return self.__output_format
+
+    def set_output_format(self, output_format):
+        #set the output format - 'text', or 'npz' for compressed binary arrays
+
+        if output_format not in ['text', 'npz']:
+            raise ValueError("Output format must be 'text' or 'npz'")
+
+        self.__output_format = output_format
+        print("Output format set to {}".format(output_format))
+        return
+
+    def get_cluster_format(self):
+
+        return self.__cluster_format
+
+    def set_cluster_format(self, cluster_format):
+        #set the cluster run output - a pickled 'pickle' .cl file, or a columnar 'store'
+
+        if cluster_format not in ['pickle', 'store']:
+            raise ValueError("Cluster format must be 'pickle' or 'store'")
+
+        self.__cluster_format = cluster_format
+        print("Cluster format set to {}".format(cluster_format))
+        return
+
+    def get_nano_events(self):
+
+        return self.__nano_events
+
+    def set_nano_events(self, nano_events):
+        #True writes the adsorption events and largest cluster ids of nanoparticle runs
+
+        self.__nano_events = nano_events
+        print("Nanoparticle events set to {}".format(nano_events))
+        return
+
+    def get_radial_profile(self):
+
+        return self.__radial_profile
+
+    def set_radial_profile(self, num_bins, r_max = None):
+        #histogram body and pseudoatom distances from each nanoparticle into radial shells
+        #r_max defaults to the largest adsorption cutoff. None for num_bins turns this off
+
+        if num_bins is None:
+            self.__radial_profile = None
+            print("Radial profiles turned off")
+            return
+
+        if num_bins < 1 or (r_max is not None and r_max <= 0):
+            raise ValueError("The number of radial shells and r_max must be positive")
+
+        self.__radial_profile = (int(num_bins), r_max)
+        print("Radial profiles set to {} shells, up to r_max {}".format(num_bins, r_max))
+        return
+
+    def get_capsid_key(self):
+
+        return self.__capsid_key
+
+    def set_capsid_key(self, capsid_key):
+        #'bonds' counts perfect size clusters by number of bonds, 'graph_hash' by bonds and hash
+
+        if capsid_key not in ['bonds', 'graph_hash']:
+            raise ValueError("Capsid key must be 'bonds' or 'graph_hash'")
+
+        self.__capsid_key = capsid_key
+        print("Capsid key set to {}".format(capsid_key))
+        return
+
 
     def set_first_frame(self, first_frame):
 
@@ -203,6 +425,14 @@ class Observer:
 
         return 
 
+    def set_type_names(self, type_names, bond_names):
+        #set the names used to convert integer particle and bond types for output
+
+        self.__type_names = type_names
+        self.__bond_names = bond_names
+
+        return
+
     def compute_observables(self, cluster):
         '''this computes various observables for the cluster, based on user input
            given to the observer class. Default is simply number of bodies'''
@@ -230,7 +460,7 @@ class Observer:
 
         elif obs == "bonds":
 
-            return cluster.get_bond_types()
+            return cluster.get_bond_types(self.__bond_names)
 
         elif obs == "indices":
 
@@ -238,12 +468,16 @@ class Observer:
 
         elif obs == "types":
 
-            return cluster.get_body_types()
+            return cluster.get_body_types(self.__type_names)
 
         elif obs == "bond_counts":
 
             return cluster.get_bond_counts()
 
+        elif obs == "graph_hash":
+
+            return cluster.get_graph_hash()
+
         else:
 
             raise("The requested property is not implemented. Check that it is"\
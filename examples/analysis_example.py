@@ -45,11 +45,13 @@ if __name__ == "__main__":
         print("Usage: %s <gsd_file> <ixn_file> <frame_skip>" % sys.argv[0])
         raise
 
-    #do a bulk analysis run - tracks number of clusters of each size every jump frames
-    observer = setup_observer(gsd_file, 'bulk', jump=jump)
-    analyze.run_analysis(gsd_file, ixn_file=ixn_file, observer=observer)
+    #bulk analysis - tracks number of clusters of each size every jump frames
+    bulk_observer = setup_observer(gsd_file, 'bulk', jump=jump)
 
-    #do a cluster analysis with num_bodies as an observable
+    #cluster analysis with num_bodies as an observable
     observables = ['num_bodies']
-    observer = setup_observer(gsd_file, 'cluster', observables=observables)
-    analyze.run_analysis(gsd_file, ixn_file=ixn_file, observer=observer)
+    cluster_observer = setup_observer(gsd_file, 'cluster', observables=observables)
+
+    #do both analyses in a single pass over the trajectory. each writes its own output
+    observers = [bulk_observer, cluster_observer]
+    analyze.run_analysis(gsd_file, ixn_file=ixn_file, observer=observers)
@@ -39,12 +39,14 @@ if __name__ == "__main__":
     
     observables = ['num_bodies', 'indices', 'bonds', 'bond_counts']
 
-    #do a bulk analysis run - tracks number of clusters of each size every jump frames
-    observer = setup_observer(test_file, 'bulk', jump=jump, observables=observables)
-    analyze.run_analysis(test_file, ixn_file=ixn_file, observer=observer)
+    #bulk analysis - tracks number of clusters of each size every jump frames
+    bulk_observer = setup_observer(test_file, 'bulk', jump=jump, observables=observables)
 
-    #do a cluster analysis with num_bodies as an observable
-    observer = setup_observer(test_file, 'cluster', observables=observables, jump=jump)
-    analyze.run_analysis(test_file, ixn_file=ixn_file, observer=observer)
+    #cluster analysis with num_bodies as an observable
+    cluster_observer = setup_observer(test_file, 'cluster', observables=observables, jump=jump)
+
+    #do both analyses in a single pass over the trajectory
+    observers = [bulk_observer, cluster_observer]
+    analyze.run_analysis(test_file, ixn_file=ixn_file, observer=observers)
 
 
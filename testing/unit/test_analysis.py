@@ -0,0 +1,202 @@
+import os
+import pytest
+
+#add the path to the package root for testing
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import gsd.hoomd
+
+from SAASH import analyze
+from SAASH.util import observer as obs
+
+from test_bonds import makeSnap
+
+
+def writeTrajectory(tmp_path, num_frames=6, name="traj.gsd"):
+    #write a short trajectory of independent snaps and an interaction file
+
+    gsd_file = os.path.join(tmp_path, name)
+    with gsd.hoomd.open(name=gsd_file, mode='w') as f:
+        for frame_num in range(num_frames):
+            f.append(makeSnap(seed=frame_num))
+
+    ixn_file = os.path.join(tmp_path, "interactions.txt")
+    with open(ixn_file, 'w') as f:
+        f.write("A B 0.35\nA A 0.35\n")
+
+    return gsd_file, ixn_file
+
+
+def runAnalysis(gsd_file, ixn_file, run_type, **options):
+    #run an analysis with the observer options given as setter name -> value
+
+    observer = obs.Observer(gsd_file, run_type)
+    for setter, value in options.items():
+        getattr(observer, setter)(value)
+
+    analyze.run_analysis(gsd_file, ixn_file=ixn_file, observer=observer, N_perfect=5)
+
+    with open(observer.get_outfile()) as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("run_type", ['bulk', 'capsid'])
+def testParallelFramesMatchSerial(tmp_path, run_type):
+    #analyzing frames in worker processes should give the same output as a serial run
+
+    gsd_file, ixn_file = writeTrajectory(tmp_path)
+
+    serial   = runAnalysis(gsd_file, ixn_file, run_type)
+    parallel = runAnalysis(gsd_file, ixn_file, run_type, set_num_workers=2)
+
+    assert(len(serial) > 0)
+    assert(serial == parallel)
+
+
+def testFrameDataMatchesSnap(tmp_path):
+    #a frame rebuilt from its compact frame data should have the same clusters and monomers
+
+    from SAASH.structure import frame
+    from test_bonds import makeSim
+
+    snap = makeSnap(seed=3)
+    sim  = makeSim(snap, tmp_path)
+
+    direct  = frame.get_data_from_snap(snap, sim, 0)
+    rebuilt = frame.get_data_from_frame_data(frame.get_frame_data(snap, sim), sim, 0)
+
+    def getClusters(current_frame):
+        return sorted(sorted(bod.get_id() for bod in cluster.get_bodies()) 
+                      for cluster in current_frame.get_clusters())
+
+    assert(getClusters(direct) == getClusters(rebuilt))
+    assert(sorted(direct.get_monomer_ids()) == sorted(rebuilt.get_monomer_ids()))
+
+
+def testParallelClusterTracking(tmp_path):
+    #cluster tracking with frames labeled in worker processes should run to completion
+
+    gsd_file, ixn_file = writeTrajectory(tmp_path)
+
+    observer = obs.Observer(gsd_file, 'cluster')
+    observer.set_num_workers(2)
+    analyze.run_analysis(gsd_file, ixn_file=ixn_file, observer=observer)
+
+    assert(os.path.getsize(observer.get_outfile()) > 0)
+
+
+def testMultipleObserversMatchSeparateRuns(tmp_path):
+    #a single pass with several observers should write the same files as separate runs
+
+    gsd_file, ixn_file = writeTrajectory(tmp_path)
+
+    separate = [runAnalysis(gsd_file, ixn_file, run_type) for run_type in ['bulk', 'capsid']]
+
+    observers = [obs.Observer(gsd_file, run_type) for run_type in ['bulk', 'capsid', 'cluster']]
+    analyze.run_analysis(gsd_file, ixn_file=ixn_file, observer=observers, N_perfect=5)
+
+    for observer, expected in zip(observers, separate):
+        with open(observer.get_outfile()) as f:
+            assert(f.read() == expected)
+
+    assert(os.path.getsize(observers[2].get_outfile()) > 0)
+
+
+@pytest.mark.parametrize("depth", [0, 1, 3])
+def testFrameSource(tmp_path, depth):
+    #prefetched frames should be the requested snapshots, in order
+
+    gsd_file, ixn_file = writeTrajectory(tmp_path)
+    snaps = gsd.hoomd.open(name=gsd_file, mode="r")
+
+    frame_nums   = [0, 2, 3, 5]
+    frame_source = analyze.FrameSource(snaps, frame_nums, depth)
+    for frame_num, snap in frame_source:
+
+        expected = snaps[frame_num].particles.position
+        assert(np.array_equal(snap.particles.position, expected))
+
+    assert(frame_source.get_wait_time() >= 0)
+    assert(frame_source.get_compute_time() >= 0)
+
+    #stopping early should stop the reader, and read errors should be raised
+    for frame_num, snap in analyze.FrameSource(snaps, frame_nums, depth):
+        break
+
+    with pytest.raises(IndexError):
+        for frame_num, snap in analyze.FrameSource(snaps, [0, 10], depth):
+            pass
+
+
+def testNanoVicinityFrame(tmp_path, monkeypatch):
+    #a nanocluster frame should only contain the clusters of bodies near a nanoparticle
+
+    from SAASH.structure import body, bondengine, frame
+    from test_bonds import makeSim
+
+    snap = makeSnap(seed=5)
+    sim  = makeSim(snap, tmp_path)
+    sim.radius_mult = 1.0
+    sim.largest_bond_distance = 0.35
+
+    nanos = [body.Nano('N', 3.0, np.array([0.0, 0.0])), body.Nano('N', 2.0, np.array([6.0, 5.0]))]
+    monkeypatch.setattr(body, 'get_nanoparticles', lambda snap, sim: nanos)
+
+    bodies = body.create_bodies(snap, sim)
+    vicinity_graph, members = analyze.get_nano_vicinity(snap, sim, bodies)
+
+    #the bonds should be those detected between the nearby bodies only
+    near = body.get_adsorbed_bodies(bodies, nanos, sim).any(axis=0)
+    assert(members.tolist() == np.flatnonzero(near).tolist())
+
+    expected = bondengine.get_bond_graph(bodies, sim).get_subgraph(members).get_edges()
+    edges    = vicinity_graph.get_edges()
+    assert(np.array_equal(members[expected[0]], edges[0]))
+    assert(np.array_equal(members[expected[1]], edges[1]))
+
+    #only members appear in clusters and monomers, and the frame survives packing
+    for current_frame in [frame.make_frame(bodies, vicinity_graph, 0, members),
+                          frame.get_data_from_frame_data(
+                              frame.pack_frame_data(bodies, vicinity_graph, members), sim, 0)]:
+
+        clustered = [bod.get_id() for c in current_frame.get_clusters() for bod in c.get_bodies()]
+        monomers  = current_frame.get_monomer_ids()
+        assert(sorted(clustered + list(monomers)) == members.tolist())
+        assert(current_frame.get_monomer_fraction() == len(monomers) / len(members))
+
+
+def testVerletListReusedNearNanoparticles(tmp_path, monkeypatch):
+    #the verlet list should be reused when each frame searches a different subset of bodies
+
+    from SAASH.structure import body
+    from test_bonds import makeSim
+
+    snap = makeSnap(seed=5)
+    sim  = makeSim(snap, tmp_path)
+    verlet_sim = makeSim(snap, tmp_path, verlet_skin=0.5)
+    for s in [sim, verlet_sim]:
+        s.radius_mult = 1.0
+        s.largest_bond_distance = 0.35
+
+    #alternate between two nanoparticle layouts, so the adsorbed bodies change every frame
+    layouts = [[body.Nano('N', 3.0, np.array([0.0, 0.0]))],
+               [body.Nano('N', 4.0, np.array([5.0, -4.0]))]]
+
+    rng = np.random.default_rng(0)
+    positions = snap.particles.position.copy()
+    for frame_num in range(6):
+
+        monkeypatch.setattr(body, 'get_nanoparticles', lambda snap, sim: layouts[frame_num % 2])
+        jitter = rng.normal(scale=0.01, size=positions.shape).astype(np.float32)
+        jitter[:, 2] = 0
+        snap.particles.position = positions + jitter
+
+        expected = analyze.analyze_nano(snap, sim, None)
+        assert(analyze.analyze_nano(snap, verlet_sim, None) == expected)
+
+    verlet_list = verlet_sim.verlet_list
+    assert(verlet_list.numCalls == 6)
+    assert(verlet_list.numBuilds < verlet_list.numCalls)
@@ -0,0 +1,376 @@
+import os
+import pytest
+
+#add the path to the package root for testing
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+
+import numpy as np
+import gsd.hoomd
+
+from SAASH.simInfo import SimInfo
+from SAASH.structure import body
+from SAASH.structure import bondengine
+from SAASH.structure import cluster
+from SAASH.structure import frame
+from SAASH.structure import bondgraph
+from SAASH.util import kernels
+from SAASH.util import neighborgrid
+
+
+def makeSnap(num_chains=20, chain_len=5, num_monomers=40, L=20.0, noise=0.1, seed=0):
+    '''Create a 2d snapshot of rod-like subunits with an 'A' patch on one end and a 'B'
+       patch on the other. Subunits are placed in noisy chains so that some patches bond.
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    #place chains of subunits plus free monomers
+    centers = []
+    angles  = []
+    for c in range(num_chains):
+        start = rng.uniform(-L/2, L/2, size=2)
+        theta = rng.uniform(0, 2*np.pi)
+        for k in range(chain_len):
+            centers.append(start + k * np.array([np.cos(theta), np.sin(theta)]))
+            angles.append(theta)
+
+    for m in range(num_monomers):
+        centers.append(rng.uniform(-L/2, L/2, size=2))
+        angles.append(rng.uniform(0, 2*np.pi))
+
+    #perturb positions and orientations, then compute patch locations
+    centers = np.array(centers) + rng.normal(scale=noise, size=(len(centers),2))
+    angles  = np.array(angles) + rng.normal(scale=noise, size=len(angles))
+    direction = 0.5 * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+    N = len(centers)
+
+    positions = np.concatenate([centers, centers + direction, centers - direction])
+    positions = (positions + L/2) % L - L/2
+    positions = np.concatenate([positions, np.zeros((3*N,1))], axis=1)
+
+    snap = gsd.hoomd.Frame()
+    snap.configuration.box = [L, L, 0, 0, 0, 0]
+    snap.particles.N = 3*N
+    snap.particles.types = ['R', 'A', 'B']
+    snap.particles.position = positions.astype(np.float32)
+    snap.particles.typeid = np.repeat([0, 1, 2], N).astype(np.uint32)
+    snap.particles.body = np.tile(np.arange(N), 3).astype(np.int32)
+
+    return snap
+
+
+def makeSim(snap, tmp_path, **kwargs):
+    #write an interaction file and construct a SimInfo for the snap
+
+    ixn_file = os.path.join(tmp_path, "interactions.txt")
+    with open(ixn_file, 'w') as f:
+        f.write("A B 0.35\nA A 0.35\n")
+
+    return SimInfo(snap, 1, ixn_file=ixn_file, verbose=False, **kwargs)
+
+
+def getBondSet(snap, sim):
+    #return the set of bonded body pairs and their bond codes, and the bond graph
+
+    bodies = body.create_bodies(snap, sim)
+    bond_graph = bondengine.get_bond_graph(bodies, sim)
+
+    bonds = set(zip(*[edge.tolist() for edge in bond_graph.get_edges()]))
+
+    return bonds, bond_graph
+
+
+def testVectorizedBondsMatchParticleSearch(tmp_path):
+    #the vectorized engine should find exactly the bonds of the per particle search
+
+    snap = makeSnap()
+    bonds_p, graph_p = getBondSet(snap, makeSim(snap, tmp_path, bond_backend='particle'))
+    bonds_v, graph_v = getBondSet(snap, makeSim(snap, tmp_path, bond_backend='vectorized'))
+
+    assert(len(bonds_p) > 0)
+    assert(bonds_p == bonds_v)
+    assert(np.array_equal(graph_p.get_indptr(), graph_v.get_indptr()))
+    assert(np.array_equal(graph_p.get_indices(), graph_v.get_indices()))
+
+
+def testPseudoatomSearchMatchesBodySearch(tmp_path):
+    #binning pseudoatoms per bond type should find the same bonds as the body search
+
+    snap = makeSnap(seed=1)
+    bonds_b, graph_b = getBondSet(snap, makeSim(snap, tmp_path, bond_search='body'))
+    bonds_a, graph_a = getBondSet(snap, makeSim(snap, tmp_path, bond_search='pseudoatom'))
+
+    assert(len(bonds_b) > 0)
+    assert(bonds_b == bonds_a)
+
+
+def testEdgeList(tmp_path):
+    #edges should be unique i<j pairs with valid bond type indices
+
+    snap = makeSnap(seed=3)
+    sim  = makeSim(snap, tmp_path)
+    bodies = body.create_bodies(snap, sim)
+
+    bi, bj, bond_type = bondengine.get_bond_edges(bodies, sim)
+
+    assert((bi < bj).all())
+    assert(len(set(zip(bi, bj))) == len(bi))
+    assert(((bond_type >= 0) & (bond_type < len(sim.bonds))).all())
+
+
+def testTopologyMatchesSnapBodies(tmp_path):
+    #bodies built from the static topology should match the layout of the snap
+
+    snap = makeSnap(seed=2)
+    sim  = makeSim(snap, tmp_path)
+    bodies = body.create_bodies(snap, sim)
+
+    #makeSnap places all centers, then all 'A' patches, then all 'B' patches
+    N = len(snap.particles.body) // 3
+    positions = snap.particles.position[:, 0:2]
+
+    assert(len(bodies) == N)
+    for k, bod in enumerate(bodies):
+
+        assert(bod.get_id() == k)
+        assert(bod.get_HOOMD_id() == k)
+        assert(np.array_equal(bod.get_position(), positions[k]))
+        assert(np.array_equal(bod.get_particle_positions(), positions[[N+k, 2*N+k]]))
+        assert(list(bod.get_particle_types()) == [1, 2])
+        assert(bod.get_type() == 'R')
+
+
+def testUnknownBackend(tmp_path):
+
+    snap = makeSnap()
+    with pytest.raises(ValueError):
+        makeSim(snap, tmp_path, bond_backend='unknown')
+
+
+def testPseudoatomSearchNeedsVectorizedBackend(tmp_path):
+    #asking for the pseudoatom search with the particle backend should warn that it is unused
+
+    snap = makeSnap()
+    with pytest.warns(UserWarning, match="pseudoatom"):
+        sim = makeSim(snap, tmp_path, bond_backend='particle', bond_search='pseudoatom')
+
+    assert(len(sim.bond_grids) == 0)
+
+
+def testIntegerTypes(tmp_path):
+    #integer type and bond codes should map back to the original names
+
+    snap = makeSnap(seed=4)
+    sim  = makeSim(snap, tmp_path)
+    bodies = body.create_bodies(snap, sim)
+
+    assert(sim.bond_names == ["A-B", "A-A"])
+    for code, bond in enumerate(sim.bonds):
+        type1, type2 = bond.get_type_ids()
+        assert(bond.get_code() == code)
+        assert((sim.type_names[type1], sim.type_names[type2]) == bond.get_types())
+
+    for bod in bodies:
+        assert(sim.type_names[bod.get_typeid()] == bod.get_type())
+        assert(len(bod.get_particles_by_type(sim.type_map['A'])) == 1)
+
+
+def testBondObservableUsesNames(tmp_path):
+    #an observer without the SimInfo names should still key bonds by name
+
+    from SAASH.util import observer as obs
+
+    snap = makeSnap(seed=4)
+    sim  = makeSim(snap, tmp_path)
+    bodies = body.create_bodies(snap, sim)
+
+    observer   = obs.Observer()
+    bond_graph = bondengine.get_bond_graph(bodies, sim)
+    for graph in [bond_graph, bond_graph.get_subgraph(np.arange(len(bodies)))]:
+
+        fr = frame.make_frame(bodies, graph, 0)
+        assert(len(fr.get_clusters()) > 0)
+        for clust in fr.get_clusters():
+            bonds = observer.compute_observable(clust, 'bonds')
+            assert(len(bonds) > 0 and set(bonds) <= set(sim.bond_names))
+
+    #frames rebuilt from frame data keep the names as well
+    rebuilt = frame.get_data_from_frame_data(frame.get_frame_data(snap, sim), sim, 0)
+    for clust in rebuilt.get_clusters():
+        assert(set(observer.compute_observable(clust, 'bonds')) <= set(sim.bond_names))
+
+
+def testGroupLabels():
+    #groups from the connected component labels should partition the bodies, ordered by
+    #their lowest index, with every bond inside a single group
+
+    rng = np.random.default_rng(5)
+    num_bodies = 60
+    bond_dict  = {i:[] for i in range(num_bodies)}
+    for i, j in rng.integers(num_bodies, size=(40, 2)):
+        if i != j and j not in bond_dict[i]:
+            bond_dict[i].append(j)
+            bond_dict[j].append(i)
+
+    G = cluster.get_groups(bond_dict)
+    labels = cluster.get_labels(num_bodies, *cluster.get_bond_edges(bond_dict))
+
+    assert(sorted(sum(G, [])) == list(range(num_bodies)))
+    assert([group[0] for group in G] == sorted(group[0] for group in G))
+    for k, group in enumerate(G):
+        assert((labels[group] == k).all())
+        for bod in group:
+            assert(all(labels[partner] == k for partner in bond_dict[bod]))
+
+    size_dict, largest = cluster.get_group_sizes(G)
+    assert(sum(L * n for L, n in size_dict.items()) == num_bodies)
+    assert(largest == np.bincount(labels).max())
+
+
+def testGroupMemberOrder(tmp_path):
+    #group members, and so the bodies of each cluster, are in ascending index order
+
+    bond_dict = {0:[4, 2], 1:[3], 2:[0, 5], 3:[1], 4:[0], 5:[2]}
+    assert(cluster.get_groups(bond_dict) == [[0, 2, 4, 5], [1, 3]])
+
+    snap = makeSnap()
+    sim  = makeSim(snap, tmp_path)
+
+    bodies = body.create_bodies(snap, sim)
+    fr = frame.make_frame(bodies, bondengine.get_bond_graph(bodies, sim), 0)
+
+    assert(len(fr.get_clusters()) > 0)
+    for clust in fr.get_clusters():
+        ids = clust.get_body_ids()
+        assert(list(ids) == sorted(ids))
+
+
+def testBondGraph():
+    #the CSR bond graph should agree with the adjacency lists it was built from
+
+    rng = np.random.default_rng(6)
+    num_bodies = 50
+    bond_dict  = {i:dict() for i in range(num_bodies)}
+    for i, j in rng.integers(num_bodies, size=(60, 2)):
+        if i != j and j not in bond_dict[i]:
+            code = rng.integers(3)
+            bond_dict[i][j] = code
+            bond_dict[j][i] = code
+
+    edges = [(i, j, k) for i in bond_dict for j, k in bond_dict[i].items() if i < j]
+    bodies_i, bodies_j, codes = np.array(edges).T
+    graph = bondgraph.BondGraph(num_bodies, bodies_i, bodies_j, codes, num_bond_types=3)
+
+    assert(graph.get_num_bonds() == len(edges))
+    for i in range(num_bodies):
+        assert(graph.get_degree(i) == len(bond_dict[i]))
+        assert(graph.get_neighbors(i).tolist() == sorted(bond_dict[i]))
+        assert(graph.get_neighbor_codes(i).tolist() == [bond_dict[i][j] for j in sorted(bond_dict[i])])
+        for j in range(num_bodies):
+            assert(graph.is_bonded(i, j) == (j in bond_dict[i]))
+
+    #bond type counts and number of bonds for each connected component
+    labels    = graph.get_labels()
+    num_bonds = graph.get_group_num_bonds()
+    for group in cluster.get_groups_from_labels(labels):
+        group_edges = [k for i, j, k in edges if i in group]
+        counts = graph.get_bond_type_counts(group)
+        assert(counts.tolist() == np.bincount(group_edges, minlength=3).tolist())
+        assert(num_bonds[labels[group[0]]] == len(group_edges))
+
+        degree_counts = graph.get_degree_counts(group)
+        assert(degree_counts.sum() == len(group))
+
+
+def testSubgraphMatchesSubsetBonds(tmp_path):
+    #the subgraph of a frame's bonds should match detecting bonds between only those bodies
+
+    snap = makeSnap()
+    sim  = makeSim(snap, tmp_path)
+
+    bodies  = body.create_bodies(snap, sim)
+    members = np.arange(0, len(bodies), 2)
+
+    subgraph = bondengine.get_bond_graph(bodies, sim).get_subgraph(members)
+    expected = bondengine.get_bond_graph([bodies[i] for i in members], sim)
+
+    assert(expected.get_num_bonds() > 0)
+    assert(np.array_equal(subgraph.get_indptr(), expected.get_indptr()))
+    assert(np.array_equal(subgraph.get_indices(), expected.get_indices()))
+    assert(np.array_equal(subgraph.get_bond_codes(), expected.get_bond_codes()))
+    assert(np.array_equal(subgraph.get_labels(), expected.get_labels()))
+
+
+def testBondReach(tmp_path):
+    #pruning pairs by the reach of each bond should not change the bonds that are found
+
+    snap = makeSnap(seed=7, noise=0.3)
+    sim  = makeSim(snap, tmp_path)
+
+    #the patches sit 0.5 from the center, and the rod type has no patches of its own type
+    R, A = sim.type_names.index('R'), sim.type_names.index('A')
+    assert(np.isclose(sim.type_reach[R, A], 0.5, rtol=1e-2))
+    assert(sim.type_reach[R, R] == -np.inf)
+
+    bonds_pruned, graph = getBondSet(snap, sim)
+
+    #bodies with an unknown type are never pruned
+    bodies = body.create_bodies(snap, sim)
+    for bod in bodies:
+        bod.set_typeid(-1)
+    edges = bondengine.get_bond_edges(bodies, sim)
+    bonds_full = set(zip(*[edge.tolist() for edge in edges]))
+
+    assert(len(bonds_full) > 0)
+    assert(bonds_pruned == bonds_full)
+
+
+@pytest.mark.skipif(not kernels.NUMBA_AVAILABLE, reason="numba is not installed")
+def testKernelsMatchNumpy(tmp_path):
+    #the compiled kernels should give identical distances, candidate pairs, and bonds
+
+    rng = np.random.default_rng(8)
+    for dtype in [np.float32, np.float64]:
+        box = np.array([10, 12, 9], dtype=dtype)
+        x0  = rng.uniform(-5, 5, size=(1000, 3)).astype(dtype)
+        x1  = rng.uniform(-5, 5, size=(1000, 3)).astype(dtype)
+        assert(np.array_equal(kernels.distance2(x0, x1, box), body.distance2(x0, x1, box)))
+
+    lims = [[-5,5],[-6,6],[-5,5]]
+    grid = neighborgrid.Neighborgrid(lims, 1.7, (1,1,1))
+    grid.updateCellList(x0)
+    expected = set(zip(*grid.getCandidatePairs()))
+    grid.useNumba = True
+    assert(set(zip(*grid.getCandidatePairs())) == expected)
+
+    snap = makeSnap(seed=9)
+    for search in ['body', 'pseudoatom']:
+        bonds_n, graph_n = getBondSet(snap, makeSim(snap, tmp_path, bond_search=search,
+                                                    kernel_backend='numpy'))
+        bonds_c, graph_c = getBondSet(snap, makeSim(snap, tmp_path, bond_search=search,
+                                                    kernel_backend='numba'))
+        assert(len(bonds_n) > 0)
+        assert(bonds_n == bonds_c)
+
+
+def testAdsorbedBodiesMatchIsNearby(tmp_path):
+    #the vectorized adsorption check should agree with is_nearby for every pair
+
+    snap = makeSnap(seed=4)
+    sim  = makeSim(snap, tmp_path)
+    sim.radius_mult = 1.0
+    sim.largest_bond_distance = 0.35
+
+    bodies = body.create_bodies(snap, sim)
+    nanos  = [body.Nano('N', radius, np.array(center)) 
+              for radius, center in [(2.0, [0.0, 0.0]), (1.5, [9.5, -9.5]), (3.0, [4.0, 2.0])]]
+
+    adsorbed = body.get_adsorbed_bodies(bodies, nanos, sim)
+    for n, nano in enumerate(nanos):
+        cutoff   = nano.get_radius() * sim.radius_mult + sim.largest_bond_distance
+        expected = [bod.is_nearby(nano.get_position(), cutoff * cutoff, sim.box_dim) 
+                    for bod in bodies]
+        assert(adsorbed[n].tolist() == expected)
+
+    assert(adsorbed.any())
@@ -0,0 +1,98 @@
+import os
+import pytest
+
+#add the path to the package root for testing
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pickle
+
+from SAASH import cache
+from SAASH.simInfo import SimInfo
+from SAASH.util import gsdreader
+
+from test_analysis import writeTrajectory, runAnalysis
+
+
+def testCachedPositionsMatchGSD(tmp_path):
+    #frames read from the cache should give the topology the same positions as the gsd
+
+    gsd_file, ixn_file = writeTrajectory(tmp_path)
+    assert(not cache.is_cache_valid(gsd_file, ixn_file))
+
+    cache.build_cache(gsd_file, ixn_file)
+    assert(cache.is_cache_valid(gsd_file, ixn_file))
+
+    snaps = gsdreader.GSDReader(gsd_file)
+    sim   = SimInfo(snaps[0], len(snaps), ixn_file=ixn_file, verbose=False)
+    cached_snaps = cache.load_cache(gsd_file, ixn_file, snaps[0], sim)
+
+    #the cache should also be usable after pickling, as in a worker process
+    for trajectory in [cached_snaps, pickle.loads(pickle.dumps(cached_snaps))]:
+
+        assert(len(trajectory) == len(snaps))
+        for frame_num in range(len(snaps)):
+
+            snap, cached_snap = snaps[frame_num], trajectory[frame_num]
+            assert(np.array_equal(sim.topology.get_atom_positions(snap),
+                                  sim.topology.get_atom_positions(cached_snap)))
+            assert(np.array_equal(sim.topology.get_center_positions(snap),
+                                  sim.topology.get_center_positions(cached_snap)))
+            assert(np.array_equal(snap.configuration.box, cached_snap.configuration.box))
+
+
+def testCacheInvalidation(tmp_path):
+    #changing the interaction file should invalidate the cache
+
+    gsd_file, ixn_file = writeTrajectory(tmp_path)
+    cache.build_cache(gsd_file, ixn_file)
+
+    with open(ixn_file, 'a') as f:
+        f.write("B B 0.35\n")
+
+    assert(not cache.is_cache_valid(gsd_file, ixn_file))
+
+
+@pytest.mark.parametrize("run_type", ['bulk', 'capsid'])
+def testCachedAnalysisMatchesGSD(tmp_path, run_type):
+    #an analysis reading from the cache should give the same output
+
+    gsd_file, ixn_file = writeTrajectory(tmp_path)
+
+    expected = runAnalysis(gsd_file, ixn_file, run_type, set_use_cache=False)
+    cached   = runAnalysis(gsd_file, ixn_file, run_type, set_use_cache=True)
+
+    assert(cache.is_cache_valid(gsd_file, ixn_file))
+    assert(cached == expected)
+
+
+def testBondCacheSkipsBondDetection(tmp_path, monkeypatch):
+    #a later run should take the bond network of each frame from the bond cache
+
+    from SAASH.structure import bondengine
+
+    gsd_file, ixn_file = writeTrajectory(tmp_path)
+    expected = runAnalysis(gsd_file, ixn_file, 'bulk', set_bond_cache=True)
+
+    def failDetection(*args, **kwargs):
+        raise RuntimeError("Bond detection should be skipped")
+    monkeypatch.setattr(bondengine, 'get_bond_graph', failDetection)
+
+    assert(runAnalysis(gsd_file, ixn_file, 'bulk') == expected)
+    assert(len(runAnalysis(gsd_file, ixn_file, 'capsid')) > 0)
+
+
+def testBondCacheInvalidation(tmp_path):
+    #changing a SimInfo bond parameter should invalidate the bond cache
+
+    gsd_file, ixn_file = writeTrajectory(tmp_path)
+    snaps = gsdreader.GSDReader(gsd_file)
+
+    sim = SimInfo(snaps[0], len(snaps), ixn_file=ixn_file, verbose=False)
+    cache.BondCache(gsd_file, ixn_file, sim, write=True)
+    assert(cache.BondCache(gsd_file, ixn_file, sim, write=False).is_valid())
+
+    sim = SimInfo(snaps[0], len(snaps), ixn_file=ixn_file, cutoff_mult=1.5, verbose=False)
+    assert(not cache.BondCache(gsd_file, ixn_file, sim, write=False).is_valid())
@@ -95,6 +95,76 @@ def testNeighborGrid3D():
     print("3D Neighborgrid Test Passed")
     return
 
+def testCellList2D():
+    #the vectorized cell list should find each lattice neighbor pair exactly once
+
+    lims = [[0,9],[0,9]]
+    ng = neighborgrid.Neighborgrid(lims, 1.5, (1,1))
+
+    positions = np.array([[i,j] for i in range(9) for j in range(9)], dtype=float)
+    ng.updateCellList(positions)
+    pairs_i, pairs_j = ng.getCandidatePairs()
+
+    #each site has 8 neighbors within 1.5, each pair counted once
+    assert(len(pairs_i) == 81 * 8 // 2)
+    assert((pairs_i < pairs_j).all())
+    assert(len(set(zip(pairs_i, pairs_j))) == len(pairs_i))
+
+    print("2D Cell List Test Passed")
+
+    return
+
+def testCellListBruteForce():
+    #compare the cell list against an all pairs search on random points
+
+    rng = np.random.default_rng(0)
+    for L, R in [(9,1.5), (10,3.7), (4,1.5), (4,2.0), (3,1.7)]:
+
+        lims = [[-L/2,L/2],[-L/2,L/2],[-L/2,L/2]]
+        ng = neighborgrid.Neighborgrid(lims, R, (1,1,1))
+
+        positions = rng.uniform(-L/2, L/2, size=(300,3))
+        ng.updateCellList(positions)
+        found = set(zip(*ng.getCandidatePairs()))
+
+        expected = set()
+        for i in range(len(positions)):
+            for j in range(i+1, len(positions)):
+                if body.distance(positions[i], positions[j], np.array([L,L,L])) < R:
+                    expected.add((i,j))
+
+        assert(found == expected)
+
+    print("Cell List Brute Force Test Passed")
+
+    return
+
+def testVerletList():
+    #pairs from the verlet list should match a fresh cell list as points drift
+
+    rng = np.random.default_rng(1)
+    L, R, skin = 10, 1.5, 0.4
+    lims = [[-L/2,L/2],[-L/2,L/2],[-L/2,L/2]]
+    ng = neighborgrid.Neighborgrid(lims, R, (1,1,1))
+    vl = neighborgrid.VerletList(lims, R, skin, (1,1,1))
+
+    positions = rng.uniform(-L/2, L/2, size=(300,3))
+    for step in range(20):
+
+        ng.updateCellList(positions)
+        expected = set(zip(*ng.getCandidatePairs()))
+        found    = set(zip(*vl.getCandidatePairs(positions)))
+        assert(found == expected)
+
+        positions = (positions + rng.normal(scale=0.05, size=positions.shape) + L/2) % L - L/2
+
+    #the list should have been reused on most steps
+    assert(vl.numBuilds < vl.numCalls)
+
+    print("Verlet List Test Passed")
+
+    return
+
 def plotNGpoints():
 
     R = np.linspace(0.5,2.1,150)
@@ -182,6 +252,9 @@ if __name__ == "__main__":
     testBonds()
     testNeighborGrid2D()
     testNeighborGrid3D()
+    testCellList2D()
+    testCellListBruteForce()
+    testVerletList()
     testBodyBind()
 
     # plotNGpoints()
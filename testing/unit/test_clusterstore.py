@@ -0,0 +1,76 @@
+import os
+import pytest
+
+#add the path to the package root for testing
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from SAASH import analyze
+from SAASH import clusterstore
+from SAASH.util import observer as obs
+
+from test_analysis import writeTrajectory
+
+
+def runCluster(gsd_file, ixn_file, cluster_format='pickle'):
+    #run a cluster analysis tracking several kinds of observables
+
+    observer = obs.Observer(gsd_file, 'cluster')
+    for observable in ['num_bodies', 'positions', 'indices', 'bonds']:
+        observer.add_observable(observable)
+    observer.set_cluster_format(cluster_format)
+
+    analyze.run_analysis(gsd_file, ixn_file=ixn_file, observer=observer)
+
+    return observer.get_outfile()
+
+
+def testConvertedStoreMatchesPickle(tmp_path):
+    #every cluster loaded from a converted store should match the pickled cluster info
+
+    gsd_file, ixn_file = writeTrajectory(tmp_path)
+    cl_file  = runCluster(gsd_file, ixn_file)
+    out_data = clusterstore.load_cluster_file(cl_file)
+
+    store = clusterstore.ClusterStore(clusterstore.convert_cluster_file(cl_file))
+    assert(store.get_num_clusters() == len(out_data.cluster_info))
+    assert(store.get_num_clusters() > 0)
+
+    for k, info in enumerate(out_data.cluster_info):
+
+        cluster = store.get_cluster(k)
+        assert(cluster['birth'] == info.get_birth_frame())
+        assert(cluster['absorbed'] == info.is_absorbed())
+        assert(len(cluster['data']) == len(info.get_data()))
+
+        for loaded, stored in zip(cluster['data'], info.get_data()):
+            assert(loaded['num_bodies'] == stored['num_bodies'])
+            assert(loaded['indices'] == list(stored['indices']))
+            assert(loaded['bonds'] == stored['bonds'])
+            assert(np.allclose(loaded['positions'], stored['positions']))
+
+        assert(sorted(cluster['gain']) == sorted(info.get_monomer_gain_data()))
+
+    #a single observable should be loaded for one cluster or for all records
+    sizes = store.get_observable('num_bodies', 0)
+    assert(sizes == [data['num_bodies'] for data in out_data.cluster_info[0].get_data()])
+    assert(len(store.get_observable('num_bodies')) == store.get_record_offsets()[-1])
+
+    assert(np.allclose(store.get_monomer_fractions(), out_data.monomer_frac))
+    assert(store.get_monomer_ids(1) == list(out_data.monomer_ids[1]))
+
+
+def testClusterRunWritesStore(tmp_path):
+    #a cluster run with the store format should write a store instead of a pickle
+
+    gsd_file, ixn_file = writeTrajectory(tmp_path)
+    cl_file = runCluster(gsd_file, ixn_file, cluster_format='store')
+
+    assert(not os.path.exists(cl_file))
+
+    store = clusterstore.ClusterStore(clusterstore.get_store_path(cl_file))
+    assert(store.get_num_clusters() == len(store.get_metadata()))
+    assert(set(store.get_columns()) >= {'num_bodies', 'positions', 'indices', 'bonds'})
@@ -0,0 +1,111 @@
+import os
+import pytest
+
+#add the path to the package root for testing
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from SAASH import analyze
+from SAASH import events
+from SAASH import output
+from SAASH.structure import body
+from SAASH.util import observer as obs
+
+from test_bonds import makeSnap, makeSim
+
+
+def testNanoEventWriter(tmp_path):
+    #adsorption changes should be written as events, and cluster ids kept while overlapping
+
+    #'.np' elsewhere in the path should not change the output names
+    run_dir = os.path.join(tmp_path, "sim.npt")
+    os.makedirs(run_dir)
+
+    observer = obs.Observer(os.path.join(run_dir, "traj.npt_run.gsd"), 'nanoparticle')
+    observer.set_nano_events(True)
+    writer   = output.get_writer(observer)
+
+    def result(adsorbed, largest):
+        q = [(0, 0, 0), (0, 0, 0)]
+        return q, {'adsorbed': [np.array(ids) for ids in adsorbed], 
+                   'largest' : [np.array(ids) for ids in largest]}
+
+    writer.add_frame(0, result([[1, 2], [5]], [[1, 2], []]))
+    writer.add_frame(1, result([[2, 3], [5]], [[2, 3], []]))
+    writer.add_frame(2, result([[4],    []],  [[],     []]))
+    writer.close()
+
+    table = events.load_events(os.path.join(run_dir, "traj.npt_run.npev"))
+    assert(table.tolist() == [[0, 0, 1, 0], [0, 0, 2, 0], [0, 1, 5, 0],
+                              [1, 0, 3, 1], [1, 0, 1, -1],
+                              [2, 0, 4, 1], [2, 0, 2, -1], [2, 0, 3, -1], [2, 1, 5, -1]])
+
+    #the largest cluster of nano 0 keeps its id in frame 1, and is gone in frame 2
+    clusters = np.loadtxt(os.path.join(run_dir, "traj.npt_run.npcl"), dtype=int, ndmin=2)
+    assert(clusters.tolist() == [[0, 0, 0, 2], [2, 0, -1, 0]])
+
+    #the per frame output is still written
+    assert(os.path.getsize(observer.get_outfile()) > 0)
+
+
+def testEventsUseHOOMDBodyIds(tmp_path, monkeypatch):
+    #events from analyze_nano should record HOOMD body ids, not indices in the frame
+
+    #prepend free particles, so each rigid body id (its center index) is offset
+    snap   = makeSnap(seed=5)
+    offset = 7
+    snap.particles.N += offset
+    snap.particles.types = snap.particles.types + ['S']
+    snap.particles.position = np.concatenate([np.zeros((offset, 3), dtype=np.float32),
+                                              snap.particles.position])
+    snap.particles.typeid = np.concatenate([np.full(offset, 3, dtype=np.uint32),
+                                            snap.particles.typeid])
+    snap.particles.body = np.concatenate([np.full(offset, -1, dtype=np.int32),
+                                          snap.particles.body + offset])
+
+    sim = makeSim(snap, tmp_path)
+    sim.radius_mult = 1.0
+    sim.largest_bond_distance = 0.35
+
+    nanos = [body.Nano('N', 3.0, np.array([0.0, 0.0]))]
+    monkeypatch.setattr(body, 'get_nanoparticles', lambda snap, sim: nanos)
+
+    observer = obs.Observer(os.path.join(tmp_path, "traj.gsd"), 'nanoparticle')
+    observer.set_nano_events(True)
+    result   = analyze.analyze_nano(snap, sim, observer)
+
+    #the adsorbed ids should be the rigid body ids of the adsorbed bodies
+    bodies   = body.create_bodies(snap, sim)
+    adsorbed = np.flatnonzero(body.get_adsorbed_bodies(bodies, nanos, sim)[0])
+    expected = [bodies[i].get_HOOMD_id() for i in adsorbed]
+    assert(len(expected) > 0)
+    assert(result[1]['adsorbed'][0].tolist() == expected)
+    assert(set(result[1]['largest'][0].tolist()) <= set(expected))
+    assert(all(snap.particles.body[i] == i for i in expected))
+
+    writer = output.get_writer(observer)
+    writer.add_frame(0, result)
+    writer.close()
+
+    table = events.load_events(os.path.join(tmp_path, "traj.npev"))
+    assert(table[:, 2].tolist() == expected)
+
+
+def testResidenceTimesAndRates():
+
+    table = np.array([[0, 0, 1, 0], [2, 0, 2, 1], [3, 0, 1, -1], [5, 0, 2, -1],
+                      [6, 0, 2, 1], [4, 1, 7, 1]])
+
+    nanos, bodies, times = events.get_residence_times(table)
+    assert(nanos.tolist() == [0] and bodies.tolist() == [2] and times.tolist() == [3])
+
+    nanos, bodies, times = events.get_residence_times(table, include_initial=True)
+    assert(sorted(times.tolist()) == [3, 3])
+
+    #nano 0 has bodies adsorbed for 3 + 3 + 4 frames, nano 1 for 6 frames
+    on_rate, off_rate = events.get_rates(table, 0, 10)
+    assert(np.allclose(on_rate, [0.2, 0.1]))
+    assert(np.allclose(off_rate, [0.2, 0.0]))
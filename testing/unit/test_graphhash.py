@@ -0,0 +1,131 @@
+import os
+import pytest
+
+#add the path to the package root for testing
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from SAASH import analyze
+from SAASH import output
+from SAASH.structure import bondengine
+from SAASH.structure import bondgraph
+from SAASH.structure import body
+from SAASH.structure import frame
+from SAASH.structure import graphhash
+from SAASH.util import observer as obs
+
+from test_bonds import makeSnap, makeSim
+
+
+def makeGraph(num_bodies, edges, num_bond_types=2):
+    #construct a bond graph from (i, j, code) edges
+
+    bodies_i, bodies_j, codes = np.array(edges).T
+    return bondgraph.BondGraph(num_bodies, bodies_i, bodies_j, codes, num_bond_types=num_bond_types)
+
+
+def testHashInvariantToRelabeling():
+    #relabeling the bodies of a cluster should not change its hash
+
+    rng   = np.random.default_rng(2)
+    edges = [(0, 1, 0), (1, 2, 1), (2, 3, 0), (3, 0, 1), (1, 4, 0), (4, 5, 1)]
+    graph = makeGraph(8, edges)
+
+    for trial in range(5):
+        perm     = rng.permutation(8)
+        permuted = makeGraph(8, [(perm[i], perm[j], k) for i, j, k in edges])
+
+        assert(graphhash.get_cluster_hash(permuted, perm[:6]) ==
+               graphhash.get_cluster_hash(graph, np.arange(6)))
+
+
+def testHashDistinguishesClusters():
+    #clusters with the same size and bond counts but different bonds should differ
+
+    path  = makeGraph(4, [(0, 1, 0), (1, 2, 0), (2, 3, 0)])
+    star  = makeGraph(4, [(0, 1, 0), (0, 2, 0), (0, 3, 0)])
+    assert(graphhash.get_cluster_hash(path, range(4)) != graphhash.get_cluster_hash(star, range(4)))
+
+    #the same chain, with the bond types in a different order
+    chain_a = makeGraph(5, [(0, 1, 0), (1, 2, 1), (2, 3, 0), (3, 4, 0)])
+    chain_b = makeGraph(5, [(0, 1, 1), (1, 2, 0), (2, 3, 0), (3, 4, 0)])
+    assert(graphhash.get_cluster_hash(chain_a, range(5)) !=
+           graphhash.get_cluster_hash(chain_b, range(5)))
+
+
+def testHashCache(monkeypatch):
+    #a cluster with the same bonds should be hashed once
+
+    graph = makeGraph(6, [(0, 1, 0), (1, 2, 1), (3, 4, 0)])
+    first = graphhash.get_cluster_hash(graph, [2, 0, 1])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cached cluster was rehashed")
+
+    monkeypatch.setattr(graphhash, "wl_hash", fail)
+    assert(graphhash.get_cluster_hash(graph, [0, 1, 2]) == first)
+
+    #the same bonds in a larger frame also hit the cache
+    larger = makeGraph(10, [(0, 1, 0), (1, 2, 1), (5, 9, 1)])
+    assert(graphhash.get_cluster_hash(larger, [0, 1, 2]) == first)
+
+
+def testCapsidGraphHashKey(tmp_path):
+    #keying capsids by graph hash should split the bond count distribution
+
+    snap = makeSnap()
+    sim  = makeSim(snap, tmp_path)
+
+    bodies     = body.create_bodies(snap, sim)
+    bond_graph = bondengine.get_bond_graph(bodies, sim)
+
+    observer = obs.Observer(os.path.join(tmp_path, "traj.gsd"), 'capsid')
+    by_bonds = analyze.analyze_capsids(snap, sim, observer, 0, 5, bond_graph)
+
+    observer.set_capsid_key('graph_hash')
+    by_hash  = analyze.analyze_capsids(snap, sim, observer, 0, 5, bond_graph)
+
+    assert(len(by_hash) > 0)
+    totals = dict()
+    for key, count in by_hash.items():
+        nbonds = int(key.split('_')[0])
+        totals[nbonds] = totals.get(nbonds, 0) + count
+    assert(totals == by_bonds)
+
+    #the writers should use the composite keys as columns
+    writer = output.get_writer(observer)
+    writer.add_frame(0, by_hash)
+    writer.close()
+
+    with open(observer.get_outfile()) as f:
+        header = f.readline().split()
+    assert(sorted(header[1:]) == sorted(by_hash))
+
+    with pytest.raises(ValueError):
+        observer.set_capsid_key('hash')
+
+
+def testFocusMicrostatesUseGraphHash(tmp_path):
+    #focused microstates should include the graph hash when it is observed
+
+    snap = makeSnap()
+    sim  = makeSim(snap, tmp_path)
+
+    bodies     = body.create_bodies(snap, sim)
+    bond_graph = bondengine.get_bond_graph(bodies, sim)
+    fr = frame.make_frame(bodies, bond_graph, 0)
+
+    observer = obs.Observer(os.path.join(tmp_path, "traj.gsd"), 'bulk')
+    observer.add_observable('bonds')
+    observer.add_observable('graph_hash')
+    observer.set_focus_list([5])
+
+    size_dict, largest, focus_dict = fr.get_cluster_size_distribution(observer)
+
+    assert(len(focus_dict[5]) > 0)
+    for microstate in focus_dict[5]:
+        assert(microstate[-1][0] == 'graph_hash')
+        assert(len(microstate[-1][1]) == 16)
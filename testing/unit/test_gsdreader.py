@@ -0,0 +1,59 @@
+import os
+import pytest
+
+#add the path to the package root for testing
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import gsd.hoomd
+
+from SAASH.util import gsdreader
+
+from test_bonds import makeSnap
+
+
+def writeMovingTrajectory(tmp_path, num_frames=4):
+    #write a trajectory where only positions change, so later frames omit static chunks
+
+    gsd_file = os.path.join(tmp_path, "moving.gsd")
+    snap = makeSnap(seed=0)
+    snap.particles.orientation = np.tile([1, 0, 0, 0], (snap.particles.N, 1))
+
+    with gsd.hoomd.open(name=gsd_file, mode='w') as f:
+        for frame_num in range(num_frames):
+            snap.particles.position = snap.particles.position + 0.01 * frame_num
+            f.append(snap)
+
+    return gsd_file
+
+
+def testReaderMatchesHoomd(tmp_path):
+    #the selective reader should give the same data as a full gsd.hoomd read
+
+    gsd_file = writeMovingTrajectory(tmp_path)
+    snaps    = gsd.hoomd.open(name=gsd_file, mode='r')
+
+    with gsdreader.GSDReader(gsd_file, orientation=True) as reader:
+
+        assert(len(reader) == len(snaps))
+        assert(os.path.abspath(reader.file.name) == os.path.abspath(gsd_file))
+
+        for frame_num in [0, 1, 3, -1]:
+
+            snap, expected = reader[frame_num], snaps[frame_num]
+
+            assert(snap.particles.N == expected.particles.N)
+            assert(snap.particles.types == expected.particles.types)
+            for name in ['position', 'typeid', 'body', 'orientation']:
+                assert(np.array_equal(getattr(snap.particles, name), 
+                                      getattr(expected.particles, name)))
+            assert(np.array_equal(snap.configuration.box, expected.configuration.box))
+
+        #static chunks are shared with frame 0, and cannot be modified
+        assert(reader[2].particles.body is reader[0].particles.body)
+        assert(not reader[2].particles.typeid.flags.writeable)
+
+        with pytest.raises(IndexError):
+            reader[len(snaps)]
@@ -0,0 +1,135 @@
+import os
+import pytest
+
+#add the path to the package root for testing
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+
+import numpy as np
+
+from collections import defaultdict
+
+from SAASH import output
+from SAASH.util import observer as obs
+
+
+def makeObserver(tmp_path, run_type, focus_list=None):
+    #make an observer writing to a file in tmp_path
+
+    observer = obs.Observer(os.path.join(tmp_path, "traj.gsd"), run_type)
+    observer.set_focus_list(focus_list)
+
+    return observer
+
+
+def testSizesWriter(tmp_path):
+    #rows should be streamed to the partial file, and padded to the largest size on close
+
+    observer = makeObserver(tmp_path, 'bulk', focus_list=[2, 5])
+    writer   = output.SizesWriter(observer)
+
+    focus = defaultdict(dict)
+    focus[2] = {(1, 0): 2}
+    writer.add_frame(0, ({1: 4, 2: 2}, 2, focus))
+
+    focus = defaultdict(dict)
+    focus[2] = {(0, 1): 1, (1, 0): 0}
+    writer.add_frame(1, ({1: 3, 2: 1, 4: 1}, 4, focus))
+
+    #the rows so far should be on disk before the writer is closed
+    assert(os.path.exists(observer.get_outfile() + ".partial"))
+
+    writer.close()
+
+    with open(observer.get_outfile()) as f:
+        assert(f.read() == "0 4 2 0 0 2\n1 3 1 0 1 4\n")
+
+    with open(os.path.join(tmp_path, "traj_2.fsizes")) as f:
+        assert(f.read() == "Microstates: ( 0 : (1, 0) ),( 1 : (0, 1) ),\n0 2 0 \n1 0 1 \n")
+
+    #no clusters of size 5 were found, so there is no output for it
+    assert(not os.path.exists(os.path.join(tmp_path, "traj_5.fsizes")))
+    assert(not os.path.exists(observer.get_outfile() + ".partial"))
+
+
+def testCapsidWriter(tmp_path):
+    #the header should contain every bond count seen and the perfect bond count
+
+    observer = makeObserver(tmp_path, 'capsid')
+    writer   = output.CapsidWriter(observer, 4, 2)
+
+    writer.add_frame(0, {})
+    writer.add_frame(1, {3: 1})
+    writer.close()
+
+    with open(observer.get_outfile()) as f:
+        assert(f.read() == "frame 3 4 \n0 0 0 \n1 1 0 \n")
+
+
+def testNpzSizesWriter(tmp_path):
+    #the npz output should hold the same counts as the text output
+
+    observer = makeObserver(tmp_path, 'bulk', focus_list=[2])
+    observer.set_output_format('npz')
+    writer   = output.get_writer(observer)
+
+    focus = defaultdict(dict)
+    focus[2] = {(1, 0): 2}
+    writer.add_frame(0, ({1: 4, 2: 2}, 2, focus))
+
+    focus = defaultdict(dict)
+    focus[2] = {(0, 1): 1, (1, 0): 0}
+    writer.add_frame(5, ({1: 3, 2: 1, 4: 1}, 4, focus))
+
+    writer.close()
+
+    data = output.load_output(observer.get_outfile() + ".npz", dense=True)
+    assert(data['frames'].tolist() == [0, 5])
+    assert(data['largest'].tolist() == [2, 4])
+    assert(data['columns'].tolist() == [1, 2, 3, 4])
+    assert(data['counts'].tolist() == [[4, 2, 0, 0], [3, 1, 0, 1]])
+
+    data = output.load_output(os.path.join(tmp_path, "traj_2.fsizes.npz"), dense=True)
+    assert(data['columns'].tolist() == ['(1, 0)', '(0, 1)'])
+    assert(data['counts'].tolist() == [[2, 0], [0, 1]])
+
+
+def testNpzSparseCounts(tmp_path):
+    #mostly zero count matrices should be stored sparsely, and loaded as a sparse matrix
+
+    observer = makeObserver(tmp_path, 'capsid')
+    observer.set_output_format('npz')
+    writer   = output.get_writer(observer, 4, 2)
+
+    for frame_num in range(10):
+        writer.add_frame(frame_num, {frame_num+1: 1})
+
+    writer.close()
+
+    npz_file = observer.get_outfile() + ".npz"
+    with np.load(npz_file) as data:
+        assert('count_data' in data.files and 'counts' not in data.files)
+
+    data = output.load_output(npz_file)
+    assert(data['columns'].tolist() == list(range(1, 11)))
+    assert(data['counts'].shape == (10, 10))
+    assert((data['counts'].toarray() == np.eye(10)).all())
+
+
+def testNpzNanoparticleWriter(tmp_path):
+
+    observer = makeObserver(tmp_path, 'nanoparticle')
+    observer.set_output_format('npz')
+    writer   = output.get_writer(observer)
+
+    writer.add_frame(0, ([(3, 2, 1), (0, 0, 0)], {}))
+    writer.add_frame(1, ([(4, 3, 2), (1, 1, 0)], {}))
+    writer.close()
+
+    data = output.load_output(observer.get_outfile() + ".npz")
+    assert(data['frames'].tolist() == [0, 1])
+    assert(data['data'].shape == (2, 2, 3))
+    assert(data['data'][1, 0].tolist() == [4, 3, 2])
+
+    with pytest.raises(ValueError):
+        observer.set_output_format('csv')
@@ -0,0 +1,59 @@
+import os
+import pytest
+
+#add the path to the package root for testing
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+
+import numpy as np
+from types import SimpleNamespace
+
+from SAASH import profiles
+from SAASH.structure import body
+from SAASH.util import observer as obs
+
+
+def testRadialHistogramsMatchLoop(monkeypatch):
+    #batched histograms should match a per nanoparticle minimum image histogram
+
+    rng = np.random.default_rng(2)
+    sim = SimpleNamespace(box_dim=np.array([10.0, 12.0, 8.0]))
+
+    positions = rng.uniform(-5, 5, size=(500, 3))
+    nanos     = [body.Nano('N', 1.0, rng.uniform(-4, 4, size=3)) for n in range(5)]
+
+    #use small batches, so several are needed
+    monkeypatch.setattr(profiles, 'BATCH_SIZE', 1200)
+    counts = profiles.get_radial_histograms(positions, nanos, sim, 8, 4.0)
+
+    for n, nano in enumerate(nanos):
+        dist = body.distance(positions, nano.get_position(), sim.box_dim)
+        expected, edges = np.histogram(dist, bins=8, range=(0, 4.0))
+        assert(counts[n].tolist() == expected.tolist())
+
+
+def testRadialProfileWriter(tmp_path):
+    #the histograms should be summed over frames, and loaded with densities per frame
+
+    #'.np' elsewhere in the path should not change the output name
+    run_dir = os.path.join(tmp_path, "sim.npt")
+    os.makedirs(run_dir)
+
+    observer = obs.Observer(os.path.join(run_dir, "traj.npt_run.gsd"), 'nanoparticle')
+    observer.set_radial_profile(2, r_max=2.0)
+    writer   = profiles.RadialProfileWriter(observer)
+
+    for frame_num in range(2):
+        profile = {'edges': np.array([0.0, 1.0, 2.0]), 'dim': 2,
+                   'bodies': np.array([[1, 3]]), 'atoms': np.array([[2, 6]])}
+        writer.add_frame(frame_num, ([(0, 0, 0)], {'profile': profile}))
+    writer.close()
+
+    profile = profiles.load_profiles(os.path.join(run_dir, "traj.npt_run.nprad.npz"))
+    assert(profile['num_frames'] == 2)
+    assert(profile['body_counts'].tolist() == [[2, 6]])
+    assert(np.allclose(profile['body_coverage'], [[1, 3]]))
+    assert(np.allclose(profile['atom_density'], [[2 / np.pi, 6 / (3 * np.pi)]]))
+
+    with pytest.raises(ValueError):
+        observer.set_radial_profile(0)